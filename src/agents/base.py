@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from agents.registry import get_llm
+from settings import settings
+from utils.deadline import check_deadline
+from utils.events import emit, is_streaming
+from utils.llm_cache import cache_key, get_llm_cache, is_cache_enabled
+from utils.metrics import count, estimate_cost, is_recording, span
+from utils.ratelimit import PRIORITY_NORMAL, RateLimiter, get_limiter
+from utils.text import count_tokens
+
+
+class BaseAgent:
+    """Common LLM plumbing shared by every agent
+
+    Subclasses set name and call _invoke/_ainvoke instead of the LLM directly,
+    so responses go through the LLM cache when it is enabled for that agent.
+    _stream/_astream additionally emit tokens when a caller is streaming.
+    Calls made under a deadline get a timeout that keeps them within it.
+    Every call is recorded as an "llm" span with its token counts, and waits
+    its turn at the model's rate limiter, queued by the agent's priority.
+    """
+
+    name = "agent"
+    priority = PRIORITY_NORMAL
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.gpt_model
+        self.llm = get_llm(self.model)
+        self.use_cache = is_cache_enabled(self.name)
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return get_limiter(f"llm:{self.model}")
+
+    def _cache_key(self, messages: List[BaseMessage]) -> str:
+        return cache_key(self.llm.model_name, self.llm.temperature, messages)
+
+    def _call_options(self) -> Dict[str, Any]:
+        """Per-call timeout that keeps the LLM call within the current deadline"""
+        left = check_deadline(f"{self.name} LLM call")
+        if left is None:
+            return {}
+        # The client retries timed-out requests, so split the time between tries
+        return {"timeout": left / (getattr(self.llm, "max_retries", 0) + 1)}
+
+    def _record_usage(
+        self, messages: List[BaseMessage], content: str, response: Any = None
+    ) -> None:
+        """Count an LLM call's tokens, estimating them when the API gives none"""
+        if not is_recording():
+            return
+        metadata = getattr(response, "response_metadata", None)
+        usage = metadata.get("token_usage") if isinstance(metadata, dict) else None
+        if isinstance(usage, dict) and "prompt_tokens" in usage:
+            tokens_in = usage["prompt_tokens"]
+            tokens_out = usage.get("completion_tokens", 0)
+        else:
+            # Streamed responses come without usage
+            tokens_in = sum(count_tokens(str(m.content)) for m in messages)
+            tokens_out = count_tokens(content)
+        count(
+            tokens_in=tokens_in,
+            tokens_out=tokens_out,
+            cost_usd=estimate_cost(self.llm.model_name, tokens_in, tokens_out),
+        )
+
+    def _cached(self, key: Optional[str]) -> Optional[str]:
+        cached = get_llm_cache().get(key, self.name) if key else None
+        if cached is not None:
+            count(cache_hits=1)
+        return cached
+
+    def _invoke(self, messages: List[BaseMessage]) -> BaseMessage:
+        """Call the LLM, serving repeated prompts from the cache"""
+        with span("llm", self.name):
+            key = self._cache_key(messages) if self.use_cache else None
+            cached = self._cached(key)
+            if cached is not None:
+                return AIMessage(content=cached)
+
+            response = self.limiter.call(
+                lambda: self.llm.invoke(messages, **self._call_options()),
+                self.priority,
+                self.name,
+            )
+            self._record_usage(messages, response.content, response)
+            if key:
+                get_llm_cache().put(key, response.content)
+            return response
+
+    async def _ainvoke(self, messages: List[BaseMessage]) -> BaseMessage:
+        """Async variant of _invoke"""
+        with span("llm", self.name):
+            key = self._cache_key(messages) if self.use_cache else None
+            cached = self._cached(key)
+            if cached is not None:
+                return AIMessage(content=cached)
+
+            response = await self.limiter.acall(
+                lambda: self.llm.ainvoke(messages, **self._call_options()),
+                self.priority,
+                self.name,
+            )
+            self._record_usage(messages, response.content, response)
+            if key:
+                get_llm_cache().put(key, response.content)
+            return response
+
+    def _stream(self, messages: List[BaseMessage], event: str) -> BaseMessage:
+        """Like _invoke, but emits each token as an event while streaming"""
+        if not is_streaming():
+            return self._invoke(messages)
+
+        with span("llm", self.name):
+            key = self._cache_key(messages) if self.use_cache else None
+            cached = self._cached(key)
+            if cached is not None:
+                emit(event, token=cached)
+                return AIMessage(content=cached)
+
+            # Tokens already emitted cannot be taken back, so streams hold a
+            # slot but are not retried
+            parts = []
+            with self.limiter.slot(self.priority, self.name):
+                for chunk in self.llm.stream(messages, **self._call_options()):
+                    parts.append(chunk.content)
+                    emit(event, token=chunk.content)
+
+            content = "".join(parts)
+            self._record_usage(messages, content)
+            if key:
+                get_llm_cache().put(key, content)
+            return AIMessage(content=content)
+
+    async def _astream(self, messages: List[BaseMessage], event: str) -> BaseMessage:
+        """Async variant of _stream"""
+        if not is_streaming():
+            return await self._ainvoke(messages)
+
+        with span("llm", self.name):
+            key = self._cache_key(messages) if self.use_cache else None
+            cached = self._cached(key)
+            if cached is not None:
+                emit(event, token=cached)
+                return AIMessage(content=cached)
+
+            parts = []
+            async with self.limiter.aslot(self.priority, self.name):
+                async for chunk in self.llm.astream(messages, **self._call_options()):
+                    parts.append(chunk.content)
+                    emit(event, token=chunk.content)
+
+            content = "".join(parts)
+            self._record_usage(messages, content)
+            if key:
+                get_llm_cache().put(key, content)
+            return AIMessage(content=content)
@@ -1,75 +1,197 @@
-from typing import Dict, List
+import logging
+from typing import Dict, List, Optional
 from settings import settings
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
+from agents.base import BaseAgent
+from agents.registry import get_agent
+from state import describe_changes
+from utils.deadline import TIMEOUT_ERRORS, mark_degraded, stage
+from utils.metrics import traced
+from utils.ratelimit import PRIORITY_HIGH
+from utils.text import pack_to_budget
 
-class SynthesizerAgent:
-    def __init__(self, model: str = settings.gpt_model):
-        self.llm = ChatOpenAI(
-            model=model,
-            temperature=settings.temperature,
-            api_key=settings.openai_api_key
-        )
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    "You are a research synthesizer. Analyze and combine information "
-                    "from multiple sources to create a coherent understanding. "
-                    "Identify patterns, conflicts, and gaps in the research.",
-                ),
-                (
-                    "user",
-                    "Topic: {topic}\nSources:\n{sources}\n\n"
-                    "Create a comprehensive synthesis of the research findings.",
-                ),
-            ]
-        )
+logger = logging.getLogger(__name__)
+
+
+class SynthesizerAgent(BaseAgent):
+    name = "synthesizer"
+    # Synthesis and writing finish runs under way, so they skip the LLM queue
+    priority = PRIORITY_HIGH
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a research synthesizer. Analyze and combine information "
+                "from multiple sources to create a coherent understanding. "
+                "Identify patterns, conflicts, and gaps in the research.",
+            ),
+            (
+                "user",
+                "Topic: {topic}\nSources:\n{sources}\n\n"
+                "Create a comprehensive synthesis of the research findings.",
+            ),
+        ]
+    )
+
+    update_prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a research synthesizer. Fold a new source into an "
+                "existing synthesis, keeping what still holds and noting where "
+                "the new source agrees, conflicts or fills a gap.",
+            ),
+            (
+                "user",
+                "Topic: {topic}\nCurrent synthesis:\n{synthesis}\n\n"
+                "New source: {source}\n\nWrite the updated synthesis.",
+            ),
+        ]
+    )
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
 
+    @traced("agent")
+    def update(self, topic: str, synthesis: Optional[Dict], source: Dict) -> Dict:
+        """Fold one more source into a running synthesis"""
+        if synthesis is None:
+            response = self._invoke(self._format_prompt(topic, [source]))
+        else:
+            response = self._invoke(self._format_update(topic, synthesis, source))
+
+        return {
+            "synthesis": response.content,
+            "source_count": synthesis["source_count"] + 1 if synthesis else 1,
+        }
+
+    @traced("agent")
+    async def aupdate(
+        self, topic: str, synthesis: Optional[Dict], source: Dict
+    ) -> Dict:
+        """Async variant of update"""
+        if synthesis is None:
+            response = await self._ainvoke(self._format_prompt(topic, [source]))
+        else:
+            response = await self._ainvoke(
+                self._format_update(topic, synthesis, source)
+            )
+
+        return {
+            "synthesis": response.content,
+            "source_count": synthesis["source_count"] + 1 if synthesis else 1,
+        }
+
+    @traced("agent")
     def synthesize(self, topic: str, sources: List[Dict]) -> Dict:
         """Synthesize information from multiple sources"""
+        response = self._stream(self._format_prompt(topic, sources), "synthesis")
+
+        return {"synthesis": response.content, "source_count": len(sources)}
+
+    @traced("agent")
+    async def asynthesize(self, topic: str, sources: List[Dict]) -> Dict:
+        """Async variant of synthesize"""
+        response = await self._astream(self._format_prompt(topic, sources), "synthesis")
+
+        return {"synthesis": response.content, "source_count": len(sources)}
+
+    def _format_prompt(self, topic: str, sources: List[Dict]) -> List:
+        # Fit the summaries into the synthesis token budget
+        summaries = pack_to_budget(
+            [source.get("summary", "") for source in sources],
+            settings.synthesis_max_tokens,
+        )
         # Format sources for prompt
         sources_text = "\n".join(
-            f"Source {i+1}: {source.get('summary', '')}"
-            for i, source in enumerate(sources)
+            f"Source {i+1}: {summary}" for i, summary in enumerate(summaries)
         )
+        return self.prompt.format_messages(topic=topic, sources=sources_text)
 
-        response = self.llm.invoke(
-            self.prompt.format_messages(topic=topic, sources=sources_text)
+    def _format_update(self, topic: str, synthesis: Dict, source: Dict) -> List:
+        # Keep the running synthesis and the new source inside the budget
+        current, summary = pack_to_budget(
+            [synthesis["synthesis"], source.get("summary", "")],
+            settings.synthesis_max_tokens,
+        )
+        return self.update_prompt.format_messages(
+            topic=topic, synthesis=current, source=summary
         )
 
-        return {"synthesis": response.content, "source_count": len(sources)}
 
+class WriterAgent(BaseAgent):
+    name = "writer"
+    priority = PRIORITY_HIGH
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a research writer. Create well-structured, clear, "
+                "and engaging content based on the synthesized research. "
+                "Include proper citations and maintain academic rigor.",
+            ),
+            (
+                "user",
+                "Topic: {topic}\nSynthesis: {synthesis}\n\n"
+                "Create a comprehensive research article.",
+            ),
+        ]
+    )
+    revise_prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a research writer. Revise an existing research "
+                "article after its sources changed. Update, add or remove only "
+                "what the changes affect, and keep the rest of the article, "
+                "its structure and its citations as they are.",
+            ),
+            (
+                "user",
+                "Topic: {topic}\nArticle:\n{article}\n\n"
+                "Changes in the sources:\n{changes}\n\n"
+                "Updated synthesis: {synthesis}\n\nWrite the revised article.",
+            ),
+        ]
+    )
 
-class WriterAgent:
-    def __init__(self, model: str = settings.gpt_model):
-        self.llm = ChatOpenAI(
-            model=model,
-            temperature=settings.temperature,
-            api_key=settings.openai_api_key
-        )
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    "You are a research writer. Create well-structured, clear, "
-                    "and engaging content based on the synthesized research. "
-                    "Include proper citations and maintain academic rigor.",
-                ),
-                (
-                    "user",
-                    "Topic: {topic}\nSynthesis: {synthesis}\n\n"
-                    "Create a comprehensive research article.",
-                ),
-            ]
-        )
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
 
+    @traced("agent")
     def write(self, topic: str, synthesis: Dict) -> Dict:
         """Create final research content"""
-        response = self.llm.invoke(
-            self.prompt.format_messages(topic=topic, synthesis=synthesis["synthesis"])
+        response = self._stream(
+            self.prompt.format_messages(topic=topic, synthesis=synthesis["synthesis"]),
+            "article",
+        )
+
+        return {
+            "content": response.content,
+            "metadata": {"sources_used": synthesis.get("source_count", 0)},
+        }
+
+    @traced("agent")
+    def revise(self, topic: str, synthesis: Dict, article: str, changes: str) -> Dict:
+        """Update an earlier article for changes in its sources"""
+        response = self._stream(
+            self._format_revision(topic, synthesis, article, changes), "article"
+        )
+
+        return {
+            "content": response.content,
+            "metadata": {"sources_used": synthesis.get("source_count", 0)},
+        }
+
+    @traced("agent")
+    async def arevise(
+        self, topic: str, synthesis: Dict, article: str, changes: str
+    ) -> Dict:
+        """Async variant of revise"""
+        response = await self._astream(
+            self._format_revision(topic, synthesis, article, changes), "article"
         )
 
         return {
@@ -77,14 +199,76 @@ class WriterAgent:
             "metadata": {"sources_used": synthesis.get("source_count", 0)},
         }
 
+    def _format_revision(
+        self, topic: str, synthesis: Dict, article: str, changes: str
+    ) -> List:
+        return self.revise_prompt.format_messages(
+            topic=topic,
+            article=article,
+            changes=changes,
+            synthesis=synthesis["synthesis"],
+        )
+
+    @traced("agent")
+    async def awrite(self, topic: str, synthesis: Dict) -> Dict:
+        """Async variant of write"""
+        response = await self._astream(
+            self.prompt.format_messages(topic=topic, synthesis=synthesis["synthesis"]),
+            "article",
+        )
+
+        return {
+            "content": response.content,
+            "metadata": {"sources_used": synthesis.get("source_count", 0)},
+        }
+
+
+def _fallback_synthesis(state: Dict, sources: List[Dict]) -> Dict:
+    """Stand-in synthesis when there is no time left to run the synthesizer"""
+    logger.warning("Synthesis ran out of time, passing summaries through")
+    mark_degraded(state, "synthesize")
+    summaries = [source.get("summary", "") for source in sources]
+    return {"synthesis": "\n\n".join(summaries), "source_count": len(sources)}
+
+
+def _fallback_content(state: Dict, synthesis: Dict) -> Dict:
+    """Stand-in article when there is no time left to run the writer"""
+    logger.warning("Writing ran out of time, returning the synthesis")
+    mark_degraded(state, "write")
+    return {
+        "content": synthesis["synthesis"],
+        "metadata": {"sources_used": synthesis.get("source_count", 0)},
+    }
+
+
+def has_changes(research_data: Dict) -> bool:
+    """Whether a refresh found sources added, changed or dropped"""
+    changes = research_data.get("changes") or {}
+    return any(changes.get(kind) for kind in ("added", "changed", "removed"))
+
+
+def _keep_previous(state: Dict, previous: Dict) -> Dict:
+    """Finish a refresh that found nothing new with the previous article"""
+    logger.info("No source changed since the previous run, keeping its article")
+    synthesis = previous.get("synthesis") or {}
+    state["research_data"]["synthesis"] = synthesis
+    state["content"] = previous["content"]
+    state["metadata"] = {
+        **(state.get("metadata") or {}),
+        "sources_used": synthesis.get("source_count", 0),
+    }
+    state["stage"] = "complete"
+    state["next"] = "FINISH"
+    return state
+
 
 def content_team_step(state: Dict) -> Dict:
     """Coordinate content team activities"""
-    synthesizer = SynthesizerAgent()
-    writer = WriterAgent()
+    synthesizer = get_agent(SynthesizerAgent)
+    writer = get_agent(WriterAgent)
 
     # Check for errors in previous steps
-    if "error" in state:
+    if state.get("error"):
         state["next"] = "FINISH"
         return state
 
@@ -101,16 +285,104 @@ def content_team_step(state: Dict) -> Dict:
         if not topic:
             raise ValueError("No topic found in state")
 
-        # Synthesize research
-        synthesis = synthesizer.synthesize(topic, sources)
+        # A refresh that found nothing new keeps the previous article
+        previous = state.get("previous")
+        if previous and not has_changes(state["research_data"]):
+            return _keep_previous(state, previous)
+
+        # Synthesize research, unless pipelined research already did
+        synthesis = state["research_data"].get("synthesis")
+        if not synthesis or synthesis.get("source_count") != len(sources):
+            try:
+                with stage("synthesize"):
+                    synthesis = synthesizer.synthesize(topic, sources)
+            except TIMEOUT_ERRORS:
+                synthesis = _fallback_synthesis(state, sources)
         state["research_data"]["synthesis"] = synthesis
 
-        # Create final content
-        final_content = writer.write(topic, synthesis)
+        # Create final content, or revise the previous run's for the changes
+        try:
+            with stage("write"):
+                if previous:
+                    final_content = writer.revise(
+                        topic,
+                        synthesis,
+                        previous["content"],
+                        describe_changes(state["research_data"]),
+                    )
+                else:
+                    final_content = writer.write(topic, synthesis)
+        except TIMEOUT_ERRORS:
+            final_content = _fallback_content(state, synthesis)
 
         # Update state
         state["content"] = final_content["content"]
-        state["metadata"] = final_content["metadata"]
+        state["metadata"] = {
+            **(state.get("metadata") or {}),
+            **final_content["metadata"],
+        }
+        state["stage"] = "complete"
+        state["next"] = "FINISH"
+
+        return state
+    except Exception as e:
+        state["error"] = str(e)
+        state["next"] = "FINISH"
+        return state
+
+
+async def acontent_team_step(state: Dict) -> Dict:
+    """Async variant of content_team_step"""
+    synthesizer = get_agent(SynthesizerAgent)
+    writer = get_agent(WriterAgent)
+
+    if state.get("error"):
+        state["next"] = "FINISH"
+        return state
+
+    sources = state.get("research_data", {}).get("sources", [])
+    if not sources:
+        state["error"] = "No sources available for synthesis"
+        state["next"] = "FINISH"
+        return state
+
+    try:
+        topic = state.get("topic") or state.get("research_data", {}).get("topic")
+        if not topic:
+            raise ValueError("No topic found in state")
+
+        previous = state.get("previous")
+        if previous and not has_changes(state["research_data"]):
+            return _keep_previous(state, previous)
+
+        synthesis = state["research_data"].get("synthesis")
+        if not synthesis or synthesis.get("source_count") != len(sources):
+            try:
+                with stage("synthesize"):
+                    synthesis = await synthesizer.asynthesize(topic, sources)
+            except TIMEOUT_ERRORS:
+                synthesis = _fallback_synthesis(state, sources)
+        state["research_data"]["synthesis"] = synthesis
+
+        try:
+            with stage("write"):
+                if previous:
+                    final_content = await writer.arevise(
+                        topic,
+                        synthesis,
+                        previous["content"],
+                        describe_changes(state["research_data"]),
+                    )
+                else:
+                    final_content = await writer.awrite(topic, synthesis)
+        except TIMEOUT_ERRORS:
+            final_content = _fallback_content(state, synthesis)
+
+        state["content"] = final_content["content"]
+        state["metadata"] = {
+            **(state.get("metadata") or {}),
+            **final_content["metadata"],
+        }
         state["stage"] = "complete"
         state["next"] = "FINISH"
 
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from agents.content_team import SynthesizerAgent
+from agents.registry import get_agent
+from agents.research_team import (
+    ScraperAgent,
+    SearchAgent,
+    _finish_research,
+    aiter_scrapes,
+    asearch_gaps,
+    gap_urls,
+    iter_scrapes,
+    recall_sources,
+    remember_sources,
+    search_gaps,
+)
+from settings import settings
+from utils.deadline import TIMEOUT_ERRORS, mark_degraded, stage
+
+logger = logging.getLogger(__name__)
+
+
+def _pipeline_targets(state: Dict) -> Tuple[str, int, Optional[float]]:
+    topic = state.get("topic") or state.get("research_data", {}).get("topic")
+    if not topic:
+        raise ValueError("No topic found in state")
+    budget = settings.pipeline_budget
+    deadline = time.monotonic() + budget if budget else None
+    return topic, settings.pipeline_quorum, deadline
+
+
+def _finish_pipeline(
+    state: Dict, sources: List[Dict], synthesis: Optional[Dict]
+) -> Dict:
+    logger.info(f"Pipelined research finished with {len(sources)} sources")
+    state = _finish_research(state, sources)
+    if synthesis is not None:
+        # content_team reuses this as long as it covers every source
+        state["research_data"]["synthesis"] = synthesis
+    return state
+
+
+def pipelined_research_step(state: Dict) -> Dict:
+    """Research step that synthesizes each source as soon as it is scraped
+
+    Stops waiting once pipeline_quorum sources are in or pipeline_budget
+    seconds have passed, so one slow site does not hold up the article.
+    """
+    search_agent = get_agent(SearchAgent)
+    scraper_agent = get_agent(ScraperAgent)
+    synthesizer = get_agent(SynthesizerAgent)
+
+    try:
+        topic, quorum, deadline = _pipeline_targets(state)
+
+        with stage("search"):
+            # Sources from earlier runs seed the synthesis and count to the quorum
+            sources = recall_sources(topic)
+            synthesis = None
+            if sources:
+                try:
+                    synthesis = synthesizer.synthesize(topic, sources)
+                except TIMEOUT_ERRORS:
+                    # Sources still count; content_team synthesizes them later
+                    mark_degraded(state, "synthesize")
+            urls: List[str] = []
+            if len(sources) < min(quorum, settings.knowledge_min_sources):
+                search_results = search_gaps(search_agent, state, topic, sources)
+                urls = gap_urls(search_results, sources)
+
+        fresh: List[Dict] = []
+        with stage("scrape"):
+            scrapes = iter_scrapes(
+                scraper_agent, urls, {"topic": topic}, deadline=deadline
+            )
+            try:
+                for _, source in scrapes:
+                    fresh.append(source)
+                    synthesis = synthesizer.update(topic, synthesis, source)
+                    if len(sources) + len(fresh) >= quorum:
+                        break
+            except TIMEOUT_ERRORS:
+                # content_team re-synthesizes, as the synthesis misses a source
+                mark_degraded(state, "scrape")
+            finally:
+                scrapes.close()  # Abandon the stragglers
+        remember_sources(topic, fresh)
+
+        return _finish_pipeline(state, sources + fresh, synthesis)
+    except Exception as e:
+        state["error"] = str(e)
+        state["next"] = "FINISH"
+        return state
+
+
+async def apipelined_research_step(state: Dict) -> Dict:
+    """Async variant of pipelined_research_step"""
+    search_agent = get_agent(SearchAgent)
+    scraper_agent = get_agent(ScraperAgent)
+    synthesizer = get_agent(SynthesizerAgent)
+
+    try:
+        topic, quorum, deadline = _pipeline_targets(state)
+
+        with stage("search"):
+            sources = await asyncio.to_thread(recall_sources, topic)
+            synthesis = None
+            if sources:
+                try:
+                    synthesis = await synthesizer.asynthesize(topic, sources)
+                except TIMEOUT_ERRORS:
+                    mark_degraded(state, "synthesize")
+            urls: List[str] = []
+            if len(sources) < min(quorum, settings.knowledge_min_sources):
+                search_results = await asearch_gaps(search_agent, state, topic, sources)
+                urls = gap_urls(search_results, sources)
+
+        fresh: List[Dict] = []
+        with stage("scrape"):
+            scrapes = aiter_scrapes(
+                scraper_agent, urls, {"topic": topic}, deadline=deadline
+            )
+            try:
+                async for _, source in scrapes:
+                    fresh.append(source)
+                    synthesis = await synthesizer.aupdate(topic, synthesis, source)
+                    if len(sources) + len(fresh) >= quorum:
+                        break
+            except TIMEOUT_ERRORS:
+                mark_degraded(state, "scrape")
+            finally:
+                await scrapes.aclose()
+        await asyncio.to_thread(remember_sources, topic, fresh)
+
+        return _finish_pipeline(state, sources + fresh, synthesis)
+    except Exception as e:
+        state["error"] = str(e)
+        state["next"] = "FINISH"
+        return state
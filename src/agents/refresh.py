@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+from agents.registry import get_agent
+from agents.research_team import (
+    ScraperAgent,
+    SearchAgent,
+    _finish_research,
+    aresearch_team_step,
+    ascrape_sources,
+    asearch_gaps,
+    gap_urls,
+    remember_sources,
+    research_team_step,
+    scrape_sources,
+    search_gaps,
+)
+from utils.deadline import expired, mark_degraded, stage
+from utils.page_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+
+def diff_sources(previous: List[Dict], sources: List[Dict]) -> Dict[str, List[str]]:
+    """URLs added, changed, dropped and unchanged since the previous sources
+
+    A source changed if its content_ref, the hash of its page text, did.
+    """
+    before = {normalize_url(source["url"]): source for source in previous}
+    changes: Dict[str, List[str]] = {
+        "added": [],
+        "changed": [],
+        "removed": [],
+        "unchanged": [],
+    }
+    for source in sources:
+        earlier = before.pop(normalize_url(source["url"]), None)
+        if earlier is None:
+            kind = "added"
+        elif earlier.get("content_ref") != source.get("content_ref"):
+            kind = "changed"
+        else:
+            kind = "unchanged"
+        changes[kind].append(source["url"])
+    changes["removed"] = [source["url"] for source in before.values()]
+    return changes
+
+
+def _refresh_targets(state: Dict) -> Tuple[str, List[Dict]]:
+    topic = state.get("topic") or state.get("research_data", {}).get("topic")
+    if not topic:
+        raise ValueError("No topic found in state")
+    return topic, state["previous"].get("sources", [])
+
+
+def _finish_refresh(state: Dict, previous: List[Dict], sources: List[Dict]) -> Dict:
+    if expired():
+        # Sources there was no time to revalidate keep their previous version
+        mark_degraded(state, "scrape")
+        done = {normalize_url(source["url"]) for source in sources}
+        sources = sources + [
+            source for source in previous if normalize_url(source["url"]) not in done
+        ]
+
+    changes = diff_sources(previous, sources)
+    logger.info(
+        "Refresh found "
+        + ", ".join(f"{len(urls)} {kind}" for kind, urls in changes.items())
+    )
+    state = _finish_research(state, sources)
+    state["research_data"]["changes"] = changes
+    return state
+
+
+def _new_sources(state: Dict) -> List[Dict]:
+    """Sources a refresh added or summarized again, to index"""
+    changes = state["research_data"]["changes"]
+    urls = set(changes["added"] + changes["changed"])
+    return [s for s in state["research_data"]["sources"] if s["url"] in urls]
+
+
+def refresh_research_step(state: Dict) -> Dict:
+    """Research step that brings the sources of a previous run up to date
+
+    The topic is searched again, but only results the previous sources do
+    not cover are scraped. Previous sources are revalidated with their
+    origin, and only pages whose text changed are summarized again. What
+    changed ends up in research_data["changes"]. Without a previous run
+    this is research_team_step.
+    """
+    if not state.get("previous"):
+        return research_team_step(state)
+
+    search_agent = get_agent(SearchAgent)
+    scraper_agent = get_agent(ScraperAgent)
+
+    try:
+        topic, previous = _refresh_targets(state)
+
+        with stage("search"):
+            search_results = search_gaps(search_agent, state, topic, previous)
+            if expired():
+                mark_degraded(state, "search")
+
+        with stage("scrape"):
+            urls = [source["url"] for source in previous]
+            urls += gap_urls(search_results, previous)
+            sources = scrape_sources(
+                scraper_agent, urls, {"topic": topic}, previous=previous
+            )
+            state = _finish_refresh(state, previous, sources)
+        remember_sources(topic, _new_sources(state))
+
+        return state
+    except Exception as e:
+        state["error"] = str(e)
+        state["next"] = "FINISH"
+        return state
+
+
+async def arefresh_research_step(state: Dict) -> Dict:
+    """Async variant of refresh_research_step"""
+    if not state.get("previous"):
+        return await aresearch_team_step(state)
+
+    search_agent = get_agent(SearchAgent)
+    scraper_agent = get_agent(ScraperAgent)
+
+    try:
+        topic, previous = _refresh_targets(state)
+
+        with stage("search"):
+            search_results = await asearch_gaps(search_agent, state, topic, previous)
+            if expired():
+                mark_degraded(state, "search")
+
+        with stage("scrape"):
+            urls = [source["url"] for source in previous]
+            urls += gap_urls(search_results, previous)
+            sources = await ascrape_sources(
+                scraper_agent, urls, {"topic": topic}, previous=previous
+            )
+            state = _finish_refresh(state, previous, sources)
+        await asyncio.to_thread(remember_sources, topic, _new_sources(state))
+
+        return state
+    except Exception as e:
+        state["error"] = str(e)
+        state["next"] = "FINISH"
+        return state
@@ -0,0 +1,49 @@
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, Optional, Tuple, Type, TypeVar
+
+from langchain_openai import ChatOpenAI
+
+from settings import settings
+
+T = TypeVar("T")
+
+_agents: Dict[Tuple[type, str], object] = {}
+_agents_lock = Lock()
+
+
+@lru_cache(maxsize=None)
+def get_llm(
+    model: Optional[str] = None, temperature: Optional[float] = None
+) -> ChatOpenAI:
+    """Return the shared ChatOpenAI client for a model and temperature
+
+    Every agent using the same model shares one client, and with it one
+    HTTP connection pool. The client does not retry on its own: the model's
+    rate limiter retries, so it sees every 429 and can back off.
+    """
+    return ChatOpenAI(
+        model=model or settings.gpt_model,
+        temperature=settings.temperature if temperature is None else temperature,
+        api_key=settings.openai_api_key,
+        max_retries=0,
+    )
+
+
+def get_agent(agent_cls: Type[T], model: Optional[str] = None) -> T:
+    """Return the long-lived instance of an agent class for a model"""
+    key = (agent_cls, model or settings.gpt_model)
+    agent = _agents.get(key)
+    if agent is None:
+        with _agents_lock:
+            agent = _agents.get(key)
+            if agent is None:
+                agent = _agents[key] = agent_cls(model=key[1])
+    return agent
+
+
+def clear_registry() -> None:
+    """Drop all shared agents and LLM clients (e.g. after settings change)"""
+    with _agents_lock:
+        _agents.clear()
+    get_llm.cache_clear()
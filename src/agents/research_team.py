@@ -1,107 +1,766 @@
-from typing import Dict, List
-from urllib.parse import urlparse
-from settings import settings
+import asyncio
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
 
-import requests
-from bs4 import BeautifulSoup
-from langchain_community.tools import DuckDuckGoSearchResults
+import httpx
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 
+from agents.base import BaseAgent
+from agents.registry import get_agent
+from settings import settings
+from state import describe_research
+from utils.blobs import get_blob_store
+from utils.deadline import (
+    TIMEOUT_ERRORS,
+    current_deadline,
+    expired,
+    mark_degraded,
+    stage,
+    wait_timeout,
+)
+from utils.dedupe import deduplicated
+from utils.events import emit
+from utils.extract import TextExtractor
+from utils.fetch import (
+    RetryableStatus,
+    TemporaryFetchError,
+    afetch_page,
+    fetch_page,
+    new_async_client,
+)
+from utils.knowledge import get_knowledge_index
+from utils.metrics import count, fail, span, traced
+from utils.minhash import NearDuplicateIndex, text_signature
+from utils.offload import SharedPage, arun_cpu, extract_page, offload_enabled, run_cpu
+from utils.page_cache import PageCache, normalize_url
+from utils.ratelimit import get_limiter, is_transient
+from utils.search import (
+    SearchBackend,
+    SearchError,
+    get_backends,
+    merge_results,
+    parse_queries,
+)
+from utils.text import chunk_text, pack_to_budget
+
+logger = logging.getLogger(__name__)
+
+# Reduce rounds before the remaining summaries are merged in one final call
+MAX_REDUCE_ROUNDS = 3
+
+
+def _merge_searches(
+    result_lists: List[Optional[List[Dict]]], errors: List[Exception]
+) -> List[Dict]:
+    """Merge the searches that finished, raising SearchError if all failed
+
+    None stands for a search that failed or ran out of time.
+    """
+    if errors and len(errors) == len(result_lists):
+        raise SearchError(f"All {len(errors)} searches failed: {errors[0]}")
+    finished = [results for results in result_lists if results is not None]
+    return merge_results(finished, settings.max_search_results)
 
-class SearchAgent:
-    def __init__(self, model: str = settings.gpt_model):
-        self.llm = ChatOpenAI(
-            model=model,
-            temperature=settings.temperature,
-            api_key=settings.openai_api_key
-        )
-        self.search_tool = DuckDuckGoSearchResults(num_results=3)  # Limit results
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    "You are a research agent. Generate relevant search queries "
-                    "for the given topic and analyze search results.",
-                ),
-                (
-                    "user",
-                    "Research topic: {topic}\n" "Current findings: {current_findings}",
-                ),
-            ]
-        )
 
-    def search(self, topic: str, current_findings: Dict) -> List[Dict]:
-        """Execute search and return relevant results"""
+class SearchAgent(BaseAgent):
+    name = "searcher"
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a research agent. Generate relevant search queries "
+                "for the given topic and analyze search results.",
+            ),
+            (
+                "user",
+                "Research topic: {topic}\n"
+                "Research plan: {plan}\n"
+                "Current findings: {current_findings}\n\n"
+                "Write {count} distinct web search queries covering different "
+                "parts of the plan, one per line, without numbering.",
+            ),
+        ]
+    )
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
+        self.backends = get_backends()
+
+    def plan_queries(
+        self, topic: str, current_findings: Dict, plan: Optional[str] = None
+    ) -> List[str]:
+        """Expand the topic into search queries guided by the research plan"""
+        if not plan or settings.search_queries == 1:
+            return [topic]
         try:
-            results = self.search_tool.invoke(topic)
-            return self._filter_results(results)
+            response = self._invoke(self._format_prompt(topic, current_findings, plan))
         except Exception as e:
-            # Log error and return empty list instead of failing
-            return []
+            logger.warning(f"Query planning failed, searching the topic only: {e}")
+            return [topic]
+        return parse_queries(response.content, topic, settings.search_queries)
 
-    def _filter_results(self, results: List[Dict]) -> List[Dict]:
-        """Filter and validate search results"""
-        return [
-            result for result in results if self._is_valid_url(result.get("link", ""))
+    async def aplan_queries(
+        self, topic: str, current_findings: Dict, plan: Optional[str] = None
+    ) -> List[str]:
+        """Async variant of plan_queries"""
+        if not plan or settings.search_queries == 1:
+            return [topic]
+        try:
+            response = await self._ainvoke(
+                self._format_prompt(topic, current_findings, plan)
+            )
+        except Exception as e:
+            logger.warning(f"Query planning failed, searching the topic only: {e}")
+            return [topic]
+        return parse_queries(response.content, topic, settings.search_queries)
+
+    @traced("agent")
+    def search(
+        self, topic: str, current_findings: Dict, plan: Optional[str] = None
+    ) -> List[Dict]:
+        """Run the planned queries on every backend and return ranked results"""
+        queries = self.plan_queries(topic, current_findings, plan)
+        jobs = [(backend, query) for query in queries for backend in self.backends]
+
+        def run(job) -> Optional[List[Dict]]:
+            backend, query = job
+            limiter = get_limiter(f"search:{backend.name}")
+            try:
+                # Topics of a batch share identical queries
+                with span("search", backend.name, query=query):
+                    return deduplicated(
+                        "search",
+                        (backend.name, query),
+                        lambda: limiter.call(lambda: backend.search(query)),
+                    )
+            except Exception as e:
+                logger.warning(f"{backend.name} search failed for {query!r}: {e}")
+                errors.append(e)
+                return None
+
+        errors: List[Exception] = []
+        executor = ContextThreadPoolExecutor(max_workers=max(1, len(jobs)))
+        try:
+            futures = [executor.submit(run, job) for job in jobs]
+            # Searches still running at the deadline are left behind
+            done, _ = wait(futures, timeout=wait_timeout())
+            result_lists = [f.result() if f in done else None for f in futures]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return _merge_searches(result_lists, errors)
+
+    @traced("agent")
+    async def asearch(
+        self, topic: str, current_findings: Dict, plan: Optional[str] = None
+    ) -> List[Dict]:
+        """Async variant of search"""
+        queries = await self.aplan_queries(topic, current_findings, plan)
+
+        async def run(backend: SearchBackend, query: str) -> Optional[List[Dict]]:
+            limiter = get_limiter(f"search:{backend.name}")
+            try:
+                with span("search", backend.name, query=query):
+                    return await limiter.acall(lambda: backend.asearch(query))
+            except Exception as e:
+                logger.warning(f"{backend.name} search failed for {query!r}: {e}")
+                errors.append(e)
+                return None
+
+        errors: List[Exception] = []
+        tasks = [
+            asyncio.ensure_future(run(backend, query))
+            for query in queries
+            for backend in self.backends
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=wait_timeout())
+        for task in pending:
+            task.cancel()
+        result_lists = [task.result() if task in done else None for task in tasks]
+        return _merge_searches(result_lists, errors)
+
+    def _format_prompt(self, topic: str, current_findings: Dict, plan: str) -> List:
+        return self.prompt.format_messages(
+            topic=topic,
+            plan=plan,
+            current_findings=describe_research(current_findings),
+            count=settings.search_queries - 1,  # The topic itself is searched too
+        )
+
+
+class ScraperAgent(BaseAgent):
+    name = "scraper"
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a content scraper. Extract and summarize relevant "
+                "information from the provided content.",
+            ),
+            ("user", "Content: {content}\nContext: {context}"),
+        ]
+    )
+    reduce_prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a content scraper. Combine partial summaries of one "
+                "document into a single summary of the relevant information.",
+            ),
+            ("user", "Partial summaries:\n{summaries}\nContext: {context}"),
         ]
+    )
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
+        self.page_cache = PageCache() if settings.page_cache_enabled else None
+
+    @traced("agent")
+    def scrape(
+        self,
+        url: str,
+        context: Dict,
+        seen: Optional[NearDuplicateIndex] = None,
+        previous: Optional[Dict] = None,
+    ) -> Dict:
+        """Scrape and process content from URL
+
+        With seen, pages that nearly match one already scraped in this run
+        are skipped before they reach the LLM. The page text itself goes to
+        the blob store; the result only carries its handle as content_ref.
+
+        previous is the source as an earlier run scraped it. The page is then
+        revalidated with the origin, and previous is returned as is if its
+        text has not changed, or if the page is only unreachable for now.
+        """
+        try:
+            content = self._fetch_content(url, revalidate=previous is not None)
+            signature = run_cpu(text_signature, content) if seen else None
+            duplicate = self._check_duplicate(url, signature, seen)
+            if duplicate:
+                return duplicate
+
+            content_ref = get_blob_store().put(content)
+            if previous and previous.get("content_ref") == content_ref:
+                return previous
+            summary = self.summarize(content, context)
+            return {"url": url, "summary": summary, "content_ref": content_ref}
+        except Exception as e:
+            if previous and _is_temporary(e):
+                logger.warning(f"Keeping the previous version of {url}: {e}")
+                return previous
+            fail(str(e))
+            return {"url": url, "error": str(e)}
 
-    def _is_valid_url(self, url: str) -> bool:
+    @traced("agent")
+    async def ascrape(
+        self,
+        url: str,
+        context: Dict,
+        client: Optional[httpx.AsyncClient] = None,
+        seen: Optional[NearDuplicateIndex] = None,
+        previous: Optional[Dict] = None,
+    ) -> Dict:
+        """Async variant of scrape, optionally reusing an open HTTP client"""
         try:
-            result = urlparse(url)
-            return all([result.scheme, result.netloc])
-        except ValueError:
-            return False
-
-
-class ScraperAgent:
-    def __init__(self, model: str = settings.gpt_model):
-        self.llm = ChatOpenAI(
-            model=model,
-            temperature=settings.temperature,
-            api_key=settings.openai_api_key
+            content = await self._afetch_content(
+                url, client, revalidate=previous is not None
+            )
+            signature = await arun_cpu(text_signature, content) if seen else None
+            duplicate = self._check_duplicate(url, signature, seen)
+            if duplicate:
+                return duplicate
+
+            content_ref = await asyncio.to_thread(get_blob_store().put, content)
+            if previous and previous.get("content_ref") == content_ref:
+                return previous
+            summary = await self.asummarize(content, context)
+            return {"url": url, "summary": summary, "content_ref": content_ref}
+        except Exception as e:
+            if previous and _is_temporary(e):
+                logger.warning(f"Keeping the previous version of {url}: {e}")
+                return previous
+            fail(str(e))
+            return {"url": url, "error": str(e)}
+
+    def _check_duplicate(
+        self,
+        url: str,
+        signature: Optional[Tuple[int, ...]],
+        seen: Optional[NearDuplicateIndex],
+    ) -> Optional[Dict]:
+        original = seen.claim_signature(url, signature) if seen else None
+        if original is None:
+            return None
+        logger.info(f"Skipping {url}: near-duplicate of {original}")
+        return {"url": url, "error": "near-duplicate", "duplicate_of": original}
+
+    def summarize(self, content: str, context: Dict) -> str:
+        """Summarize content, map-reducing over token-sized chunks if long"""
+        chunks = self._chunk(content)
+        if len(chunks) == 1:
+            return self._invoke(self._map_prompt(chunks[0], context)).content
+
+        # Map: summarize chunks in parallel batches
+        summaries = self._run_batch([self._map_prompt(c, context) for c in chunks])
+
+        # Reduce: merge partial summaries, in several rounds if they overflow
+        groups = self._group(summaries)
+        for _ in range(MAX_REDUCE_ROUNDS):
+            if len(groups) == 1:
+                break
+            merged = self._run_batch([self._reduce_prompt(g, context) for g in groups])
+            groups = self._group(merged)
+
+        final = self._reduce_prompt(self._last_group(groups), context)
+        return self._invoke(final).content
+
+    async def asummarize(self, content: str, context: Dict) -> str:
+        """Async variant of summarize"""
+        chunks = await self._achunk(content)
+        if len(chunks) == 1:
+            response = await self._ainvoke(self._map_prompt(chunks[0], context))
+            return response.content
+
+        summaries = await self._arun_batch(
+            [self._map_prompt(c, context) for c in chunks]
         )
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    "You are a content scraper. Extract and summarize relevant "
-                    "information from the provided content.",
-                ),
-                ("user", "Content: {content}\nContext: {context}"),
+        groups = self._group(summaries)
+        for _ in range(MAX_REDUCE_ROUNDS):
+            if len(groups) == 1:
+                break
+            merged = await self._arun_batch(
+                [self._reduce_prompt(g, context) for g in groups]
+            )
+            groups = self._group(merged)
+
+        final = self._reduce_prompt(self._last_group(groups), context)
+        response = await self._ainvoke(final)
+        return response.content
+
+    def _run_batch(self, prompts: List[List]) -> List[str]:
+        """Run prompts through the LLM, summary_batch_size at a time"""
+        with ContextThreadPoolExecutor(
+            max_workers=settings.summary_batch_size
+        ) as executor:
+            return [r.content for r in executor.map(self._invoke, prompts)]
+
+    async def _arun_batch(self, prompts: List[List]) -> List[str]:
+        semaphore = asyncio.Semaphore(settings.summary_batch_size)
+
+        async def run(messages: List) -> str:
+            async with semaphore:
+                return (await self._ainvoke(messages)).content
+
+        return await asyncio.gather(*(run(messages) for messages in prompts))
+
+    def _chunk(self, content: str) -> List[str]:
+        chunks = run_cpu(
+            chunk_text, content, settings.scrape_chunk_tokens, settings.gpt_model
+        )
+        return chunks[: settings.scrape_max_chunks] or [""]
+
+    async def _achunk(self, content: str) -> List[str]:
+        chunks = await arun_cpu(
+            chunk_text, content, settings.scrape_chunk_tokens, settings.gpt_model
+        )
+        return chunks[: settings.scrape_max_chunks] or [""]
+
+    def _group(self, summaries: List[str]) -> List[str]:
+        """Pack partial summaries into as few prompt-sized groups as possible"""
+        groups = chunk_text("\n\n".join(summaries), settings.scrape_chunk_tokens)
+        return groups or [""]
+
+    def _last_group(self, groups: List[str]) -> str:
+        """All groups in one prompt-sized group, for the final reduce"""
+        if len(groups) == 1:
+            return groups[0]
+        # Reduce rounds ran out: trim every group rather than drop any
+        return "\n\n".join(pack_to_budget(groups, settings.scrape_chunk_tokens))
+
+    def _map_prompt(self, content: str, context: Dict) -> List:
+        return self.prompt.format_messages(content=content, context=str(context))
+
+    def _reduce_prompt(self, summaries: str, context: Dict) -> List:
+        return self.reduce_prompt.format_messages(
+            summaries=summaries, context=str(context)
+        )
+
+    def _fetch_content(self, url: str, revalidate: bool = False) -> str:
+        """Fetch and clean content from URL, going through the page cache
+
+        With revalidate, even a fresh cache entry is checked with the origin.
+        """
+        # Topics of a batch that hit the same URL share one fetch
+        return deduplicated(
+            "page", normalize_url(url), lambda: self._fetch_page_text(url, revalidate)
+        )
+
+    def _fetch_page_text(self, url: str, revalidate: bool = False) -> str:
+        cached = self.page_cache.get(url) if self.page_cache else None
+        if cached and cached["fresh"] and not revalidate:
+            count(cache_hits=1)
+            return cached["text"]
+
+        headers = PageCache.conditional_headers(cached)
+        if offload_enabled():
+            # Stream the body into shared memory and parse it in a worker;
+            # the block is the only copy, the page keeps no content of its own
+            with SharedPage(settings.fetch_max_bytes) as body:
+                page = fetch_page(
+                    url, headers=headers, on_chunk=body.write, keep_body=False
+                )
+                if self._is_unchanged(page, cached):
+                    return self._revalidate(url, cached)
+                text = run_cpu(*self._extraction(page, body))
+                return self._store_page(url, page, text)
+
+        # Extract text while the body streams in, stopping once we have enough
+        extractor = TextExtractor()
+        page = fetch_page(url, headers=headers, on_chunk=extractor.feed_bytes)
+        if self._is_unchanged(page, cached):
+            return self._revalidate(url, cached)
+        return self._store_page(url, page, self._extract(page, extractor))
+
+    async def _afetch_content(
+        self,
+        url: str,
+        client: Optional[httpx.AsyncClient] = None,
+        revalidate: bool = False,
+    ) -> str:
+        """Fetch and clean content from URL without blocking the event loop"""
+        cached = self.page_cache.get(url) if self.page_cache else None
+        if cached and cached["fresh"] and not revalidate:
+            count(cache_hits=1)
+            return cached["text"]
+
+        headers = PageCache.conditional_headers(cached)
+        if offload_enabled():
+            with SharedPage(settings.fetch_max_bytes) as body:
+                page = await afetch_page(
+                    url, client, headers, on_chunk=body.write, keep_body=False
+                )
+                if self._is_unchanged(page, cached):
+                    return self._revalidate(url, cached)
+                text = await arun_cpu(*self._extraction(page, body))
+                return self._store_page(url, page, text)
+
+        extractor = TextExtractor()
+        page = await afetch_page(url, client, headers, on_chunk=extractor.feed_bytes)
+        if self._is_unchanged(page, cached):
+            return self._revalidate(url, cached)
+        return self._store_page(url, page, self._extract(page, extractor))
+
+    @staticmethod
+    def _is_unchanged(page: Dict, cached: Optional[Dict]) -> bool:
+        """Whether the origin confirmed a stale cache entry is still current"""
+        return page["status"] == 304 and bool(cached)
+
+    def _revalidate(self, url: str, cached: Dict) -> str:
+        self.page_cache.revalidated(url, cached)
+        return cached["text"]
+
+    @staticmethod
+    def _extract(page: Dict, extractor: TextExtractor) -> str:
+        if not extractor.fed:
+            extractor.feed(page["content"])
+        return extractor.get_text()
+
+    @staticmethod
+    def _extraction(page: Dict, body: SharedPage) -> Tuple:
+        """Task and arguments extracting the text of a body in shared memory"""
+        if not body.size and page.get("content"):
+            # Nothing was streamed through on_chunk, e.g. a stubbed fetcher
+            body.write(page["content"].encode("utf-8"), "utf-8")
+        return extract_page, body.ref, settings.extract_max_chars
+
+    def _store_page(self, url: str, page: Dict, text: str) -> str:
+        if self.page_cache:
+            self.page_cache.put(url, page, text)
+        return text
+
+
+def _is_temporary(error: BaseException) -> bool:
+    """Whether a page failed to load for a reason likely to go away"""
+    if isinstance(error, (RetryableStatus, TemporaryFetchError) + TIMEOUT_ERRORS):
+        return True
+    return is_transient(error)
+
+
+def _by_url(sources: Sequence[Dict]) -> Dict[str, Dict]:
+    return {normalize_url(source["url"]): source for source in sources}
+
+
+def iter_scrapes(
+    scraper_agent: ScraperAgent,
+    urls: List[str],
+    context: Dict,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    previous: Sequence[Dict] = (),
+) -> Iterator[Tuple[int, Dict]]:
+    """Scrape URLs concurrently, yielding (index, result) as each one succeeds
+
+    Each URL gets its own deadline, counted from the moment its worker starts.
+    URLs that fail or miss the deadline are skipped. deadline is a
+    time.monotonic() value after which the remaining URLs are abandoned, by
+    default the current stage's; closing the iterator early abandons them
+    as well. URLs of previous sources are revalidated rather than scraped
+    afresh (see ScraperAgent.scrape).
+    """
+    if not urls:
+        return
+    if current_deadline() is not None:
+        deadline = min(deadline or current_deadline(), current_deadline())
+
+    max_workers = max_workers or settings.scrape_concurrency
+    timeout = timeout or settings.scrape_timeout
+    started: Dict[int, float] = {}
+    seen = NearDuplicateIndex()
+    known = _by_url(previous)
+
+    def run(index: int, url: str) -> Dict:
+        started[index] = time.monotonic()
+        # Only revalidations pass previous, so simpler scrapers still fit
+        earlier = known.get(normalize_url(url))
+        options = {"previous": earlier} if earlier is not None else {}
+        return scraper_agent.scrape(url, context, seen, **options)
+
+    executor = ContextThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+    try:
+        futures = {executor.submit(run, i, url): i for i, url in enumerate(urls)}
+        pending = set(futures)
+        while pending:
+            # Wake up when a scrape finishes or the earliest deadline passes
+            now = time.monotonic()
+            deadlines = [
+                started[futures[f]] + timeout for f in pending if futures[f] in started
             ]
+            if deadline is not None:
+                deadlines.append(deadline)
+            wait_for = max(min(deadlines) - now, 0) if deadlines else timeout
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"Scrape failed for {urls[index]}: {e}")
+                    continue
+                if "error" not in result:  # Only successful scrapes
+                    emit("source", url=urls[index], summary=result["summary"])
+                    yield index, result
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline and pending:
+                logger.warning(f"Abandoning {len(pending)} scrapes past the deadline")
+                return
+            for future in list(pending):
+                index = futures[future]
+                if index in started and now - started[index] >= timeout:
+                    logger.warning(f"Scrape timed out after {timeout}s: {urls[index]}")
+                    pending.discard(future)
+    finally:
+        # Do not block on workers that are stuck past their deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scrape_sources(
+    scraper_agent: ScraperAgent,
+    urls: List[str],
+    context: Dict,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    previous: Sequence[Dict] = (),
+) -> List[Dict]:
+    """Scrape URLs concurrently and return successful results in input order"""
+    results = dict(
+        iter_scrapes(
+            scraper_agent, urls, context, max_workers, timeout, previous=previous
         )
+    )
+    return [results[i] for i in sorted(results)]
+
+
+async def aiter_scrapes(
+    scraper_agent: ScraperAgent,
+    urls: List[str],
+    context: Dict,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    previous: Sequence[Dict] = (),
+) -> AsyncIterator[Tuple[int, Dict]]:
+    """Async variant of iter_scrapes sharing one HTTP client across URLs
 
-    def scrape(self, url: str, context: Dict) -> Dict:
-        """Scrape and process content from URL"""
+    Callers that stop early should aclose() the iterator so the remaining
+    scrapes are cancelled straight away.
+    """
+    if current_deadline() is not None:
+        deadline = min(deadline or current_deadline(), current_deadline())
+    max_workers = max_workers or settings.scrape_concurrency
+    timeout = timeout or settings.scrape_timeout
+    semaphore = asyncio.Semaphore(max_workers)
+    seen = NearDuplicateIndex()
+    known = _by_url(previous)
+
+    async with new_async_client() as client:
+
+        async def run(url: str) -> Dict:
+            earlier = known.get(normalize_url(url))
+            options = {"previous": earlier} if earlier is not None else {}
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(
+                        scraper_agent.ascrape(url, context, client, seen, **options),
+                        timeout,
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning(f"Scrape timed out after {timeout}s: {url}")
+                    return {"url": url, "error": "timeout"}
+
+        tasks = {asyncio.ensure_future(run(url)): i for i, url in enumerate(urls)}
         try:
-            content = self._fetch_content(url)
-            response = self.llm.invoke(
-                self.prompt.format_messages(
-                    content=content[:4000], context=str(context)  # Limit content length
+            pending = set(tasks)
+            while pending:
+                wait_for = None
+                if deadline is not None:
+                    wait_for = deadline - time.monotonic()
+                    if wait_for <= 0:
+                        logger.warning(
+                            f"Abandoning {len(pending)} scrapes past the deadline"
+                        )
+                        return
+                done, pending = await asyncio.wait(
+                    pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
                 )
-            )
+                for task in done:
+                    index, result = tasks[task], task.result()
+                    if "error" not in result:
+                        emit("source", url=urls[index], summary=result["summary"])
+                        yield index, result
+        finally:
+            for task in tasks:
+                task.cancel()
 
-            return {"url": url, "summary": response.content, "raw_content": content}
-        except Exception as e:
-            return {"url": url, "error": str(e)}
 
-    def _fetch_content(self, url: str) -> str:
-        """Fetch and clean content from URL"""
-        response = requests.get(url, headers={"User-Agent": "Research Bot 1.0"})
-        soup = BeautifulSoup(response.text, "html.parser")
+async def ascrape_sources(
+    scraper_agent: ScraperAgent,
+    urls: List[str],
+    context: Dict,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    previous: Sequence[Dict] = (),
+) -> List[Dict]:
+    """Async variant of scrape_sources"""
+    results = {
+        index: result
+        async for index, result in aiter_scrapes(
+            scraper_agent, urls, context, max_workers, timeout, previous=previous
+        )
+    }
+    return [results[i] for i in sorted(results)]
+
+
+def _finish_research(state: Dict, scraped_data: List[Dict]) -> Dict:
+    # With no sources the content team reports the run as failed
+    if not scraped_data:
+        logger.warning("Research found no usable sources")
+
+    # Update state
+    state["research_data"]["sources"] = scraped_data
+    state["stage"] = "content"
+    state["next"] = "content_team"
+    return state
+
+
+def recall_sources(topic: str) -> List[Dict]:
+    """Previously scraped sources relevant to topic, from the knowledge index"""
+    if not settings.knowledge_enabled:
+        return []
+    try:
+        return get_knowledge_index().retrieve(topic, settings.max_search_results)
+    except Exception as e:
+        logger.warning(f"Knowledge index lookup failed: {e}")
+        return []
+
+
+def remember_sources(topic: str, sources: List[Dict]) -> None:
+    """Add freshly scraped sources to the knowledge index"""
+    if not settings.knowledge_enabled or not sources:
+        return
+    try:
+        get_knowledge_index().add(topic, sources)
+    except Exception as e:
+        logger.warning(f"Could not index sources: {e}")
+
+
+def gap_urls(
+    search_results: List[Dict], known: List[Dict], limit: Optional[int] = None
+) -> List[str]:
+    """URLs of search results that known sources do not already cover
+
+    At most limit URLs are returned, by default as many as it takes to make
+    up max_search_results sources together with the known ones.
+    """
+    if limit is None:
+        limit = max(settings.max_search_results - len(known), 0)
+    seen = {normalize_url(source["url"]) for source in known}
+    urls = [
+        result["link"]
+        for result in search_results
+        if normalize_url(result["link"]) not in seen
+    ]
+    return urls[:limit]
 
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
 
-        return soup.get_text()
+def _round_limit(found: List[Dict]) -> Optional[int]:
+    """New URLs a research round may scrape, given the sources found so far"""
+    # Every round after the first brings up to max_search_results new sources
+    return settings.max_search_results if found else None
+
+
+def search_gaps(
+    search_agent: SearchAgent, state: Dict, topic: str, known: List[Dict]
+) -> List[Dict]:
+    """Search the topic, going on without results if known sources exist
+
+    Raises SearchError if every search failed and there is nothing known.
+    """
+    try:
+        return search_agent.search(
+            topic, state.get("research_data", {}), state.get("plan")
+        )
+    except SearchError:
+        if not known:
+            raise
+        mark_degraded(state, "search")
+        return []
+
+
+async def asearch_gaps(
+    search_agent: SearchAgent, state: Dict, topic: str, known: List[Dict]
+) -> List[Dict]:
+    """Async variant of search_gaps"""
+    try:
+        return await search_agent.asearch(
+            topic, state.get("research_data", {}), state.get("plan")
+        )
+    except SearchError:
+        if not known:
+            raise
+        mark_degraded(state, "search")
+        return []
 
 
 def research_team_step(state: Dict) -> Dict:
     """Coordinate research team activities"""
-    search_agent = SearchAgent()
-    scraper_agent = ScraperAgent()
+    search_agent = get_agent(SearchAgent)
+    scraper_agent = get_agent(ScraperAgent)
 
     # Get topic from state
     topic = state.get("topic") or state.get("research_data", {}).get("topic")
@@ -110,30 +769,65 @@ def research_team_step(state: Dict) -> Dict:
 
     # Execute search with error handling
     try:
-        search_results = search_agent.search(topic, state.get("research_data", {}))
-        
-        # Scrape and process results
-        scraped_data = []
-        for result in search_results[:3]:  # Limit to top 3 results
-            try:
-                scraped = scraper_agent.scrape(result["link"], {"topic": topic})
-                if "error" not in scraped:  # Only add successful scrapes
-                    scraped_data.append(scraped)
-            except Exception:
-                continue  # Skip failed scrapes
-
-        # Ensure we have at least some data
-        if not scraped_data:
-            scraped_data = [{"url": "example.com", "summary": "No valid results found"}]
-
-        # Update state
-        state["research_data"]["sources"] = scraped_data
-        state["stage"] = "content"
-        state["next"] = "content_team"
-        
-        return state
+        with stage("search"):
+            # Later rounds build on the sources earlier rounds found
+            found = state["research_data"].get("sources", [])
+            # Start from what earlier runs scraped, and only search for the gaps
+            prior = found or recall_sources(topic)
+            if not found and len(prior) >= settings.knowledge_min_sources:
+                logger.info(f"Answering {topic!r} from {len(prior)} indexed sources")
+                return _finish_research(state, prior)
+
+            search_results = search_gaps(search_agent, state, topic, prior)
+            if expired():
+                mark_degraded(state, "search")
+
+        # Scrape and process results concurrently, until the stage deadline
+        with stage("scrape"):
+            urls = gap_urls(search_results, prior, _round_limit(found))
+            scraped_data = scrape_sources(scraper_agent, urls, {"topic": topic})
+            if expired():
+                mark_degraded(state, "scrape")
+        remember_sources(topic, scraped_data)
+
+        return _finish_research(state, prior + scraped_data)
     except Exception as e:
         # Handle any remaining errors
         state["error"] = str(e)
         state["next"] = "FINISH"
         return state
+
+
+async def aresearch_team_step(state: Dict) -> Dict:
+    """Async variant of research_team_step"""
+    search_agent = get_agent(SearchAgent)
+    scraper_agent = get_agent(ScraperAgent)
+
+    topic = state.get("topic") or state.get("research_data", {}).get("topic")
+    if not topic:
+        raise ValueError("No topic found in state")
+
+    try:
+        with stage("search"):
+            found = state["research_data"].get("sources", [])
+            prior = found or await asyncio.to_thread(recall_sources, topic)
+            if not found and len(prior) >= settings.knowledge_min_sources:
+                logger.info(f"Answering {topic!r} from {len(prior)} indexed sources")
+                return _finish_research(state, prior)
+
+            search_results = await asearch_gaps(search_agent, state, topic, prior)
+            if expired():
+                mark_degraded(state, "search")
+
+        with stage("scrape"):
+            urls = gap_urls(search_results, prior, _round_limit(found))
+            scraped_data = await ascrape_sources(scraper_agent, urls, {"topic": topic})
+            if expired():
+                mark_degraded(state, "scrape")
+        await asyncio.to_thread(remember_sources, topic, scraped_data)
+
+        return _finish_research(state, prior + scraped_data)
+    except Exception as e:
+        state["error"] = str(e)
+        state["next"] = "FINISH"
+        return state
@@ -1,84 +1,308 @@
-from typing import Dict
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional
 from settings import settings
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, StateGraph
 
-from agents.content_team import content_team_step
-from agents.research_team import research_team_step
-from state import ResearchState
+from agents.base import BaseAgent
+from agents.content_team import acontent_team_step, content_team_step
+from agents.pipeline import apipelined_research_step, pipelined_research_step
+from agents.refresh import arefresh_research_step, refresh_research_step
+from agents.registry import get_agent
+from agents.research_team import aresearch_team_step, research_team_step
+from state import ResearchState, describe_research
+from utils.checkpoint import get_checkpointer
+from utils.deadline import (
+    CONTENT_STAGES,
+    STAGE_SHARES,
+    TIMEOUT_ERRORS,
+    mark_degraded,
+    run_budget,
+    run_time_left,
+    stage,
+)
+from utils.metrics import tokens_used, traced
+from utils.minhash import novelty
+from utils.ratelimit import PRIORITY_LOW
+from utils.text import truncate_tokens
 
+logger = logging.getLogger(__name__)
 
-class SupervisorAgent:
-    def __init__(self, model: str = settings.gpt_model):
-        self.llm = ChatOpenAI(
-            model=model,
-            temperature=settings.temperature,
-            api_key=settings.openai_api_key
-        )
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    "You are a research supervisor coordinating a team of agents. "
-                    "Plan and delegate research tasks based on the given topic.",
-                ),
-                ("user", "Topic: {topic}\nCurrent research: {research_data}"),
-            ]
-        )
+# Tokens of the previous plan shown when planning the next research round
+PLAN_PREVIEW = 300
+
+
+class SupervisorAgent(BaseAgent):
+    name = "supervisor"
+    # Plans start new runs, so they wait behind runs already under way
+    priority = PRIORITY_LOW
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a research supervisor coordinating a team of agents. "
+                "Plan and delegate research tasks based on the given topic.",
+            ),
+            ("user", "Topic: {topic}\nCurrent research: {research_data}"),
+        ]
+    )
+    next_round_prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a research supervisor coordinating a team of agents. "
+                "The team has researched the topic for some rounds. Plan the "
+                "next round: what is still missing, unclear or shallow, and "
+                "what the team should search for to cover it.",
+            ),
+            (
+                "user",
+                "Topic: {topic}\nPrevious plan: {plan}\n"
+                "Research so far: {research_data}",
+            ),
+        ]
+    )
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
 
+    @traced("agent")
     def create_research_plan(self, state: Dict) -> Dict:
         """Create initial research plan and team assignments"""
-        response = self.llm.invoke(
-            self.prompt.format_messages(
-                topic=state.get("topic", ""),
-                research_data=str(state.get("research_data", {})),
-            )
-        )
+        response = self._invoke(self._format_prompt(state))
 
         state["plan"] = response.content
         state["stage"] = "research"
         return state
 
+    @traced("agent")
+    async def acreate_research_plan(self, state: Dict) -> Dict:
+        """Async variant of create_research_plan"""
+        response = await self._ainvoke(self._format_prompt(state))
+
+        state["plan"] = response.content
+        state["stage"] = "research"
+        return state
+
+    def _format_prompt(self, state: Dict) -> List:
+        research_data = state.get("research_data", {})
+        if research_data.get("rounds"):
+            return self.next_round_prompt.format_messages(
+                topic=state.get("topic", ""),
+                plan=truncate_tokens(state.get("plan") or "", PLAN_PREVIEW),
+                research_data=describe_research(research_data),
+            )
+        return self.prompt.format_messages(
+            topic=state.get("topic", ""),
+            research_data=describe_research(research_data),
+        )
+
 
 def supervisor_step(state: Dict) -> Dict:
     """Supervisor step function for the workflow"""
-    supervisor = SupervisorAgent()
+    supervisor = get_agent(SupervisorAgent)
     
     # Ensure topic is available in state
     topic = state.get("research_data", {}).get("topic", "")
     if not topic:
         raise ValueError("No topic provided in research data")
-        
-    updated_state = supervisor.create_research_plan(state)
+
+    try:
+        if state.get("plan") and not state["research_data"].get("rounds"):
+            # A refresh searches along the plan of the run it refreshes
+            updated_state = state
+            updated_state["stage"] = "research"
+        else:
+            with stage("plan"):
+                updated_state = supervisor.create_research_plan(state)
+    except TIMEOUT_ERRORS as e:
+        # Research the bare topic rather than spend the budget on a plan
+        logger.warning(f"Planning ran out of time: {e}")
+        updated_state = state
+        mark_degraded(updated_state, "plan")
     updated_state["next"] = "research_team"
     updated_state["topic"] = topic  # Ensure topic is in root state
     
     return updated_state
 
 
-def create_workflow() -> StateGraph:
-    """Create the main research workflow graph"""
+async def asupervisor_step(state: Dict) -> Dict:
+    """Async variant of supervisor_step"""
+    supervisor = get_agent(SupervisorAgent)
+
+    topic = state.get("research_data", {}).get("topic", "")
+    if not topic:
+        raise ValueError("No topic provided in research data")
+
+    try:
+        if state.get("plan") and not state["research_data"].get("rounds"):
+            updated_state = state
+            updated_state["stage"] = "research"
+        else:
+            with stage("plan"):
+                updated_state = await supervisor.acreate_research_plan(state)
+    except TIMEOUT_ERRORS as e:
+        logger.warning(f"Planning ran out of time: {e}")
+        updated_state = state
+        mark_degraded(updated_state, "plan")
+    updated_state["next"] = "research_team"
+    updated_state["topic"] = topic
+
+    return updated_state
+
+
+def _another_round(state: Dict, rounds: List[Dict]) -> bool:
+    """Whether the research should go on for another round"""
+    last = rounds[-1]
+    if len(rounds) >= settings.research_rounds or state.get("error"):
+        return False
+    if "degraded" in (state.get("metadata") or {}):
+        logger.info("Research is short of time, moving on to writing")
+        return False
+    if not last["sources"] or last["novelty"] < settings.research_min_novelty:
+        logger.info(f"Research converged after {len(rounds)} rounds")
+        return False
+
+    budget = settings.research_token_budget
+    if budget and last["tokens"] is not None:
+        # Go on only if a round like the last one still fits the budget
+        before = rounds[-2]["tokens"] if len(rounds) > 1 else 0
+        cost = max(last["tokens"] - (before or 0), 0)
+        if last["tokens"] + cost > budget:
+            logger.info(f"Research token budget spent after {len(rounds)} rounds")
+            return False
+
+    seconds = run_budget()
+    if seconds and last.get("time_left") is not None:
+        # Stages of a new round split whatever time is left, so go on only if
+        # a round like the last one still leaves synthesis and writing theirs
+        before = rounds[-2].get("time_left") if len(rounds) > 1 else seconds
+        spent = max((before or seconds) - last["time_left"], 0)
+        reserved = seconds * sum(STAGE_SHARES[name] for name in CONTENT_STAGES)
+        if last["time_left"] < spent + reserved:
+            logger.info(f"Research time budget spent after {len(rounds)} rounds")
+            return False
+    return True
+
+
+def review_step(state: Dict) -> Dict:
+    """Record a research round and decide whether to run another one
+
+    Each round is logged in research_data["rounds"] with the number of
+    sources it added, their novelty (the share of their summaries' word
+    shingles no earlier source had) and the LLM tokens the run has used.
+    The run goes back to the supervisor for another round unless it
+    reached research_rounds, converged (the round added no source or less
+    novelty than research_min_novelty), or another round like the last
+    would overrun research_token_budget, or eat into the time synthesis
+    and writing get of research_timeout.
+    """
+    research_data = state.get("research_data", {})
+    rounds = research_data.setdefault("rounds", [])
+    sources = research_data.get("sources", [])
+    earlier = sum(record["sources"] for record in rounds)
+    summaries = [source.get("summary", "") for source in sources]
+    rounds.append(
+        {
+            "sources": len(sources) - earlier,
+            "novelty": novelty(summaries[earlier:], summaries[:earlier]),
+            "tokens": tokens_used(),
+            "time_left": run_time_left(),
+        }
+    )
+
+    if _another_round(state, rounds):
+        logger.info(f"Starting research round {len(rounds) + 1}")
+        state["next"] = "supervisor"
+    elif not state.get("error"):
+        state["next"] = "content_team"
+    return state
+
+
+async def areview_step(state: Dict) -> Dict:
+    """Async variant of review_step"""
+    return review_step(state)
+
+
+def create_workflow(
+    async_mode: bool = False,
+    pipelined: Optional[bool] = None,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    refresh: bool = False,
+) -> StateGraph:
+    """Create the main research workflow graph
+
+    With async_mode the nodes are coroutines and the graph must be run with
+    ainvoke/astream. With pipelined (default: settings.pipeline_mode) the
+    research team synthesizes sources as they arrive and hands over to the
+    writer once a quorum is reached. A checkpointer persists the state after
+    every node, keyed by the thread_id in the run config. With refresh the
+    research team brings the sources of the state's previous run up to date
+    (see refresh_research_step) instead of starting over. Otherwise research
+    may run for up to settings.research_rounds rounds (see review_step).
+    """
+    if pipelined is None:
+        pipelined = settings.pipeline_mode
+    if refresh:
+        research_steps = (refresh_research_step, arefresh_research_step)
+    elif pipelined:
+        research_steps = (pipelined_research_step, apipelined_research_step)
+    else:
+        research_steps = (research_team_step, aresearch_team_step)
+
     # Initialize with schema
     workflow = StateGraph(ResearchState)
 
     # Define state transitions
-    def should_continue(state):
-        return state["next"] != "FINISH"
+    def after_review(state):
+        return state["next"] == "supervisor"
+
+    def add_node(name, step):
+        # Time each node and count the errors it reports in the state
+        workflow.add_node(name, traced("node", name, error_key="error")(step))
 
     # Add nodes and edges
-    workflow.add_node("supervisor", supervisor_step)
-    workflow.add_node("research_team", research_team_step)
-    workflow.add_node("content_team", content_team_step)
+    if async_mode:
+        add_node("supervisor", asupervisor_step)
+        add_node("research_team", research_steps[1])
+        add_node("content_team", acontent_team_step)
+    else:
+        add_node("supervisor", supervisor_step)
+        add_node("research_team", research_steps[0])
+        add_node("content_team", content_team_step)
 
     # Define workflow
     workflow.set_entry_point("supervisor")
     workflow.add_edge("supervisor", "research_team")
-    workflow.add_edge("research_team", "content_team")
-    workflow.add_conditional_edges(
-        "content_team", should_continue, {True: "supervisor", False: END}
-    )
+    if refresh or pipelined:
+        # Both already decide how far to go, so they run a single round
+        workflow.add_edge("research_team", "content_team")
+    else:
+        add_node("review", areview_step if async_mode else review_step)
+        workflow.add_edge("research_team", "review")
+        workflow.add_conditional_edges(
+            "review", after_review, {True: "supervisor", False: "content_team"}
+        )
+    workflow.add_edge("content_team", END)
 
     # Compile the graph before returning
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+
+@lru_cache(maxsize=None)
+def get_workflow(
+    async_mode: bool = False,
+    pipelined: Optional[bool] = None,
+    checkpointed: bool = False,
+    refresh: bool = False,
+):
+    """Return the workflow graph, compiled once per process"""
+    return create_workflow(
+        async_mode=async_mode,
+        pipelined=pipelined,
+        checkpointer=get_checkpointer() if checkpointed else None,
+        refresh=refresh,
+    )
@@ -0,0 +1,81 @@
+"""Benchmark the streaming text extractor against the BeautifulSoup path
+
+Usage: PYTHONPATH=src python src/benchmarks/bench_extract.py [--paragraphs N]
+"""
+import argparse
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from utils.extract import TextExtractor
+
+CHUNK_SIZE = 16384
+
+
+def build_page(paragraphs: int) -> bytes:
+    """Build a large article page with typical boilerplate around it"""
+    nav = "".join(f'<li><a href="/s/{i}">Section {i}</a></li>' for i in range(200))
+    body = "".join(
+        f"<p>Paragraph {i}: agentic research systems coordinate planning, "
+        f"search, scraping and writing agents to cover a topic in depth.</p>"
+        for i in range(paragraphs)
+    )
+    script = "<script>" + "var x = 1;" * 5000 + "</script>"
+    footer = "<footer>" + "<p>Legal boilerplate text.</p>" * 200 + "</footer>"
+    html = (
+        f"<html><head>{script}<style>p {{ margin: 0 }}</style></head><body>"
+        f"<nav><ul>{nav}</ul></nav><main><article><h1>Title</h1>{body}"
+        f"</article></main>{footer}</body></html>"
+    )
+    return html.encode("utf-8")
+
+
+def beautifulsoup_path(data: bytes) -> str:
+    """The original ScraperAgent path: full parse, then the prompt slice"""
+    soup = BeautifulSoup(data.decode("utf-8"), "html.parser")
+    for script in soup(["script", "style"]):
+        script.decompose()
+    return soup.get_text()[:4000]
+
+
+def streaming_path(data: bytes) -> str:
+    """Feed the extractor chunk by chunk, as the fetcher does"""
+    extractor = TextExtractor(max_chars=4000)
+    for start in range(0, len(data), CHUNK_SIZE):
+        if extractor.feed_bytes(data[start : start + CHUNK_SIZE], "utf-8"):
+            break
+    return extractor.get_text()
+
+
+def measure(fn, data: bytes, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    text = fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = build_page(args.paragraphs)
+    print(f"Page size: {len(data) / 1e6:.2f} MB")
+    print(f"{'path':<16}{'best time':>12}{'peak memory':>16}{'text chars':>12}")
+    paths = (("beautifulsoup", beautifulsoup_path), ("streaming", streaming_path))
+    for name, fn in paths:
+        seconds, peak, chars = measure(fn, data, args.repeat)
+        print(f"{name:<16}{seconds * 1000:>10.1f}ms{peak / 1e6:>14.2f}MB{chars:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Benchmark end-to-end research runs offline, at several concurrency levels
+
+A fake LLM and a loopback web server stand in for OpenAI and the internet,
+so results are reproducible and need no network or API keys.
+
+Usage: PYTHONPATH=src python src/benchmarks/bench_research.py [--topics N]
+    [--concurrency 1,4,16] [--workload batch,async] [--trace-memory]
+    [--cpu-workers N] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+# Settings require API keys, which the offline benchmark never uses
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("SERPER_API_KEY", "offline")
+
+from benchmarks.fakes import LocalWeb, offline  # noqa: E402
+from main import arun_research, run_research_batch  # noqa: E402
+from settings import settings  # noqa: E402
+from utils.offload import shutdown_process_pool, warm_up_process_pool  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def run_batch(topics: List[str], concurrency: int) -> List[Dict]:
+    """Thread-pooled runs through run_research_batch"""
+    return [
+        {"elapsed": item["elapsed"], "ok": not item["error"]}
+        for item in run_research_batch(topics, concurrency=concurrency)
+    ]
+
+
+def run_async(topics: List[str], concurrency: int) -> List[Dict]:
+    """arun_research on one event loop, at most concurrency at a time"""
+
+    async def main() -> List[Dict]:
+        limit = asyncio.Semaphore(concurrency)
+
+        async def research(topic: str) -> Dict:
+            async with limit:
+                start = time.monotonic()
+                result = await arun_research(topic)
+                ok = bool(result) and not result.get("error")
+                return {"elapsed": time.monotonic() - start, "ok": ok}
+
+        return await asyncio.gather(*(research(topic) for topic in topics))
+
+    return asyncio.run(main())
+
+
+WORKLOADS: Dict[str, Callable[[List[str], int], List[Dict]]] = {
+    "batch": run_batch,
+    "async": run_async,
+}
+
+
+def peak_heap(workload: str, topics: List[str], concurrency: int) -> int:
+    """Peak Python heap of a second, traced run of the workload"""
+    tracemalloc.start()
+    try:
+        WORKLOADS[workload](topics, concurrency)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(workload: str, topics: List[str], concurrency: int, trace: bool) -> Dict:
+    start = time.monotonic()
+    runs = WORKLOADS[workload](topics, concurrency)
+    wall = time.monotonic() - start
+    # Tracing slows Python code down severalfold, so it gets its own run
+    peak = peak_heap(workload, topics, concurrency) if trace else 0
+
+    latencies = [run["elapsed"] for run in runs]
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_scale = 1 if sys.platform == "darwin" else 1024
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_scale
+    return {
+        "workload": workload,
+        "concurrency": concurrency,
+        "topics": len(topics),
+        "errors": sum(not run["ok"] for run in runs),
+        "throughput": len(runs) / wall,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "peak_heap_mb": peak / 1e6,
+        "max_rss_mb": max_rss / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--topics", type=int, default=16)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--workload", default="batch,async")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--output-tokens", type=int, default=150)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--slow-delay", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        default=0,
+        help="parse pages in this many processes (default: in the calling thread)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="rerun each level under tracemalloc to report its peak heap",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)  # Keep the table readable
+    settings.cpu_workers = args.cpu_workers
+    warm_up_process_pool()  # Worker startup is paid once per process, not per run
+
+    web = LocalWeb(args.pages, args.slow_rate, args.slow_delay, args.error_rate)
+    web.start()
+    results = []
+    print(
+        f"{'workload':<10}{'conc':>6}{'topics':>8}{'errors':>8}{'runs/s':>9}"
+        f"{'p50':>9}{'p95':>9}{'p99':>9}{'heap MB':>10}{'rss MB':>9}"
+    )
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir, offline(
+            web,
+            cache_dir,
+            latency=args.llm_latency,
+            tokens_per_second=args.tokens_per_second,
+            output_tokens=args.output_tokens,
+        ):
+            for workload in args.workload.split(","):
+                for concurrency in map(int, args.concurrency.split(",")):
+                    # Fresh topics per level, so no level reuses another's work
+                    topics = [
+                        f"{workload} benchmark topic {concurrency}-{i}"
+                        for i in range(args.topics)
+                    ]
+                    row = measure(workload, topics, concurrency, args.trace_memory)
+                    results.append(row)
+                    print(
+                        f"{workload:<10}{concurrency:>6}{row['topics']:>8}"
+                        f"{row['errors']:>8}{row['throughput']:>9.2f}"
+                        f"{row['p50']:>8.2f}s{row['p95']:>8.2f}s{row['p99']:>8.2f}s"
+                        f"{row['peak_heap_mb']:>10.1f}{row['max_rss_mb']:>9.1f}"
+                    )
+    finally:
+        web.stop()
+        shutdown_process_pool()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Offline stand-ins for the LLM, the web and search, for benchmarks
+
+Nothing here touches the network: FakeChatModel sleeps instead of calling
+OpenAI, LocalWeb serves a generated corpus of HTML pages over loopback HTTP
+and LocalSearchBackend queries that server.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import openai
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from agents.registry import clear_registry
+from settings import settings
+from utils.blobs import get_blob_store
+from utils.fetch import get_session
+from utils.ratelimit import get_limiter
+from utils.search import SEARCH_BACKENDS, SearchBackend
+from utils.text import count_tokens
+
+# fmt: off
+WORDS = [
+    "agent", "planner", "retrieval", "benchmark", "latency", "throughput",
+    "model", "memory", "tool", "graph", "search", "source", "summary",
+    "evaluation", "context", "reasoning", "pipeline", "workflow", "cache",
+    "token", "budget", "quality", "dataset", "feedback", "architecture",
+    "coordination", "synthesis", "citation", "scheduler", "prompt",
+]
+# fmt: on
+
+
+def _rng(*parts) -> random.Random:
+    """Random generator seeded by parts, so runs are reproducible"""
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "little"))
+
+
+def fake_text(seed, tokens: int) -> str:
+    """Deterministic prose of roughly tokens tokens"""
+    rng = _rng("text", seed)
+    sentences = []
+    while tokens > 0:
+        length = rng.randint(8, 20)
+        words = rng.choices(WORDS, k=length)
+        sentences.append(" ".join(words).capitalize() + ".")
+        tokens -= length + 1
+    return " ".join(sentences)
+
+
+class FakeChatModel:
+    """Stand-in for ChatOpenAI with a fixed latency and token rate
+
+    Each call waits latency seconds for the first token, then produces
+    output_tokens at tokens_per_second. Calls that would outlast their
+    timeout raise openai.APITimeoutError, as the real client does.
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        latency: float = 0.2,
+        tokens_per_second: float = 200.0,
+        output_tokens: int = 150,
+        **kwargs,
+    ):
+        self.model_name = model or settings.gpt_model
+        self.temperature = temperature
+        self.max_retries = 0
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+
+    def _reply(self, messages) -> str:
+        return fake_text(str(messages[-1].content), self.output_tokens)
+
+    def _message(self, messages, content: str) -> AIMessage:
+        prompt_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": self.output_tokens,
+        }
+        return AIMessage(content=content, response_metadata={"token_usage": usage})
+
+    def _check_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        """Seconds to sleep before timing out, or None if the call fits"""
+        duration = self.latency + self.output_tokens / self.tokens_per_second
+        if timeout is not None and duration > timeout:
+            return timeout
+        return None
+
+    @staticmethod
+    def _timeout_error() -> openai.APITimeoutError:
+        return openai.APITimeoutError(
+            request=httpx.Request("POST", "https://api.openai.com/v1/chat")
+        )
+
+    def invoke(self, messages, timeout: Optional[float] = None, **kwargs):
+        cutoff = self._check_timeout(timeout)
+        if cutoff is not None:
+            time.sleep(cutoff)
+            raise self._timeout_error()
+        time.sleep(self.latency + self.output_tokens / self.tokens_per_second)
+        return self._message(messages, self._reply(messages))
+
+    async def ainvoke(self, messages, timeout: Optional[float] = None, **kwargs):
+        cutoff = self._check_timeout(timeout)
+        if cutoff is not None:
+            await asyncio.sleep(cutoff)
+            raise self._timeout_error()
+        await asyncio.sleep(self.latency + self.output_tokens / self.tokens_per_second)
+        return self._message(messages, self._reply(messages))
+
+    def stream(self, messages, timeout: Optional[float] = None, **kwargs):
+        if self._check_timeout(timeout) is not None:
+            raise self._timeout_error()
+        time.sleep(self.latency)
+        for word in self._reply(messages).split(" "):
+            time.sleep(1 / self.tokens_per_second)
+            yield AIMessageChunk(content=word + " ")
+
+    async def astream(self, messages, timeout: Optional[float] = None, **kwargs):
+        if self._check_timeout(timeout) is not None:
+            raise self._timeout_error()
+        await asyncio.sleep(self.latency)
+        for word in self._reply(messages).split(" "):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield AIMessageChunk(content=word + " ")
+
+
+def build_page(index: int) -> bytes:
+    """A generated article page with realistic boilerplate around the text"""
+    rng = _rng("page", index)
+    paragraphs = "".join(
+        f"<p>{fake_text((index, i), rng.randint(40, 120))}</p>"
+        for i in range(rng.randint(5, 60))
+    )
+    nav = "".join(f'<li><a href="/page/{i}">Page {i}</a></li>' for i in range(80))
+    script = "<script>" + "window.track && track('view');" * rng.randint(50, 800)
+    html = (
+        f"<!DOCTYPE html><html><head><title>Article {index}</title>{script}"
+        f"</script><style>body {{ font: 16px serif }}</style></head><body>"
+        f"<nav><ul>{nav}</ul></nav><main><article><h1>Article {index}</h1>"
+        f"{paragraphs}</article></main><footer>"
+        f"{'<p>Copyright and legal notices.</p>' * 30}</footer></body></html>"
+    )
+    return html.encode("utf-8")
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Fetchers hang up as soon as they have read enough of a page
+        pass
+
+
+class LocalWeb:
+    """Loopback HTTP server with a corpus of pages and a search endpoint
+
+    slow_rate of the pages take slow_delay seconds to answer, and
+    error_rate of them fail: half with a retryable 503, half with a 404.
+    GET /search?q=... returns JSON results linking to the corpus.
+    """
+
+    def __init__(
+        self,
+        pages: int = 200,
+        slow_rate: float = 0.1,
+        slow_delay: float = 2.0,
+        error_rate: float = 0.05,
+        seed: int = 1,
+    ):
+        rng = random.Random(seed)
+        self.pages = pages
+        self.slow_delay = slow_delay
+        self.slow = {i for i in range(pages) if rng.random() < slow_rate}
+        self.broken = {
+            i: rng.choice((503, 404)) for i in range(pages) if rng.random() < error_rate
+        }
+        self.corpus = [build_page(i) for i in range(pages)]
+        self.server = _QuietServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    def search_results(self, query: str, count: int) -> List[Dict]:
+        rng = _rng("search", query)
+        return [
+            {
+                "link": f"{self.url}/page/{i}",
+                "title": f"Article {i}",
+                "snippet": fake_text(("snippet", i), 20),
+            }
+            for i in rng.sample(range(self.pages), min(count, self.pages))
+        ]
+
+    def _handler(self):
+        web = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/search":
+                    query = parse_qs(url.query).get("q", [""])[0]
+                    count = int(parse_qs(url.query).get("n", ["5"])[0])
+                    body = json.dumps(web.search_results(query, count)).encode()
+                    return self._send(200, body, "application/json")
+
+                try:
+                    index = int(url.path.rsplit("/", 1)[-1])
+                    page = web.corpus[index]
+                except (ValueError, IndexError):
+                    return self._send(404, b"Not found", "text/plain")
+                if index in web.slow:
+                    time.sleep(web.slow_delay)
+                if index in web.broken:
+                    return self._send(web.broken[index], b"Unavailable", "text/plain")
+                self._send(200, page, "text/html; charset=utf-8")
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "LocalWeb":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LocalSearchBackend(SearchBackend):
+    """Search backend answering from a LocalWeb server"""
+
+    name = "local"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def search(self, query: str) -> List[Dict]:
+        response = get_session().get(
+            f"{self.url}/search",
+            params={"q": query, "n": settings.max_search_results},
+            timeout=settings.fetch_read_timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+@contextmanager
+def offline(web: LocalWeb, cache_dir: str, **llm_options) -> Iterator[None]:
+    """Run the workflow against the fake LLM and a LocalWeb server
+
+    Caches live under cache_dir and are disabled, so every run does the
+    full amount of work. llm_options go to FakeChatModel.
+    """
+    overrides = {
+        "search_backends": "local",
+        "page_cache_enabled": False,
+        "llm_cache_enabled": False,
+        "knowledge_enabled": False,
+        "page_cache_dir": f"{cache_dir}/pages",
+        "llm_cache_path": f"{cache_dir}/llm.sqlite3",
+        "knowledge_dir": f"{cache_dir}/knowledge",
+        "checkpoint_path": f"{cache_dir}/checkpoints.sqlite3",
+        "blob_dir": f"{cache_dir}/blobs",
+        # The fakes have no provider quotas to stay under
+        "llm_rate_limit": 0.0,
+        "search_rate_limit": 0.0,
+    }
+    saved = {name: getattr(settings, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    def chat_model(**kwargs):
+        return FakeChatModel(**kwargs, **llm_options)
+
+    backends = {"local": lambda: LocalSearchBackend(web.url)}
+    try:
+        with patch("agents.registry.ChatOpenAI", chat_model), patch.dict(
+            SEARCH_BACKENDS, backends
+        ):
+            clear_registry()
+            get_blob_store.cache_clear()
+            get_limiter.cache_clear()
+            yield
+    finally:
+        clear_registry()
+        get_blob_store.cache_clear()
+        get_limiter.cache_clear()
+        for name, value in saved.items():
+            setattr(settings, name, value)
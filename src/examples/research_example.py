@@ -1,6 +1,6 @@
 import logging
 
-from main import run_research
+from main import run_research_batch
 
 logging.basicConfig(level=logging.INFO)
 
@@ -13,22 +13,22 @@ def run_example():
         "The impact of social media on mental health",
     ]
 
-    for topic in topics:
+    # Topics run in parallel and are reported as they finish
+    for item in run_research_batch(topics):
+        result = item["result"]
         separator = "=" * 50
         print(f"\n{separator}")
-        print(f"Researching: {topic}")
+        print(f"Researched: {item['topic']} ({item['elapsed']:.1f}s)")
         print(f"{separator}\n")
 
-        result = run_research(topic)
-
-        if result:
+        if result and not item["error"]:
             print("\nResearch Summary:")
             print(f"- Content length: {len(result['content'])} characters")
             print(f"- Sources used: {result['metadata'].get('sources_used', 0)}")
             print("\nFirst 500 characters of content:")
             print(f"{result['content'][:500]}...")
         else:
-            print("Research failed!")
+            print(f"Research failed: {item['error']}")
 
         print(f"\n{separator}\n")
 
@@ -1,17 +1,49 @@
+import asyncio
 import logging
-from typing import Dict, Optional
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
 
-from agents.supervisor import create_workflow
-from state import ResearchState
 from settings import settings
+from utils.dedupe import dedupe_scope
+from utils.events import emit, event_sink
+from utils.metrics import RunMetrics, metrics_scope
 
-# Use settings for logging configuration
-logging.basicConfig(level=settings.log_level)
+if TYPE_CHECKING:
+    from state import ResearchState
+
+# LangChain, LangGraph and the OpenAI client take seconds to import, so the
+# agents, the graph and the checkpointer are only imported by the first run
 logger = logging.getLogger(__name__)
 
 
-def initialize_research(topic: str) -> ResearchState:
+def configure_logging() -> None:
+    """Log at settings.log_level, for scripts using this module"""
+    logging.basicConfig(level=settings.log_level)
+
+
+def get_workflow(**options):
+    """The compiled research graph, importing the agents on first use"""
+    from agents.supervisor import get_workflow
+
+    return get_workflow(**options)
+
+
+def initialize_research(topic: str) -> "ResearchState":
     """Initialize the research state with a given topic"""
+    from state import ResearchState
+
     return ResearchState(
         messages=[],
         team_members=["supervisor", "searcher", "scraper", "synthesizer", "writer"],
@@ -23,25 +55,293 @@ def initialize_research(topic: str) -> ResearchState:
     )
 
 
-def run_research(topic: str) -> Optional[Dict]:
-    """Run research workflow for a given topic"""
+def refresh_state(topic: str, previous: Dict) -> "ResearchState":
+    """Initial state of a refresh of the finished run whose state is previous"""
+    state = initialize_research(topic)
+    research_data = previous.get("research_data") or {}
+    state["plan"] = previous.get("plan")
+    state["previous"] = {
+        "sources": research_data.get("sources", []),
+        "synthesis": research_data.get("synthesis"),
+        "content": previous.get("content", ""),
+    }
+    return state
+
+
+def _run_config(run_id: Optional[str] = None) -> Dict:
+    # Room for every research round; each takes a few graph steps
+    config = {"recursion_limit": 10 * settings.research_rounds + 15}
+    if run_id is not None:
+        config["configurable"] = {"thread_id": run_id}
+    return config
+
+
+def _resume(topic: str, run_id: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Return (final state, workflow input) for a checkpointed run
+
+    A run that already finished returns its final state. Otherwise the input
+    is None, which makes the graph continue from the run's last checkpoint,
+    or a fresh state if there is nothing to resume. Runs that finished with
+    an error start over.
+    """
+    from utils.checkpoint import get_checkpointer
+
+    checkpointer = get_checkpointer()
+    finished = checkpointer.final_state(run_id)
+    if finished is not None and not finished.get("error"):
+        return finished, None
+    if finished is not None:
+        checkpointer.delete(run_id)
+    elif checkpointer.load(run_id) is not None:
+        logger.info(f"Resuming research run {run_id}")
+        return None, None
+    return None, initialize_research(topic)
+
+
+def _refresh_input(topic: str, run_id: str) -> Optional[Dict]:
+    """Workflow input refreshing the finished run run_id
+
+    Without a finished run to refresh this is the input of a fresh run, or
+    None to resume an interrupted run or refresh.
+    """
+    from utils.checkpoint import get_checkpointer
+
+    checkpointer = get_checkpointer()
+    previous = checkpointer.final_state(run_id)
+    if previous is None or previous.get("error"):
+        return _resume(topic, run_id)[1]
+    checkpointer.delete(run_id)
+    return refresh_state(topic, previous)
+
+
+@contextmanager
+def _run_scope() -> Iterator[Optional[RunMetrics]]:
+    """Deadline and metrics collector of one research run"""
+    from utils.deadline import deadline_scope
+
+    with deadline_scope(settings.research_timeout), metrics_scope() as metrics:
+        yield metrics
+
+
+def _with_metrics(result: Dict, metrics: Optional[RunMetrics]) -> Dict:
+    if metrics is not None and result is not None:
+        result["metadata"] = {
+            **(result.get("metadata") or {}),
+            "metrics": metrics.to_dict(),
+        }
+    return result
+
+
+def _invoke_workflow(topic: str, run_id: Optional[str] = None) -> Dict:
+    if run_id is None:
+        # Reuse the graph compiled once per process
+        with _run_scope() as metrics:
+            result = get_workflow().invoke(initialize_research(topic), _run_config())
+        return _with_metrics(result, metrics)
+
+    finished, initial_state = _resume(topic, run_id)
+    if finished is not None:
+        return finished
+    workflow = get_workflow(checkpointed=True)
+    with _run_scope() as metrics:
+        result = workflow.invoke(initial_state, _run_config(run_id))
+    return _with_metrics(result, metrics)
+
+
+def _invoke_refresh(topic: str, run_id: str) -> Dict:
+    initial_state = _refresh_input(topic, run_id)
+    workflow = get_workflow(checkpointed=True, refresh=True)
+    with _run_scope() as metrics:
+        result = workflow.invoke(initial_state, _run_config(run_id))
+    return _with_metrics(result, metrics)
+
+
+def run_research(topic: str, run_id: Optional[str] = None) -> Optional[Dict]:
+    """Run research workflow for a given topic
+
+    With run_id the run is checkpointed after every node; calling again with
+    the same run_id after a crash resumes after the last completed node.
+    The run gets settings.research_timeout seconds, split between its
+    stages; stages that run out of time fall back to partial results.
+    Timing, token and byte counters of the run are in metadata["metrics"].
+    """
     try:
-        # Initialize state
-        initial_state = initialize_research(topic)
+        return _invoke_workflow(topic, run_id)
+    except Exception as e:
+        logger.error(f"Error during research: {e}")
+        return None
+
+
+def refresh_research(topic: str, run_id: str) -> Optional[Dict]:
+    """Research a topic again, redoing only what changed since run run_id
+
+    The sources of the finished run are revalidated with their sites and
+    the topic is searched again along the run's plan. Only new and changed
+    pages are summarized. If no source was added, changed or dropped, the
+    previous article is kept without synthesis or writing; otherwise the
+    writer revises it for the changes, listed in research_data["changes"].
+    The result replaces the run's checkpoint, so the next refresh starts
+    from it. Without a finished run under run_id this is run_research.
+    """
+    try:
+        return _invoke_refresh(topic, run_id)
+    except Exception as e:
+        logger.error(f"Error during research: {e}")
+        return None
 
-        # Create and compile workflow
-        workflow = create_workflow()
 
-        # Use invoke() instead of run()
-        result = workflow.invoke(initial_state)
+async def arun_research(topic: str, run_id: Optional[str] = None) -> Optional[Dict]:
+    """Run research workflow for a given topic on the running event loop"""
+    try:
+        if run_id is None:
+            workflow = get_workflow(async_mode=True)
+            with _run_scope() as metrics:
+                result = await workflow.ainvoke(
+                    initialize_research(topic), _run_config()
+                )
+            return _with_metrics(result, metrics)
+
+        finished, initial_state = await asyncio.to_thread(_resume, topic, run_id)
+        if finished is not None:
+            return finished
+        workflow = get_workflow(async_mode=True, checkpointed=True)
+        with _run_scope() as metrics:
+            result = await workflow.ainvoke(initial_state, _run_config(run_id))
+        return _with_metrics(result, metrics)
+    except Exception as e:
+        logger.error(f"Error during research: {e}")
+        return None
+
 
-        return result
+async def arefresh_research(topic: str, run_id: str) -> Optional[Dict]:
+    """Async variant of refresh_research"""
+    try:
+        initial_state = await asyncio.to_thread(_refresh_input, topic, run_id)
+        workflow = get_workflow(async_mode=True, checkpointed=True, refresh=True)
+        with _run_scope() as metrics:
+            result = await workflow.ainvoke(initial_state, _run_config(run_id))
+        return _with_metrics(result, metrics)
     except Exception as e:
         logger.error(f"Error during research: {e}")
         return None
 
 
+def _emit_node_events(output: Dict) -> None:
+    """Turn one LangGraph stream update into progress events"""
+    for node, state in output.items():
+        if node == "__end__":
+            emit("done", result=state)
+            continue
+        emit("node", node=node, stage=state.get("stage"))
+        if node == "supervisor":
+            emit("plan", plan=state.get("plan"))
+
+
+def stream_research(topic: str) -> Iterator[Dict]:
+    """Run research for a topic, yielding progress events as they happen
+
+    Events are dicts with an "event" key: "plan" once the supervisor is done,
+    "source" per scraped source, "synthesis" and "article" per LLM token,
+    "node" after each graph node, and finally "done" (with the final state)
+    or "error".
+    """
+    events: queue.Queue = queue.Queue()
+
+    def run() -> None:
+        with event_sink(events.put), _run_scope():
+            try:
+                for output in get_workflow().stream(
+                    initialize_research(topic), _run_config()
+                ):
+                    _emit_node_events(output)
+            except Exception as e:
+                logger.error(f"Error during research: {e}")
+                emit("error", error=str(e))
+            finally:
+                events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    while (event := events.get()) is not None:
+        yield event
+
+
+async def astream_research(topic: str) -> AsyncIterator[Dict]:
+    """Async variant of stream_research"""
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run() -> None:
+        with event_sink(events.put_nowait), _run_scope():
+            try:
+                workflow = get_workflow(async_mode=True)
+                async for output in workflow.astream(
+                    initialize_research(topic), _run_config()
+                ):
+                    _emit_node_events(output)
+            except Exception as e:
+                logger.error(f"Error during research: {e}")
+                emit("error", error=str(e))
+            finally:
+                events.put_nowait(None)
+
+    task = asyncio.ensure_future(run())
+    while (event := await events.get()) is not None:
+        yield event
+    await task
+
+
+def run_research_batch(
+    topics: Iterable[str],
+    concurrency: Optional[int] = None,
+    batch_id: Optional[str] = None,
+    refresh: bool = False,
+) -> Iterator[Dict]:
+    """Research many topics in parallel, yielding each as soon as it finishes
+
+    Topics share the compiled graph, agents, HTTP pool and caches; identical
+    search queries and URLs are fetched once for the whole batch. Each item
+    has the topic, the final state (None on failure), the error if any and
+    the elapsed seconds. With batch_id every topic is checkpointed, so
+    rerunning the same batch after a restart skips finished topics and
+    resumes interrupted ones. With refresh as well, topics that finished in
+    an earlier run of the batch are brought up to date (see
+    refresh_research) rather than skipped, as for a scheduled re-run.
+    """
+    shared: Dict = {}
+
+    def research(index: int, topic: str) -> Dict:
+        start = time.monotonic()
+        run_id = f"{batch_id}/{index}:{topic}" if batch_id else None
+        with dedupe_scope(shared):
+            try:
+                if refresh and run_id:
+                    result = _invoke_refresh(topic, run_id)
+                else:
+                    result = _invoke_workflow(topic, run_id)
+                error = result.get("error")
+            except Exception as e:
+                result, error = None, str(e)
+        if error:
+            logger.error(f"Research failed for {topic!r}: {error}")
+        return {
+            "topic": topic,
+            "result": result,
+            "error": error,
+            "elapsed": time.monotonic() - start,
+        }
+
+    with ThreadPoolExecutor(
+        max_workers=concurrency or settings.batch_concurrency
+    ) as executor:
+        futures = [
+            executor.submit(research, index, topic)
+            for index, topic in enumerate(topics)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
 if __name__ == "__main__":
+    configure_logging()
     # Example usage
     topic = "AI researcher agentic architectures in 2024"
     result = run_research(topic)
@@ -49,5 +349,11 @@ if __name__ == "__main__":
     if result:
         logger.info(f"Research completed. Content length: {len(result['content'])}")
         logger.info(f"Sources used: {result['metadata'].get('sources_used', 0)}")
+        nodes = result["metadata"].get("metrics", {}).get("node", {})
+        for node, stats in nodes.items():
+            logger.info(
+                f"{node}: {stats['seconds']:.1f}s, {stats['tokens_in']:.0f} tokens "
+                f"in, {stats['tokens_out']:.0f} out, ${stats['cost_usd']:.4f}"
+            )
     else:
         logger.error("Research failed. Check logs for details.")
@@ -1,3 +1,6 @@
+from threading import Lock
+from typing import Any
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -13,7 +16,98 @@ class Settings(BaseSettings):
     max_search_results: int = Field(default=5, ge=1)
     max_scrape_retries: int = Field(default=3, ge=1)
     research_timeout: int = Field(default=300, ge=60)  # minimum 60 seconds
-    
+    batch_concurrency: int = Field(default=4, ge=1)  # topics run in parallel
+    batch_shared_results: int = Field(default=256, ge=1)  # per kind of work
+    scrape_concurrency: int = Field(default=5, ge=1)
+    scrape_timeout: int = Field(default=60, ge=1)  # per-URL deadline in seconds
+
+    # Search Configuration
+    search_queries: int = Field(default=3, ge=1)  # queries planned per topic
+    # Comma-separated backend names, see utils/search.py
+    search_backends: str = Field(default="duckduckgo")
+
+    # Page Fetching Configuration
+    fetch_connect_timeout: float = Field(default=5.0, gt=0)
+    fetch_read_timeout: float = Field(default=15.0, gt=0)
+    fetch_max_bytes: int = Field(default=2_000_000, ge=1024)
+    fetch_pool_size: int = Field(default=10, ge=1)  # connections per host
+    fetch_retry_backoff: float = Field(default=0.5, ge=0.0)  # seconds
+
+    # Characters of page text to extract before the parser stops
+    extract_max_chars: int = Field(default=24000, ge=100)
+
+    # Summarization Configuration
+    scrape_chunk_tokens: int = Field(default=1500, ge=100)  # per map prompt
+    scrape_max_chunks: int = Field(default=8, ge=1)
+    summary_batch_size: int = Field(default=4, ge=1)  # parallel map calls
+    synthesis_max_tokens: int = Field(default=12000, ge=500)  # source budget
+    # Estimated text overlap above which a scraped source is dropped as a copy
+    source_dedupe_threshold: float = Field(default=0.8, gt=0.0, le=1.0)
+
+    # Pipelined Mode Configuration
+    pipeline_mode: bool = Field(default=False)  # synthesize as sources arrive
+    pipeline_quorum: int = Field(default=3, ge=1)  # sources needed to start writing
+    pipeline_budget: float = Field(default=0.0, ge=0.0)  # seconds, 0 disables
+
+    # Page Cache Configuration
+    page_cache_enabled: bool = Field(default=True)
+    page_cache_dir: str = Field(default=".cache/pages")
+    page_cache_ttl: int = Field(default=86400, ge=0)  # seconds before revalidation
+    page_cache_max_bytes: int = Field(default=512_000_000, ge=1_000_000)
+
+    # Checkpoints of runs started with a run ID, for resuming them
+    checkpoint_path: str = Field(default=".cache/checkpoints.sqlite3")
+
+    # Blob Store Configuration (page text kept out of the workflow state)
+    blob_dir: str = Field(default=".cache/blobs")
+    blob_max_bytes: int = Field(default=1_000_000_000, ge=1_000_000)
+
+    # Knowledge Index Configuration (previously scraped sources)
+    knowledge_enabled: bool = Field(default=True)
+    knowledge_dir: str = Field(default=".cache/knowledge")
+    knowledge_min_score: float = Field(default=0.25, ge=-1.0, le=1.0)  # cosine
+    # Retrieved sources that make a web search unnecessary
+    knowledge_min_sources: int = Field(default=3, ge=1)
+
+    # LLM Response Cache Configuration
+    llm_cache_enabled: bool = Field(default=True)
+    llm_cache_path: str = Field(default=".cache/llm.sqlite3")
+    llm_cache_max_entries: int = Field(default=100_000, ge=1)
+    # Comma-separated agent names whose responses are cached
+    llm_cache_agents: str = Field(default="supervisor,scraper,synthesizer,writer")
+
+    # Metrics Configuration (per-run timing, token and byte counters)
+    metrics_enabled: bool = Field(default=True)
+    metrics_spans: bool = Field(default=False)  # also keep a span per call
+
+    # Rate Limit Configuration (shared by all runs in the process)
+    llm_rate_limit: float = Field(default=8.0, ge=0.0)  # calls/second, 0 = none
+    llm_max_concurrency: int = Field(default=32, ge=1)
+    search_rate_limit: float = Field(default=1.0, ge=0.0)  # per search backend
+    search_max_concurrency: int = Field(default=4, ge=1)
+    rate_limit_retries: int = Field(default=3, ge=0)  # on 429, 5xx and resets
+    rate_limit_backoff: float = Field(default=0.5, ge=0.0)  # seconds
+
+    # Research Loop Configuration (rounds of planning, search and scraping)
+    research_rounds: int = Field(default=1, ge=1)
+    research_token_budget: int = Field(default=0, ge=0)  # LLM tokens, 0 = no limit
+    research_min_novelty: float = Field(default=0.2, ge=0.0, le=1.0)
+
+    # Worker Configuration (long-running process taking jobs, see worker.py)
+    worker_socket: str = Field(default=".cache/worker.sock")
+
+    # Job Queue Configuration (SQLite queue shared by worker processes)
+    job_queue_path: str = Field(default=".cache/jobs.sqlite3")
+    job_queue_max_pending: int = Field(default=1000, ge=0)  # 0 = no limit
+    job_lease: float = Field(default=60.0, gt=0)  # seconds without a heartbeat
+    job_max_attempts: int = Field(default=3, ge=1)
+    job_poll_interval: float = Field(default=0.5, gt=0)
+    job_result_ttl: float = Field(default=7 * 24 * 3600, ge=0)  # seconds, 0 = keep
+    job_purge_interval: float = Field(default=3600.0, gt=0)  # seconds
+
+    # CPU Offload Configuration (HTML parsing, signatures and chunking)
+    cpu_workers: int = Field(default=0, ge=0)  # processes, 0 = in the calling thread
+
     # Model Configuration
     gpt_model: str = Field(default="gpt-4-turbo-preview")
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
@@ -31,15 +125,47 @@ class Settings(BaseSettings):
     )
 
 
+class LazySettings:
+    """Settings that are read and validated on first use
+
+    Importing modules that use settings is free and needs no API keys; the
+    first attribute access builds Settings() and raises its validation
+    error if the environment is incomplete. Assignments go to the loaded
+    settings, so tests and benchmarks can override them as before.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "_settings", None)
+        object.__setattr__(self, "_lock", Lock())
+
+    def _load(self) -> Settings:
+        if self._settings is None:
+            with self._lock:
+                if self._settings is None:
+                    object.__setattr__(self, "_settings", Settings())
+        return self._settings
+
+    @property
+    def loaded(self) -> bool:
+        return self._settings is not None
+
+    def reload(self) -> None:
+        """Read the environment again on next use"""
+        object.__setattr__(self, "_settings", None)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._load(), name, value)
+
+
 # Create settings instance
-settings = Settings()
-
-# Make variables available at module level for backward compatibility
-OPENAI_API_KEY = settings.openai_api_key
-SERPER_API_KEY = settings.serper_api_key
-MAX_SEARCH_RESULTS = settings.max_search_results
-MAX_SCRAPE_RETRIES = settings.max_scrape_retries
-RESEARCH_TIMEOUT = settings.research_timeout
-GPT_MODEL = settings.gpt_model
-TEMPERATURE = settings.temperature
-LOG_LEVEL = settings.log_level
+settings = LazySettings()
+
+
+def __getattr__(name: str) -> Any:
+    """UPPERCASE aliases of the settings, kept for backward compatibility"""
+    if name.isupper() and name.lower() in Settings.model_fields:
+        return getattr(settings, name.lower())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,15 @@
 import operator
-from typing import Annotated, List, TypedDict, Optional
+from typing import Annotated, Dict, List, TypedDict, Optional
 
 from langchain_core.messages import BaseMessage
 
+from utils.text import pack_to_budget, truncate_tokens
+
+# Tokens of the synthesis shown in prompts that describe the research so far
+SYNTHESIS_PREVIEW = 500
+# Tokens of the last round's source summaries shown in those prompts
+ROUND_PREVIEW = 1000
+
 
 class ResearchState(TypedDict, total=False):  # Make it non-total
     """Research state schema"""
@@ -23,3 +30,57 @@ class ResearchState(TypedDict, total=False):  # Make it non-total
     plan: str
     # Topic (added to root level)
     topic: str
+    # Writer metadata (sources used, ...)
+    metadata: dict
+    # Error raised by any step, ends the workflow
+    error: str
+    # Sources, synthesis and article of the run being refreshed, if any
+    previous: dict
+
+
+def describe_research(research_data: Dict) -> str:
+    """Compact view of the research so far, for prompts
+
+    Lists source URLs with their summaries and the start of the synthesis,
+    leaving out blob handles and other bookkeeping. Once research has run
+    in rounds, only the sources of the last round are listed, cut to
+    ROUND_PREVIEW tokens, so prompts do not grow with every round.
+    """
+    lines = [f"Topic: {research_data.get('topic', '')}"]
+    sources = research_data.get("sources", [])
+    summaries = [source.get("summary", "") for source in sources]
+    rounds = research_data.get("rounds")
+    if rounds:
+        fresh = rounds[-1]["sources"]
+        lines.append(
+            f"Sources from {len(rounds)} rounds: {len(sources)}, "
+            f"{fresh} new in the last round:"
+        )
+        sources = sources[len(sources) - fresh :]
+        summaries = pack_to_budget(summaries[len(summaries) - fresh :], ROUND_PREVIEW)
+    for source, summary in zip(sources, summaries):
+        lines.append(f"- {source['url']}: {summary}")
+    synthesis = (research_data.get("synthesis") or {}).get("synthesis")
+    if synthesis:
+        lines.append(f"Synthesis: {truncate_tokens(synthesis, SYNTHESIS_PREVIEW)}")
+    return "\n".join(lines)
+
+
+def describe_changes(research_data: Dict) -> str:
+    """What a refresh found changed since the previous run, for prompts
+
+    New and updated sources come with their summaries; dropped ones are
+    listed by URL only.
+    """
+    changes = research_data.get("changes") or {}
+    summaries = {
+        source["url"]: source.get("summary", "")
+        for source in research_data.get("sources", [])
+    }
+    lines = []
+    for kind, label in (("added", "New source"), ("changed", "Updated source")):
+        for url in changes.get(kind, []):
+            lines.append(f"- {label} {url}: {summaries.get(url, '')}")
+    for url in changes.get("removed", []):
+        lines.append(f"- Dropped source {url}")
+    return "\n".join(lines)
@@ -0,0 +1,43 @@
+"""Shared pytest configuration"""
+import pytest
+
+from agents.registry import clear_registry
+from agents.supervisor import get_workflow
+from settings import settings
+from utils.blobs import get_blob_store
+from utils.checkpoint import get_checkpointer
+from utils.jobs import get_job_queue
+from utils.knowledge import get_knowledge_index
+from utils.llm_cache import get_llm_cache
+from utils.metrics import get_metrics
+from utils.ratelimit import get_limiter
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    """Keep on-disk caches of every test inside its own temporary directory"""
+    monkeypatch.setattr(settings, "page_cache_dir", str(tmp_path / "pages"))
+    monkeypatch.setattr(settings, "llm_cache_path", str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(settings, "knowledge_dir", str(tmp_path / "knowledge"))
+    monkeypatch.setattr(
+        settings, "checkpoint_path", str(tmp_path / "checkpoints.sqlite3")
+    )
+    monkeypatch.setattr(settings, "blob_dir", str(tmp_path / "blobs"))
+    monkeypatch.setattr(settings, "job_queue_path", str(tmp_path / "jobs.sqlite3"))
+    caches = [
+        get_llm_cache,
+        get_knowledge_index,
+        get_checkpointer,
+        get_workflow,
+        get_metrics,
+        get_blob_store,
+        get_limiter,
+        get_job_queue,
+    ]
+    for cache in caches:
+        cache.cache_clear()
+    clear_registry()  # Shared agents hold LLM clients patched by earlier tests
+    yield
+    for cache in caches:
+        cache.cache_clear()
+    clear_registry()
@@ -0,0 +1,26 @@
+"""Smoke test for the offline benchmark harness"""
+from benchmarks.bench_research import percentile, run_batch
+from benchmarks.fakes import LocalWeb, offline
+from settings import settings
+
+
+def test_offline_batch_runs_end_to_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "fetch_retry_backoff", 0.0)
+    web = LocalWeb(pages=20, slow_rate=0.0, error_rate=0.2).start()
+    try:
+        with offline(web, str(tmp_path), latency=0.0, tokens_per_second=1e6):
+            runs = run_batch(["offline topic a", "offline topic b"], concurrency=2)
+    finally:
+        web.stop()
+
+    assert [run["ok"] for run in runs] == [True, True]
+    assert all(run["elapsed"] > 0 for run in runs)
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
@@ -0,0 +1,64 @@
+"""Tests for the out-of-band blob store"""
+
+import os
+import time
+
+import pytest
+
+from utils.blobs import BlobStore, source_content
+
+
+def test_put_get_round_trip_and_dedupe(tmp_path):
+    store = BlobStore(str(tmp_path))
+    handle = store.put("page text " * 1000)
+
+    assert handle.startswith("blob:")
+    assert store.put("page text " * 1000) == handle
+    assert store.get(handle) == "page text " * 1000
+    assert len(list(tmp_path.iterdir())) == 1
+
+    store.delete(handle)
+    assert store.get(handle) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=1_000_000)
+    # Random text barely compresses: each blob takes about 350KB
+    old, middle = store.put(os.urandom(300_000).hex()), store.put(
+        os.urandom(300_000).hex()
+    )
+    time.sleep(0.01)
+    assert store.get(old) is not None  # Read again, so now the newest
+    store.put(os.urandom(300_000).hex())
+
+    assert store.get(middle) is None
+    assert store.get(old) is not None
+
+
+def test_eviction_leaves_headroom(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=1_000_000)
+    # About 320KB each: three fit, a fourth overflows
+    handles = [store.put(os.urandom(273_000).hex()) for _ in range(4)]
+
+    # Dropping one blob would end just under max_bytes; eviction goes further
+    assert [store.get(handle) is None for handle in handles] == [
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert store._size <= 900_000
+
+
+def test_rejects_foreign_handles(tmp_path):
+    store = BlobStore(str(tmp_path))
+
+    with pytest.raises(ValueError):
+        store.get("blob:../../etc/passwd")
+    with pytest.raises(ValueError):
+        store.get("page.html")
+
+
+def test_source_content_prefers_inline_text():
+    assert source_content({"url": "u", "raw_content": "inline"}) == "inline"
+    assert source_content({"url": "u", "summary": "only a summary"}) is None
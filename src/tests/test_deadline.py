@@ -0,0 +1,54 @@
+"""Tests for run and stage deadlines"""
+import time
+
+import pytest
+
+from utils.deadline import (
+    DeadlineExceeded,
+    check_deadline,
+    deadline_scope,
+    expired,
+    mark_degraded,
+    stage,
+    time_left,
+)
+
+
+def test_no_deadline_outside_a_scope():
+    with stage("scrape") as deadline:
+        assert deadline is None
+        assert time_left() is None
+        assert not expired()
+        assert check_deadline("anything") is None
+
+
+def test_stages_split_the_time_left():
+    with deadline_scope(10):
+        with stage("plan"):
+            assert time_left() == pytest.approx(1.0, abs=0.05)
+        # Scrape gets 0.4 of the 0.75 share left for scrape, synthesize, write
+        with stage("scrape"):
+            assert time_left() == pytest.approx(10 * 0.4 / 0.75, abs=0.05)
+        with stage("write"):
+            assert time_left() == pytest.approx(10, abs=0.05)
+        assert time_left() == pytest.approx(10, abs=0.05)
+    assert time_left() is None
+
+
+def test_check_deadline_raises_once_expired():
+    with deadline_scope(0.05):
+        assert check_deadline("search") > 0
+        time.sleep(0.06)
+        assert expired()
+        with pytest.raises(DeadlineExceeded):
+            check_deadline("search")
+        with pytest.raises(TimeoutError):
+            check_deadline("search")
+
+
+def test_mark_degraded_keeps_other_metadata():
+    state = {"metadata": {"sources_used": 2}}
+    mark_degraded(state, "scrape")
+    mark_degraded(state, "write")
+
+    assert state["metadata"] == {"sources_used": 2, "degraded": ["scrape", "write"]}
@@ -0,0 +1,64 @@
+"""Tests for single-flight deduplication"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.dedupe import SingleFlight, dedupe_scope, deduplicated
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(threading.get_ident())
+        time.sleep(0.1)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(lambda _: flight.do("key", slow), range(5)))
+
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert flight.do("key", lambda: "other") == "value"
+
+
+def test_single_flight_does_not_memoize_failures():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_single_flight_keeps_only_recent_results():
+    flight = SingleFlight(max_results=2)
+    flight.do("a", lambda: 1)
+    flight.do("b", lambda: 2)
+    flight.do("a", lambda: 0)  # Most recently used now
+    flight.do("c", lambda: 3)
+
+    assert flight.do("a", lambda: 0) == 1
+    assert flight.do("b", lambda: 0) == 0  # Evicted, so run again
+    assert len(flight._results) == 2
+
+
+def test_deduplicated_only_shares_inside_a_scope():
+    calls = []
+
+    def work():
+        calls.append(1)
+        return len(calls)
+
+    assert deduplicated("ns", "key", work) == 1
+    assert deduplicated("ns", "key", work) == 2
+
+    with dedupe_scope():
+        assert deduplicated("ns", "key", work) == 3
+        assert deduplicated("ns", "key", work) == 3
+        assert deduplicated("other", "key", work) == 4
@@ -0,0 +1,77 @@
+"""Tests for the streaming HTML text extractor"""
+from tests.fixtures import MOCK_HTML_CONTENT
+from utils.extract import TextExtractor, extract_text
+
+ARTICLE_PAGE = """
+<html><head><title>t</title><style>body { color: red; }</style></head>
+<body>
+<header><a href="/">Home</a> <a href="/blog">Blog</a></header>
+<nav><ul><li><a href="/a">A very long navigation link label here</a></li></ul></nav>
+<p>Site-wide teaser paragraph that appears before the article.</p>
+<main>
+  <article>
+    <header><h1>Agentic architectures</h1></header>
+    <p>Multi-agent systems split research into planning and writing.</p>
+    <div class="share-buttons"><p>Share this article on every network</p></div>
+    <script>var tracking = "should never show up in the text";</script>
+    <p>Each agent has one job &amp; a narrow prompt.</p>
+    <p><a href="/1">Related link one</a> <a href="/2">Related link two</a></p>
+  </article>
+</main>
+<footer><p>Copyright notice and legal boilerplate for the site.</p></footer>
+</body></html>
+"""
+
+
+def test_extracts_main_content_without_boilerplate():
+    text = extract_text(ARTICLE_PAGE)
+
+    assert text.splitlines() == [
+        "Agentic architectures",
+        "Multi-agent systems split research into planning and writing.",
+        "Each agent has one job & a narrow prompt.",
+    ]
+
+
+def test_chrome_words_inside_content_classes_keep_the_content():
+    article = "<p>Multi-agent systems split research into planning and writing.</p>"
+    pages = [
+        f'<html><body class="post-template no-sidebar">{article}</body></html>',
+        f'<article class="post has-comments">{article}</article>',
+        f'<div class="ads-free content">{article}</div>',
+    ]
+
+    for page in pages:
+        assert extract_text(page) == (
+            "Multi-agent systems split research into planning and writing."
+        )
+    assert extract_text(f'<div class="site-footer">{article}</div>') == ""
+
+
+def test_extracts_simple_pages():
+    assert extract_text(MOCK_HTML_CONTENT) == (
+        "Python Programming\nPython is a great language."
+    )
+
+
+def test_stops_once_budget_is_reached():
+    paragraph = "<p>" + "word " * 50 + "</p>"
+    extractor = TextExtractor(max_chars=500)
+    fed = 0
+    for _ in range(1000):
+        if extractor.feed_bytes(paragraph.encode()):
+            break
+        fed += 1
+
+    assert extractor.done
+    assert fed < 10
+    assert len(extractor.get_text()) <= 500
+
+
+def test_feed_bytes_handles_split_multibyte_characters():
+    data = "<p>Ünïcödé text split across network chunks</p>".encode("utf-8")
+    extractor = TextExtractor()
+    for i in range(len(data)):
+        extractor.feed_bytes(data[i : i + 1], "utf-8")
+
+    assert extractor.get_text() == "Ünïcödé text split across network chunks"
@@ -0,0 +1,176 @@
+"""Tests for the pooled page fetcher against a local HTTP server"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from settings import settings
+from tests.fixtures import MOCK_HTML_CONTENT
+from utils.extract import TextExtractor
+from utils.fetch import (
+    FetchError,
+    SkippedContent,
+    TemporaryFetchError,
+    afetch_page,
+    fetch_page,
+)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serve a few canned responses keyed by path"""
+
+    flaky_hits = 0
+    stall_hits = 0
+
+    def do_GET(self):
+        if self.path == "/page":
+            self._send(200, "text/html; charset=utf-8", MOCK_HTML_CONTENT.encode())
+        elif self.path == "/report":
+            self._send(200, "application/pdf", b"%PDF-1.4" + b"0" * 1024)
+        elif self.path == "/huge":
+            self._send(200, "text/html", b"a" * (settings.fetch_max_bytes * 2))
+        elif self.path == "/flaky":
+            PageHandler.flaky_hits += 1
+            if PageHandler.flaky_hits < 2:
+                self._send(503, "text/plain", b"busy")
+            else:
+                self._send(200, "text/html", b"<p>recovered</p>")
+        elif self.path == "/stall":
+            # The first response stalls past the read timeout mid-body
+            PageHandler.stall_hits += 1
+            head = b"<p>Hello world paragraph one.</p>" + b" " * 20000
+            tail = b"<p>Hello world paragraph two.</p>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(head + tail)))
+            self.end_headers()
+            self.wfile.write(head)
+            self.wfile.flush()
+            if PageHandler.stall_hits < 2:
+                time.sleep(0.5)
+            try:
+                self.wfile.write(tail)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self._send(404, "text/plain", b"missing")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped reading at its byte budget
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "fetch_retry_backoff", 0.01)
+    PageHandler.flaky_hits = 0
+    PageHandler.stall_hits = 0
+
+
+def test_fetch_page(server_url):
+    page = fetch_page(f"{server_url}/page")
+
+    assert page["status"] == 200
+    assert "Python is a great language." in page["content"]
+    assert page["truncated"] is False
+
+
+def test_fetch_skips_binary_content(server_url):
+    with pytest.raises(SkippedContent):
+        fetch_page(f"{server_url}/report")
+    with pytest.raises(SkippedContent):
+        fetch_page(f"{server_url}/paper.pdf")  # Skipped without a request
+
+
+def test_fetch_caps_body_size(server_url):
+    page = fetch_page(f"{server_url}/huge")
+
+    assert page["truncated"] is True
+    assert len(page["content"]) == settings.fetch_max_bytes
+
+
+def test_fetch_stops_when_consumer_is_done(server_url):
+    received = []
+
+    def consumer(chunk, encoding):
+        received.append(chunk)
+        return True
+
+    page = fetch_page(f"{server_url}/huge", on_chunk=consumer)
+
+    assert page["truncated"] is True
+    assert len(received) == 1
+    assert len(page["content"]) < settings.fetch_max_bytes
+
+
+def test_fetch_leaves_the_body_to_its_consumer(server_url):
+    received = []
+
+    def consumer(chunk, encoding):
+        received.append(chunk)
+        return False
+
+    page = fetch_page(f"{server_url}/page", on_chunk=consumer, keep_body=False)
+
+    assert "content" not in page
+    assert b"".join(received).decode() == fetch_page(f"{server_url}/page")["content"]
+
+
+def test_fetch_retries_transient_errors(server_url):
+    page = fetch_page(f"{server_url}/flaky")
+
+    assert "recovered" in page["content"]
+    assert PageHandler.flaky_hits == 2
+
+
+def test_fetch_does_not_replay_a_body_to_its_consumer(server_url, monkeypatch):
+    monkeypatch.setattr(settings, "fetch_read_timeout", 0.2)
+    fetches = [
+        lambda url, consumer: fetch_page(url, on_chunk=consumer),
+        lambda url, consumer: asyncio.run(afetch_page(url, on_chunk=consumer)),
+    ]
+    for fetch in fetches:
+        PageHandler.stall_hits = 0
+        extractor = TextExtractor()
+        with pytest.raises(TemporaryFetchError):
+            fetch(f"{server_url}/stall", extractor.feed_bytes)
+        assert PageHandler.stall_hits == 1  # Not retried from byte 0
+        assert extractor.get_text() == "Hello world paragraph one."
+
+    # Without a consumer the body is simply downloaded again
+    PageHandler.stall_hits = 0
+    assert "paragraph two" in fetch_page(f"{server_url}/stall")["content"]
+    assert PageHandler.stall_hits == 2
+
+
+def test_fetch_raises_on_client_errors(server_url):
+    with pytest.raises(FetchError):
+        fetch_page(f"{server_url}/missing")
+
+
+def test_afetch_page(server_url):
+    page = asyncio.run(afetch_page(f"{server_url}/page"))
+    assert "Python is a great language." in page["content"]
+
+    with pytest.raises(SkippedContent):
+        asyncio.run(afetch_page(f"{server_url}/report"))
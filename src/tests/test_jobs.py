@@ -0,0 +1,109 @@
+"""Tests for the SQLite job queue"""
+import time
+
+import pytest
+
+from settings import settings
+from utils.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, QueueFull
+from utils.ratelimit import PRIORITY_HIGH, PRIORITY_LOW
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    yield queue
+    queue.close()
+
+
+def test_jobs_are_claimed_by_priority_then_in_order(jobs):
+    late = jobs.submit("Rust", PRIORITY_LOW)
+    first = jobs.submit("Python")
+    second = jobs.submit("Go")
+    urgent = jobs.submit("Zig", PRIORITY_HIGH)
+
+    claimed = [jobs.claim("w1")["id"] for _ in range(4)]
+
+    assert claimed == [urgent, first, second, late]
+    assert jobs.claim("w1") is None
+    assert jobs.counts() == {RUNNING: 4}
+
+
+def test_identical_topics_in_flight_share_a_job(jobs):
+    job_id = jobs.submit("Python  Basics")
+
+    assert jobs.submit("python basics") == job_id
+    assert jobs.submit("Python basics", run_id="nightly") != job_id
+    jobs.claim("w1")
+    assert jobs.submit("Python basics") == job_id  # Still running
+
+    jobs.finish(job_id, "w1", {"content": "Article"})
+    assert jobs.submit("Python basics") != job_id  # Finished jobs are not reused
+
+
+def test_submit_pushes_back_when_the_queue_is_full(jobs, monkeypatch):
+    monkeypatch.setattr(settings, "job_queue_max_pending", 2)
+    jobs.submit("one")
+    jobs.submit("two")
+
+    with pytest.raises(QueueFull):
+        jobs.submit("three")
+    jobs.claim("w1")
+    jobs.submit("three")  # Running jobs do not count
+
+
+def test_answers_are_looked_up_by_job_id(jobs):
+    ok = jobs.submit("Python")
+    broken = jobs.submit("broken")
+    jobs.claim("w1")
+    jobs.claim("w1")
+    jobs.finish(ok, "w1", {"content": "Article", "error": None})
+    jobs.finish(broken, "w1", {"content": "", "error": "Research failed"})
+
+    assert jobs.get(ok)["status"] == DONE
+    assert jobs.get(ok)["answer"]["content"] == "Article"
+    assert jobs.wait(broken, timeout=0)["status"] == FAILED
+    assert jobs.get(broken)["error"] == "Research failed"
+    assert jobs.get("unknown") is None
+
+
+def test_jobs_of_dead_workers_are_claimed_again(jobs, monkeypatch):
+    monkeypatch.setattr(settings, "job_lease", 0.05)
+    monkeypatch.setattr(settings, "job_max_attempts", 2)
+    job_id = jobs.submit("Python")
+    assert jobs.claim("w1")["attempts"] == 1
+    jobs.renew([job_id], "w1")
+    assert jobs.claim("w2") is None  # The lease still holds
+
+    time.sleep(0.1)  # w1 stopped renewing its lease
+    retried = jobs.claim("w2")
+    assert retried["id"] == job_id and retried["attempts"] == 2
+    assert jobs.get(job_id)["worker"] == "w2"
+
+    time.sleep(0.1)
+    assert jobs.claim("w3") is None  # Both attempts died, so give up
+    assert jobs.get(job_id)["status"] == FAILED
+
+
+def test_answers_of_workers_that_lost_the_lease_are_dropped(jobs, monkeypatch):
+    monkeypatch.setattr(settings, "job_lease", 0.05)
+    job_id = jobs.submit("Python")
+    jobs.claim("w1")
+    time.sleep(0.1)  # w1 stalls past its lease
+    jobs.claim("w2")
+
+    assert jobs.finish(job_id, "w2", {"content": "Fresh"})
+    assert not jobs.finish(job_id, "w1", {"content": "Stale"})
+    assert not jobs.finish(job_id, "w2", {"content": "Twice"})
+    assert jobs.get(job_id)["answer"]["content"] == "Fresh"
+
+
+def test_purge_drops_old_finished_jobs(jobs):
+    done = jobs.submit("Python")
+    waiting = jobs.submit("Go")
+    jobs.claim("w1")
+    jobs.finish(done, "w1", {"content": "Article"})
+
+    assert jobs.purge(max_age=60) == 0
+    assert jobs.purge(max_age=1e-9) == 1
+    assert jobs.get(done) is None
+    assert jobs.get(waiting)["status"] == QUEUED
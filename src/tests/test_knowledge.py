@@ -0,0 +1,95 @@
+"""Tests for the local knowledge index"""
+import threading
+import time
+
+import numpy as np
+
+from utils.knowledge import KnowledgeIndex, embed
+
+PYTHON = " ".join(
+    f"Python is a programming language for scripting and data science, note {i}."
+    for i in range(30)
+)
+RUST = " ".join(
+    f"Rust guarantees memory safety through ownership and borrowing, note {i}."
+    for i in range(30)
+)
+
+
+def make_source(url, text):
+    return {"url": url, "summary": f"Summary of {url}", "raw_content": text}
+
+
+def test_embed_is_normalized_and_deterministic():
+    vectors = embed(["Python data science", "Python data science", ""])
+
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+
+def test_search_ranks_relevant_chunks(tmp_path):
+    index = KnowledgeIndex(str(tmp_path))
+    index.add("languages", [make_source("https://py.org", PYTHON)])
+    index.add("languages", [make_source("https://rust.org", RUST)])
+
+    python_hits, rust_hits = index.search_many(
+        ["Python data science", "Rust memory safety"], k=1
+    )
+
+    assert python_hits[0]["url"] == "https://py.org"
+    assert rust_hits[0]["url"] == "https://rust.org"
+    assert python_hits[0]["score"] > 0.25
+
+
+def test_retrieve_persists_and_supersedes(tmp_path):
+    KnowledgeIndex(str(tmp_path)).add("t", [make_source("https://py.org", PYTHON)])
+
+    index = KnowledgeIndex(str(tmp_path))  # Reopened from disk
+    (source,) = index.retrieve("Python programming language", k=3)
+    assert source["url"] == "https://py.org"
+    assert source["summary"] == "Summary of https://py.org"
+    assert source["retrieved"] is True
+
+    # Re-scraping a URL replaces what it says
+    index.add("t", [make_source("https://py.org", RUST)])
+    assert index.retrieve("Python programming language", k=3) == []
+    assert index.retrieve("Rust ownership", k=3)[0]["url"] == "https://py.org"
+    assert index.retrieve("quantum chromodynamics", k=3) == []
+
+
+class SlowCommit:
+    """Connection proxy that runs a callback just before committing"""
+
+    def __init__(self, conn, before_commit):
+        self._conn = conn
+        self._before_commit = before_commit
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        self._before_commit()
+        self._conn.commit()
+
+
+def test_handles_sharing_a_directory_do_not_clobber_each_other(tmp_path):
+    """Test a second writer waits instead of truncating uncommitted rows"""
+    first, second = KnowledgeIndex(str(tmp_path)), KnowledgeIndex(str(tmp_path))
+    zebra = " ".join(f"Zebras graze on the savanna, note {i}." for i in range(30))
+    writer = threading.Thread(
+        target=second.add, args=("animals", [make_source("https://b.com", zebra)])
+    )
+
+    def start_second_writer():
+        writer.start()
+        time.sleep(0.2)  # The second writer runs while the first commits
+
+    first._conn = SlowCommit(first._conn, start_second_writer)
+    first.add("languages", [make_source("https://a.com", PYTHON)])
+    writer.join(timeout=10)
+
+    index = KnowledgeIndex(str(tmp_path))
+    assert len(index) == 2
+    assert index.search("zebras on the savanna", k=1)[0]["url"] == "https://b.com"
+    assert index.search("Python data science", k=1)[0]["url"] == "https://a.com"
@@ -0,0 +1,72 @@
+"""Tests for the LLM response cache"""
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agents.content_team import SynthesizerAgent
+from settings import settings
+from tests.fixtures import MOCK_OPENAI_RESPONSES
+from utils.llm_cache import LLMCache, cache_key, get_llm_cache
+
+SOURCES = [{"summary": "Python is a programming language"}]
+
+
+def make_llm():
+    llm = MagicMock(model_name="gpt-test", temperature=0.0)
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["synthesis"])
+    return llm
+
+
+def test_cache_key_depends_on_model_temperature_and_prompt():
+    messages = [SystemMessage(content="system"), HumanMessage(content="hi")]
+
+    assert cache_key("gpt-4", 0.0, messages) == cache_key("gpt-4", 0.0, messages)
+    assert cache_key("gpt-4", 0.0, messages) != cache_key("gpt-4", 0.7, messages)
+    assert cache_key("gpt-4", 0.0, messages) != cache_key("gpt-3.5", 0.0, messages)
+    assert cache_key("gpt-4", 0.0, messages) != cache_key("gpt-4", 0.0, messages[1:])
+
+
+def test_get_put_and_stats(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"))
+
+    assert cache.get("key", "writer") is None
+    cache.put("key", "response")
+    assert cache.get("key", "writer") == "response"
+    assert cache.stats["writer"] == {"hits": 1, "misses": 1}
+    assert cache.totals() == {"hits": 1, "misses": 1}
+
+
+def test_least_recently_used_eviction(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")  # "b" is now least recently used
+    cache.put("c", "3")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_agent_serves_repeated_prompts_from_cache():
+    llm = make_llm()
+    with patch("agents.base.get_llm", return_value=llm):
+        agent = SynthesizerAgent()
+        first = agent.synthesize("Python", SOURCES)
+        second = agent.synthesize("Python", SOURCES)
+
+    assert first == second
+    assert llm.invoke.call_count == 1
+    assert get_llm_cache().stats["synthesizer"] == {"hits": 1, "misses": 1}
+
+
+def test_cache_can_be_disabled_per_agent(monkeypatch):
+    monkeypatch.setattr(settings, "llm_cache_agents", "supervisor,writer")
+    llm = make_llm()
+    with patch("agents.base.get_llm", return_value=llm):
+        agent = SynthesizerAgent()
+        agent.synthesize("Python", SOURCES)
+        agent.synthesize("Python", SOURCES)
+
+    assert agent.use_cache is False
+    assert llm.invoke.call_count == 2
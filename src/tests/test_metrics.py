@@ -0,0 +1,103 @@
+"""Tests for run metrics and their exports"""
+import asyncio
+
+import pytest
+
+from settings import settings
+from utils.metrics import count, estimate_cost, get_metrics, metrics_scope, span, traced
+
+
+class Agent:
+    name = "scraper"
+
+    @traced("agent")
+    def scrape(self, url):
+        with span("fetch", "page"):
+            count(bytes=100)
+        return self.scrape_again(url)
+
+    @traced("agent")
+    def scrape_again(self, url):
+        with span("llm", self.name):
+            count(tokens_in=10, tokens_out=5)
+        return {"url": url}
+
+    @traced("agent")
+    async def ascrape(self, url):
+        raise ValueError("boom")
+
+
+def test_counts_roll_up_to_every_open_span():
+    with metrics_scope() as metrics:
+        with span("node", "research_team"):
+            Agent().scrape("https://a.com")
+            Agent().scrape("https://b.com")
+    stats = metrics.to_dict()
+
+    assert stats["node"]["research_team"]["calls"] == 1
+    assert stats["node"]["research_team"]["bytes"] == 200
+    assert stats["node"]["research_team"]["tokens_in"] == 20
+    # scrape_again runs inside scrape, so it is not counted as another call
+    assert stats["agent"]["scraper"]["calls"] == 2
+    assert stats["agent"]["scraper"]["tokens_out"] == 10
+    assert stats["fetch"]["page"]["bytes"] == 100 * 2
+    assert stats["llm"]["scraper"]["seconds"] >= 0
+
+
+def test_errors_are_counted_and_reraised():
+    with metrics_scope() as metrics:
+        with pytest.raises(ValueError):
+            asyncio.run(Agent().ascrape("https://a.com"))
+
+    assert metrics.to_dict()["agent"]["scraper"]["errors"] == 1
+
+
+def test_error_key_marks_reported_failures():
+    step = traced("node", "content_team", error_key="error")(
+        lambda state: {"error": "no sources"}
+    )
+    with metrics_scope() as metrics:
+        step({})
+
+    assert metrics.to_dict()["node"]["content_team"]["errors"] == 1
+
+
+def test_spans_link_to_their_parents():
+    with metrics_scope(record_spans=True) as metrics:
+        with span("node", "supervisor"):
+            with span("llm", "supervisor", model="gpt-4"):
+                count(tokens_in=3)
+    child, parent = metrics.to_dict()["spans"]
+
+    assert child["parent_span_id"] == parent["span_id"]
+    assert parent["parent_span_id"] is None
+    assert child["trace_id"] == parent["trace_id"]
+    assert child["name"] == "llm.supervisor"
+    assert child["attributes"] == {"model": "gpt-4", "tokens_in": 3}
+    assert child["status"] == {"code": "OK"}
+
+
+def test_runs_add_up_in_prometheus_export():
+    for _ in range(2):
+        with metrics_scope():
+            with span("node", "supervisor"):
+                count(tokens_in=7)
+    text = get_metrics().to_prometheus()
+
+    assert "research_runs_total 2" in text
+    assert 'research_tokens_in_total{kind="node",name="supervisor"} 14' in text
+    assert "# TYPE research_seconds_total counter" in text
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+    with metrics_scope() as metrics:
+        with span("node", "supervisor"):
+            count(tokens_in=1)
+
+    assert metrics is None
+
+
+def test_estimate_cost():
+    assert estimate_cost("gpt-3.5-turbo", 1_000_000, 1_000_000) == 2.0
+    assert estimate_cost("unknown-model", 1000, 1000) == 0.0
@@ -0,0 +1,24 @@
+"""Tests for MinHash near-duplicate detection"""
+from utils.minhash import NearDuplicateIndex, minhash, similarity
+
+ARTICLE = " ".join(
+    f"Paragraph {i} covers how the interpreter handles case {i}." for i in range(30)
+)
+
+
+def test_similarity_of_copies_and_unrelated_text():
+    copy = ARTICLE.replace("Paragraph 3 ", "Section 3 ") + " Published elsewhere."
+    unrelated = " ".join(f"Step {i}: water the garden at dawn." for i in range(30))
+
+    assert similarity(minhash(ARTICLE), minhash(ARTICLE)) == 1.0
+    assert similarity(minhash(ARTICLE), minhash(copy)) >= 0.8
+    assert similarity(minhash(ARTICLE), minhash(unrelated)) < 0.2
+
+
+def test_index_claims_first_copy():
+    index = NearDuplicateIndex(threshold=0.8)
+
+    assert index.claim("https://a.com", ARTICLE) is None
+    assert index.claim("https://mirror.com", ARTICLE + " Shared.") == "https://a.com"
+    assert index.claim("https://b.com", "Too short to compare") is None
+    assert index.claim("https://c.com", "Too short to compare") is None
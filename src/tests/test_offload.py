@@ -0,0 +1,99 @@
+"""Tests for running CPU-heavy steps in worker processes"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from agents.research_team import ScraperAgent, scrape_sources
+from settings import settings
+from utils.extract import extract_text
+from utils.minhash import text_signature
+from utils.offload import (
+    SharedPage,
+    arun_cpu,
+    extract_page,
+    get_process_pool,
+    run_cpu,
+    shutdown_process_pool,
+    warm_up_process_pool,
+)
+from utils.text import chunk_text
+
+ARTICLE = " ".join(f"Sentence {i} explains part {i} of Python." for i in range(40))
+HTML = f"<html><body><nav>Menu</nav><p>{ARTICLE}</p><p>Café crème.</p></body></html>"
+
+
+@pytest.fixture
+def process_pool(monkeypatch):
+    monkeypatch.setattr(settings, "cpu_workers", 2)
+    yield
+    shutdown_process_pool()
+
+
+def test_shared_page_holds_the_streamed_body():
+    data = HTML.encode("latin-1")
+    with SharedPage(len(data) + 100) as body:
+        for i in range(0, len(data), 64):
+            assert not body.write(data[i : i + 64], "latin-1")
+        name, size, encoding = body.ref
+
+        assert size == len(data) and encoding == "latin-1"
+        assert extract_page(body.ref, 10_000) == extract_text(HTML, 10_000)
+
+
+def test_shared_page_stops_at_capacity():
+    with SharedPage(10) as body:
+        assert not body.write(b"<p>Hello", None)
+        assert body.write(b" world</p>", None)
+        assert body.size == 10
+        assert extract_page(body.ref, 100) == extract_text("<p>Hello w", 100)
+
+
+def test_run_cpu_is_inline_when_disabled():
+    assert settings.cpu_workers == 0
+    assert run_cpu(text_signature, ARTICLE) == text_signature(ARTICLE)
+    assert get_process_pool.cache_info().currsize == 0
+
+
+def test_worker_processes_match_inline_results(process_pool):
+    warm_up_process_pool()
+    with SharedPage(settings.fetch_max_bytes) as body:
+        body.write(HTML.encode("utf-8"), "utf-8")
+        text = run_cpu(extract_page, body.ref, settings.extract_max_chars)
+    chunks = run_cpu(chunk_text, ARTICLE * 5, 100, settings.gpt_model)
+    signature = asyncio.run(arun_cpu(text_signature, ARTICLE))
+
+    assert text == extract_text(HTML, settings.extract_max_chars)
+    assert chunks == chunk_text(ARTICLE * 5, 100, settings.gpt_model)
+    assert signature == text_signature(ARTICLE)
+    assert get_process_pool.cache_info().currsize == 1
+
+
+def test_scraper_offloads_parsing_and_signatures(process_pool, monkeypatch):
+    """Test the scraper streams pages to the pool and still skips mirrors"""
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    pages = {
+        "https://origin.com/a": f"<p>{ARTICLE}</p>",
+        "https://mirror.com/a": f"<p>{ARTICLE} Republished with permission.</p>",
+        "https://other.com/b": " ".join(
+            f"<p>Rust fact {i} is about ownership.</p>" for i in range(60)
+        ),
+    }
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content="Summary")
+
+    def fetch(url, on_chunk=None, **kwargs):
+        body = pages[url].encode("utf-8")
+        for i in range(0, len(body), 256):
+            on_chunk(body[i : i + 256], "utf-8")
+        return {"status": 200, "headers": {}, "content": pages[url]}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "agents.research_team.fetch_page", side_effect=fetch
+    ):
+        results = scrape_sources(ScraperAgent(), list(pages), {}, max_workers=1)
+
+    urls = [r["url"] for r in results]
+    assert urls == ["https://origin.com/a", "https://other.com/b"]
+    prompt = llm.invoke.call_args_list[0][0][0][-1].content
+    assert "Sentence 39 explains part 39 of Python." in prompt
@@ -0,0 +1,110 @@
+"""Tests for the on-disk page cache"""
+import os
+import time
+from unittest.mock import patch
+
+from agents.research_team import ScraperAgent
+from tests.fixtures import MOCK_HTML_CONTENT
+from utils.page_cache import PageCache, normalize_url
+
+
+def make_page(content=MOCK_HTML_CONTENT, status=200, etag='"v1"'):
+    return {"status": status, "headers": {"ETag": etag}, "content": content}
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.com:443/a?b=2&a=1&utm_source=x#top") == (
+        "https://example.com/a?a=1&b=2"
+    )
+    assert normalize_url("http://example.com") == "http://example.com/"
+    assert normalize_url("http://example.com:8080/") == "http://example.com:8080/"
+
+
+def test_put_and_get(tmp_path):
+    cache = PageCache(str(tmp_path), ttl=60)
+    cache.put("https://example.com/a?utm_medium=mail", make_page(), "text")
+
+    entry = cache.get("https://EXAMPLE.com/a")
+    assert entry["text"] == "text"
+    assert entry["html"] == MOCK_HTML_CONTENT
+    assert entry["etag"] == '"v1"'
+    assert entry["fresh"] is True
+    assert cache.get("https://example.com/other") is None
+
+    # Pages whose body went straight to a consumer have no HTML to store
+    body_not_kept = {"status": 200, "headers": {}}
+    assert "html" not in cache.put("https://example.com/b", body_not_kept, "text")
+
+
+def test_stale_entries_and_revalidation(tmp_path):
+    cache = PageCache(str(tmp_path), ttl=0)
+    cache.put("https://example.com", make_page(), "text")
+
+    entry = cache.get("https://example.com")
+    assert entry["fresh"] is False
+    assert cache.conditional_headers(entry) == {"If-None-Match": '"v1"'}
+
+    cache.ttl = 60
+    cache.revalidated("https://example.com", entry)
+    assert cache.get("https://example.com")["fresh"] is True
+
+
+def test_lru_eviction(tmp_path):
+    cache = PageCache(str(tmp_path))
+    for i in range(3):
+        cache.put(f"https://example.com/{i}", make_page("x" * 1000), "y")
+        # Make access order unambiguous for filesystems with coarse mtimes
+        path = cache._path(f"https://example.com/{i}")
+        os.utime(path, (time.time() - 10 + i, time.time() - 10 + i))
+
+    # Room for three entries, not four
+    cache.max_bytes = int(os.path.getsize(path) * 3.5)
+
+    cache.get("https://example.com/0")  # Most recently used now
+    cache.put("https://example.com/3", make_page("x" * 1000), "y")
+
+    assert cache.get("https://example.com/0") is not None
+    assert cache.get("https://example.com/1") is None
+
+
+def test_put_only_scans_the_directory_when_full(tmp_path):
+    cache = PageCache(str(tmp_path))
+    with patch("utils.page_cache.os.scandir", wraps=os.scandir) as scandir:
+        for i in range(5):
+            cache.put(f"https://example.com/{i}", make_page("x" * 1000), "y")
+        cache.put("https://example.com/0", make_page("x" * 10), "y")
+        assert scandir.call_count == 0
+
+        size = os.path.getsize(cache._path("https://example.com/1"))
+        assert cache._size == sum(p.stat().st_size for p in tmp_path.iterdir())
+        cache.max_bytes = size * 3
+        cache.put("https://example.com/5", make_page("x" * 1000), "y")
+        assert scandir.call_count == 1
+
+    assert cache._size <= cache.max_bytes
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_scraper_serves_repeat_urls_from_cache():
+    agent = ScraperAgent()
+    with patch("agents.research_team.fetch_page", return_value=make_page()) as fetch:
+        first = agent._fetch_content("https://example.com/page")
+        second = agent._fetch_content("https://example.com/page")
+
+    assert first == second
+    assert "Python is a great language." in first
+    assert fetch.call_count == 1
+
+
+def test_scraper_revalidates_stale_pages():
+    agent = ScraperAgent()
+    agent.page_cache.ttl = 0
+    with patch("agents.research_team.fetch_page", return_value=make_page()):
+        first = agent._fetch_content("https://example.com/page")
+
+    not_modified = make_page(content="", status=304)
+    with patch("agents.research_team.fetch_page", return_value=not_modified) as fetch:
+        second = agent._fetch_content("https://example.com/page")
+
+    assert second == first
+    assert fetch.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
@@ -0,0 +1,155 @@
+"""Tests for the adaptive rate limiter"""
+import asyncio
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+from settings import settings
+from utils.deadline import DeadlineExceeded, deadline_scope
+from utils.ratelimit import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    RateLimiter,
+    get_limiter,
+    is_throttled,
+    is_transient,
+    share_limits,
+)
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after else {}
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limited", response=response, body=None)
+
+
+def test_classifies_errors():
+    assert is_throttled(rate_limit_error())
+    assert is_transient(rate_limit_error())
+    assert is_transient(httpx.ConnectError("reset"))
+    assert not is_transient(httpx.ReadTimeout("slow"))
+    assert not is_transient(ValueError("bad prompt"))
+
+
+def test_token_bucket_spaces_out_calls():
+    limiter = RateLimiter("test", rate=20, max_concurrency=4, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.call(lambda: None)
+
+    # The first call uses the burst, the other four wait 1/20s each
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.05)
+
+
+def test_limit_halves_on_throttling_and_grows_back():
+    limiter = RateLimiter("test", rate=0, max_concurrency=8)
+    with pytest.raises(openai.RateLimitError):
+        with limiter.slot():
+            raise rate_limit_error()
+    assert limiter.limit == 4
+
+    for _ in range(30):
+        limiter.call(lambda: None)
+    assert 6 < limiter.limit <= 8
+
+
+def test_retry_after_pauses_every_caller():
+    limiter = RateLimiter("test", rate=0, max_concurrency=2)
+    with pytest.raises(openai.RateLimitError):
+        with limiter.slot():
+            raise rate_limit_error(retry_after=0.2)
+
+    start = time.monotonic()
+    limiter.call(lambda: None)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_retries_transient_errors_only(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_backoff", 0.01)
+    limiter = RateLimiter("test", rate=0, max_concurrency=2)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("reset")
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert len(calls) == 3
+
+    def broken():
+        calls.append(1)
+        raise ValueError("bad prompt")
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        limiter.call(broken)
+    assert len(calls) == 1
+
+
+def test_waiting_callers_go_by_priority():
+    limiter = RateLimiter("test", rate=0, max_concurrency=1)
+    order = []
+
+    def worker(priority, name):
+        limiter.call(lambda: order.append(name), priority)
+
+    limiter.acquire()
+    threads = [
+        threading.Thread(target=worker, args=(PRIORITY_LOW, "plan")),
+        threading.Thread(target=worker, args=(PRIORITY_HIGH, "write")),
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)  # Queue them in this order
+    assert limiter.waiting == 2
+    limiter.release(time.monotonic())
+    for thread in threads:
+        thread.join()
+
+    assert order == ["write", "plan"]
+
+
+def test_waiting_stops_at_the_deadline():
+    limiter = RateLimiter("test", rate=0, max_concurrency=1)
+    limiter.acquire()
+    with deadline_scope(0.1):
+        with pytest.raises(DeadlineExceeded):
+            limiter.acquire()
+    assert limiter.waiting == 0
+
+
+def test_async_calls_share_the_limit():
+    limiter = RateLimiter("test", rate=0, max_concurrency=2)
+    running = []
+
+    async def call():
+        running.append(limiter.active)
+        await asyncio.sleep(0.05)
+        return limiter.active
+
+    async def main():
+        return await asyncio.gather(*(limiter.acall(call) for _ in range(6)))
+
+    assert max(asyncio.run(main())) == 2
+    assert max(running) == 2
+
+
+def test_processes_split_the_limits(monkeypatch):
+    monkeypatch.setattr(settings, "llm_rate_limit", 8.0)
+    monkeypatch.setattr(settings, "llm_max_concurrency", 32)
+    monkeypatch.setattr(settings, "search_rate_limit", 0.0)
+    monkeypatch.setattr(settings, "search_max_concurrency", 2)
+    assert get_limiter("llm:gpt-4").max_concurrency == 32
+
+    share_limits(4)
+
+    llm = get_limiter("llm:gpt-4")
+    assert (llm.rate, llm.max_concurrency) == (2.0, 8)
+    search = get_limiter("search:duckduckgo")
+    assert (search.rate, search.max_concurrency) == (0.0, 1)  # Still unlimited
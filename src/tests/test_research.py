@@ -1,12 +1,49 @@
+import asyncio
+import time
+
 import pytest
-from unittest.mock import patch, MagicMock
+import requests
+from unittest.mock import patch, AsyncMock, MagicMock
 
 from tests.fixtures import MOCK_SEARCH_RESULTS, MOCK_HTML_CONTENT, MOCK_OPENAI_RESPONSES
 from tests.utils import MockOpenAI, MockDuckDuckGo
 
 from agents.content_team import SynthesizerAgent, WriterAgent
-from agents.research_team import ScraperAgent, SearchAgent
-from main import initialize_research, run_research
+from agents.pipeline import apipelined_research_step, pipelined_research_step
+from agents.registry import clear_registry, get_agent, get_llm
+from agents.research_team import (
+    ScraperAgent,
+    SearchAgent,
+    ascrape_sources,
+    iter_scrapes,
+    scrape_sources,
+)
+from agents.supervisor import create_workflow, get_workflow
+from utils.blobs import get_blob_store
+from utils.checkpoint import get_checkpointer
+from utils.deadline import DeadlineExceeded
+from utils.search import SEARCH_BACKENDS, SearchBackend
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from main import (
+    arefresh_research,
+    arun_research,
+    astream_research,
+    initialize_research,
+    refresh_research,
+    run_research,
+    run_research_batch,
+    stream_research,
+)
+from settings import settings
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    """Give every test fresh shared agents so patches take effect"""
+    clear_registry()
+    yield
+    clear_registry()
 
 
 @pytest.fixture
@@ -22,7 +59,7 @@ def mock_openai():
 @pytest.fixture
 def mock_duckduckgo():
     """Mock DuckDuckGo search results"""
-    with patch('agents.research_team.DuckDuckGoSearchResults') as mock:  # Fix the path
+    with patch('utils.search.DuckDuckGoSearchResults') as mock:  # Fix the path
         mock.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
         yield mock
 
@@ -30,11 +67,32 @@ def mock_duckduckgo():
 @pytest.fixture
 def mock_requests():
     """Mock HTTP requests"""
-    with patch('requests.get') as mock:
-        mock.return_value.text = MOCK_HTML_CONTENT
+    with patch('agents.research_team.fetch_page') as mock:
+        mock.return_value = {
+            "url": "https://python.org",
+            "status": 200,
+            "headers": {},
+            "content": MOCK_HTML_CONTENT,
+        }
         yield mock
 
 
+@pytest.fixture
+def mock_async_stack():
+    """Mock LLMs, search and HTTP for the async workflow"""
+    llm = MagicMock()
+    llm.ainvoke = AsyncMock(
+        return_value=MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    )
+    search = MagicMock()
+    search.ainvoke = AsyncMock(return_value=MOCK_SEARCH_RESULTS)
+    page = {"url": "https://example.com", "status": 200, "content": MOCK_HTML_CONTENT}
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults", return_value=search
+    ), patch("agents.research_team.afetch_page", new=AsyncMock(return_value=page)):
+        yield llm
+
+
 def test_initialize_research():
     """Test research state initialization"""
     topic = "Test Topic"
@@ -58,6 +116,90 @@ def test_search_agent():
     assert results[0]["link"] == MOCK_SEARCH_RESULTS[0]["link"]
 
 
+def test_search_agent_plans_queries_across_backends(monkeypatch):
+    """Test planned queries run on every backend and merge into one ranking"""
+    monkeypatch.setattr(settings, "search_backends", "one,two")
+    seen = []
+
+    class Backend(SearchBackend):
+        def __init__(self, name):
+            self.name = name
+
+        def search(self, query):
+            seen.append((self.name, query))
+            return [
+                {"link": f"https://{self.name}.com/{query}", "title": query},
+                {"link": "https://Shared.com/page?utm_source=x", "title": "shared"},
+            ]
+
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content="1. planned query\n- Python")
+    backends = {"one": lambda: Backend("one"), "two": lambda: Backend("two")}
+    with patch.dict(SEARCH_BACKENDS, backends), patch(
+        "agents.registry.ChatOpenAI", return_value=llm
+    ):
+        agent = SearchAgent()
+        results = agent.search("Python", {}, plan="Cover the basics")
+
+    queries = ("Python", "planned query")
+    assert sorted(seen) == sorted(
+        (name, query) for name in ("one", "two") for query in queries
+    )
+    # Found by every query and backend, so ranked first and kept once
+    assert results[0]["link"] == "https://Shared.com/page?utm_source=x"
+    assert len(results) == settings.max_search_results
+    assert len({r["link"] for r in results}) == len(results)
+
+
+class ThrottledBackend(SearchBackend):
+    """Backend that answers HTTP 429 a given number of times"""
+
+    name = "throttled"
+
+    def __init__(self, refusals):
+        self.refusals = refusals
+        self.calls = 0
+
+    def search(self, query):
+        self.calls += 1
+        if self.calls <= self.refusals:
+            response = requests.Response()
+            response.status_code = 429
+            raise requests.HTTPError("429 Too Many Requests", response=response)
+        return MOCK_SEARCH_RESULTS
+
+
+def test_search_retries_throttled_backends(monkeypatch):
+    """Test a throttled search is retried instead of coming back empty"""
+    monkeypatch.setattr(settings, "search_backends", "throttled")
+    monkeypatch.setattr(settings, "rate_limit_backoff", 0.01)
+    backend = ThrottledBackend(refusals=2)
+    with patch.dict(SEARCH_BACKENDS, {"throttled": lambda: backend}):
+        results = SearchAgent().search("Python", {})
+
+    assert backend.calls == 3
+    assert results[0]["link"] == MOCK_SEARCH_RESULTS[0]["link"]
+
+
+def test_failed_search_fails_the_run(monkeypatch):
+    """Test a run whose searches all fail reports it, without a fake source"""
+    monkeypatch.setattr(settings, "search_backends", "throttled")
+    monkeypatch.setattr(settings, "rate_limit_backoff", 0.01)
+    monkeypatch.setattr(settings, "knowledge_enabled", False)
+    monkeypatch.setattr(settings, "search_queries", 1)
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    backend = ThrottledBackend(refusals=100)
+    with patch.dict(SEARCH_BACKENDS, {"throttled": lambda: backend}), patch(
+        "agents.registry.ChatOpenAI", return_value=llm
+    ):
+        result = run_research("Python programming")
+
+    assert "searches failed" in result["error"]
+    assert backend.calls == settings.rate_limit_retries + 1
+    assert not result["research_data"].get("sources")
+
+
 @pytest.mark.usefixtures("mock_openai", "mock_requests")
 def test_scraper_agent():
     """Test scraper agent functionality with mocked requests"""
@@ -69,6 +211,333 @@ def test_scraper_agent():
     assert result["url"] == "https://python.org"
 
 
+def test_registry_reuses_agents_and_clients():
+    """Test that agents and LLM clients are shared instead of rebuilt"""
+    assert get_agent(ScraperAgent) is get_agent(ScraperAgent)
+    assert get_agent(ScraperAgent).llm is get_agent(WriterAgent).llm
+    assert get_llm("gpt-3.5-turbo") is not get_llm()
+
+
+class SlowScraper:
+    """Scraper stub that sleeps for a per-URL delay"""
+
+    def __init__(self, delays):
+        self.delays = delays
+
+    def scrape(self, url, context, seen=None):
+        time.sleep(self.delays[url])
+        return {"url": url, "summary": f"Summary of {url}"}
+
+
+def test_scrape_sources_concurrent_and_ordered():
+    """Test that scraping runs in parallel and keeps the search order"""
+    delays = {"https://a.com": 0.3, "https://b.com": 0.1, "https://c.com": 0.2}
+    start = time.monotonic()
+    results = scrape_sources(
+        SlowScraper(delays), list(delays), {"topic": "t"}, max_workers=3, timeout=5
+    )
+    elapsed = time.monotonic() - start
+
+    assert [r["url"] for r in results] == list(delays)
+    assert elapsed < sum(delays.values())
+
+
+def test_scrape_sources_drops_slow_urls():
+    """Test that URLs past their deadline are dropped"""
+    delays = {"https://fast.com": 0.05, "https://slow.com": 2.0}
+    start = time.monotonic()
+    results = scrape_sources(
+        SlowScraper(delays), list(delays), {"topic": "t"}, max_workers=2, timeout=0.5
+    )
+
+    assert [r["url"] for r in results] == ["https://fast.com"]
+    assert time.monotonic() - start < 1.5
+
+
+class AsyncSlowScraper(SlowScraper):
+    """Async scraper stub that sleeps for a per-URL delay"""
+
+    async def ascrape(self, url, context, client=None, seen=None):
+        await asyncio.sleep(self.delays[url])
+        return {"url": url, "summary": f"Summary of {url}"}
+
+
+def test_ascrape_sources_concurrent_and_ordered():
+    """Test async scraping keeps order and drops URLs past their deadline"""
+    delays = {"https://a.com": 0.2, "https://b.com": 0.1, "https://slow.com": 2.0}
+    start = time.monotonic()
+    results = asyncio.run(
+        ascrape_sources(
+            AsyncSlowScraper(delays), list(delays), {}, max_workers=3, timeout=0.5
+        )
+    )
+
+    assert [r["url"] for r in results] == ["https://a.com", "https://b.com"]
+    assert time.monotonic() - start < 1.5
+
+
+def test_scrape_sources_skips_mirrored_pages(monkeypatch):
+    """Test that near-identical pages are summarized only once"""
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    article = " ".join(f"Sentence {i} explains part {i} of Python." for i in range(40))
+    pages = {
+        "https://origin.com/a": f"<p>{article}</p>",
+        "https://mirror.com/a": f"<p>{article} Republished with permission.</p>",
+        "https://other.com/b": " ".join(
+            f"<p>Rust fact {i} is about ownership.</p>" for i in range(60)
+        ),
+    }
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["summary"])
+
+    def fetch(url, **kwargs):
+        return {"status": 200, "headers": {}, "content": pages[url]}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "agents.research_team.fetch_page", side_effect=fetch
+    ):
+        results = scrape_sources(ScraperAgent(), list(pages), {}, max_workers=1)
+
+    urls = [r["url"] for r in results]
+    assert urls == ["https://origin.com/a", "https://other.com/b"]
+    assert llm.invoke.call_count == 2
+
+
+def test_iter_scrapes_stops_at_deadline():
+    """Test that scrapes still running at the overall deadline are abandoned"""
+    delays = {"https://slow.com": 2.0, "https://fast.com": 0.05}
+    start = time.monotonic()
+    results = list(
+        iter_scrapes(
+            SlowScraper(delays),
+            list(delays),
+            {},
+            max_workers=2,
+            timeout=5,
+            deadline=start + 0.3,
+        )
+    )
+
+    assert [(i, r["url"]) for i, r in results] == [(1, "https://fast.com")]
+    assert time.monotonic() - start < 1.0
+
+
+def test_research_timeout_degrades_instead_of_hanging(monkeypatch):
+    """Test a run out of time drops slow sources and still writes an article"""
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    monkeypatch.setattr(settings, "research_timeout", 1)
+    llm = MagicMock(max_retries=1)
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+
+    def fetch(url, **kwargs):
+        if url.endswith("/2"):
+            time.sleep(3.0)  # Outlives the whole run
+        return page
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", side_effect=fetch):
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        start = time.monotonic()
+        result = run_research("Python programming basics")
+        elapsed = time.monotonic() - start
+
+    assert result["content"] == MOCK_OPENAI_RESPONSES["content"]
+    assert result["metadata"]["sources_used"] == 1
+    assert result["metadata"]["degraded"] == ["scrape"]
+    assert elapsed < 1.5
+    # LLM calls get what is left of their stage, split between the two tries
+    timeouts = [call.kwargs["timeout"] for call in llm.invoke.call_args_list]
+    assert timeouts and all(0 < timeout <= 0.5 for timeout in timeouts)
+
+
+def test_run_metrics_per_node_and_agent(monkeypatch):
+    """Test a run reports time, tokens and bytes for its nodes and agents"""
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    llm = MagicMock(model_name="gpt-3.5-turbo", max_retries=0)
+    llm.invoke.return_value = AIMessage(
+        content=MOCK_OPENAI_RESPONSES["content"],
+        response_metadata={
+            "token_usage": {"prompt_tokens": 100, "completion_tokens": 20}
+        },
+    )
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", return_value=page):
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        result = run_research("Python programming basics")
+    metrics = result["metadata"]["metrics"]
+    llm_calls = llm.invoke.call_count
+
+    nodes = {"supervisor", "research_team", "review", "content_team"}
+    assert set(metrics["node"]) == nodes
+    assert metrics["node"]["research_team"]["seconds"] > 0
+    assert metrics["agent"]["scraper"]["calls"] == len(MOCK_SEARCH_RESULTS)
+    assert metrics["search"]["duckduckgo"]["calls"] >= 1
+    total_in = sum(stats["tokens_in"] for stats in metrics["node"].values())
+    assert total_in == 100 * llm_calls
+    assert sum(s["calls"] for s in metrics["llm"].values()) == llm_calls
+    assert metrics["llm"]["writer"]["cost_usd"] == pytest.approx(
+        (100 * 0.5 + 20 * 1.5) / 1_000_000
+    )
+
+
+def research_rounds(monkeypatch, summaries, fetch_seconds=0, **overrides):
+    """Run research where round n finds the links and summaries[n] describes them"""
+    monkeypatch.setattr(settings, "search_queries", 1)
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    for name, value in {"research_rounds": 5, **overrides}.items():
+        monkeypatch.setattr(settings, name, value)
+    rounds = iter(range(len(summaries)))
+    current = {}
+
+    def search(query):
+        current["round"] = next(rounds, len(summaries) - 1)
+        host = f"https://round{current['round']}.com"
+        return [{"link": f"{host}/{i}"} for i in range(2)]
+
+    def llm_call(messages, **kwargs):
+        if "content scraper" in str(messages):
+            text = summaries[current["round"]]
+        else:
+            text = MOCK_OPENAI_RESPONSES["content"]
+        return AIMessage(
+            content=text,
+            response_metadata={
+                "token_usage": {"prompt_tokens": 100, "completion_tokens": 20}
+            },
+        )
+
+    llm = MagicMock(model_name="gpt-3.5-turbo", max_retries=0)
+    llm.invoke.side_effect = llm_call
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+
+    def fetch(url, **kwargs):
+        time.sleep(fetch_seconds)
+        return page
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as backend, patch("agents.research_team.fetch_page", side_effect=fetch):
+        backend.return_value.invoke.side_effect = search
+        result = run_research("Python programming basics")
+    return result, llm
+
+
+def test_research_rounds_stop_when_nothing_new(monkeypatch):
+    """Test research goes on while rounds add information and stops after"""
+    summaries = [
+        "Python is a readable language with dynamic typing and garbage collection",
+        "Python packages come from PyPI and install into virtual environments",
+        "Python is a readable language with dynamic typing and garbage collection",
+    ]
+    result, llm = research_rounds(monkeypatch, summaries)
+    rounds = result["research_data"]["rounds"]
+
+    assert [r["sources"] for r in rounds] == [2, 2, 2]
+    assert rounds[1]["novelty"] > settings.research_min_novelty
+    assert rounds[2]["novelty"] < settings.research_min_novelty
+    assert result["metadata"]["sources_used"] == 6
+    assert result["content"] == MOCK_OPENAI_RESPONSES["content"]
+    # Later plans see the previous plan and only the last round's sources
+    calls = [call.args[0] for call in llm.invoke.call_args_list]
+    plans = [messages for messages in calls if "Plan the next round" in str(messages)]
+    assert len(plans) == 2
+    assert "round1.com" in plans[-1][-1].content
+    assert "round0.com" not in plans[-1][-1].content
+
+
+def test_research_rounds_respect_cap_and_token_budget(monkeypatch):
+    # Every round is about something else, so research never converges
+    summaries = [" ".join(f"fact{i}x{j}" for j in range(20)) for i in range(9)]
+    capped, _ = research_rounds(monkeypatch, summaries, research_rounds=2)
+    assert len(capped["research_data"]["rounds"]) == 2
+
+    clear_registry()
+    budgeted, _ = research_rounds(monkeypatch, summaries, research_token_budget=1500)
+    rounds = budgeted["research_data"]["rounds"]
+    assert len(rounds) < 5
+    # The run stopped before a round like the last could overrun the budget
+    assert rounds[-1]["tokens"] <= 1500
+
+
+def test_research_rounds_leave_time_to_write(monkeypatch):
+    summaries = [" ".join(f"fact{i}x{j}" for j in range(20)) for i in range(9)]
+    result, _ = research_rounds(
+        monkeypatch,
+        summaries,
+        fetch_seconds=0.3,  # Slow pages, yet every round finishes in time
+        research_rounds=9,
+        research_timeout=2,
+    )
+
+    rounds = result["research_data"]["rounds"]
+    assert 1 < len(rounds) < 9
+    # Synthesis and writing still have about their 35% of the run
+    assert rounds[-1]["time_left"] >= 0.6
+    assert "degraded" not in result["metadata"]
+    assert result["content"] == MOCK_OPENAI_RESPONSES["content"]
+
+
+def test_pipelined_workflow_writes_at_quorum(monkeypatch):
+    """Test pipelined research hands over to the writer once a quorum is in"""
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    monkeypatch.setattr(settings, "pipeline_quorum", 1)
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+
+    def fetch(url, **kwargs):
+        if url.endswith("/2"):
+            time.sleep(2.0)  # One slow site
+        return page
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", side_effect=fetch):
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        start = time.monotonic()
+        result = create_workflow(pipelined=True).invoke(
+            initialize_research("Python programming basics")
+        )
+        elapsed = time.monotonic() - start
+
+    assert result["content"] == MOCK_OPENAI_RESPONSES["content"]
+    assert result["metadata"]["sources_used"] == 1
+    assert result["research_data"]["synthesis"]["source_count"] == 1
+    assert elapsed < 1.5
+
+
+def test_pipelined_research_survives_a_seed_synthesis_timeout(monkeypatch):
+    """Test a timed-out synthesis of remembered sources only degrades the run"""
+    monkeypatch.setattr(settings, "pipeline_quorum", 2)
+    known = [
+        {"url": f"https://known.com/{i}", "summary": "Python basics"} for i in range(2)
+    ]
+    topic = "Python programming basics"
+
+    with patch("agents.pipeline.recall_sources", return_value=known), patch.object(
+        SynthesizerAgent, "synthesize", side_effect=DeadlineExceeded("synthesize")
+    ), patch.object(
+        SynthesizerAgent,
+        "asynthesize",
+        AsyncMock(side_effect=DeadlineExceeded("synthesize")),
+    ):
+        result = pipelined_research_step(initialize_research(topic))
+        aresult = asyncio.run(apipelined_research_step(initialize_research(topic)))
+
+    for res in (result, aresult):
+        assert not res.get("error")
+        assert res["research_data"]["sources"] == known
+        assert "synthesis" not in res["research_data"]
+        assert res["metadata"]["degraded"] == ["synthesize"]
+
+
 @pytest.mark.usefixtures("mock_openai")
 def test_synthesizer_agent():
     """Test synthesizer agent functionality with mocked OpenAI"""
@@ -119,5 +588,268 @@ def test_full_research_workflow():
     assert len(result["content"]) > 0
 
 
+def test_async_research_workflow(mock_async_stack):
+    """Test the async workflow end to end with ainvoke mocks"""
+    result = asyncio.run(arun_research("Python programming basics"))
+
+    assert result is not None
+    assert result["content"] == MOCK_OPENAI_RESPONSES["content"]
+    assert result["metadata"]["sources_used"] == len(MOCK_SEARCH_RESULTS)
+    assert mock_async_stack.ainvoke.await_count > 0
+    mock_async_stack.invoke.assert_not_called()
+
+
+def test_research_batch_shares_searches_and_fetches(monkeypatch):
+    """Test batch runs stream per-topic results and dedupe shared work"""
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", return_value=page) as fetch:
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        items = list(run_research_batch(["Python", "Python", "Rust"], concurrency=3))
+
+    assert sorted(item["topic"] for item in items) == ["Python", "Python", "Rust"]
+    assert all(item["error"] is None for item in items)
+    assert all(item["elapsed"] >= 0 for item in items)
+    assert all(item["result"]["content"] for item in items)
+    # "Python", "Rust" and the planned query, which both topics share
+    assert search.return_value.invoke.call_count == 3
+    assert fetch.call_count == len(MOCK_SEARCH_RESULTS)
+
+
+def test_research_reuses_indexed_sources(monkeypatch):
+    """Test a topic covered by earlier runs is answered without the web"""
+    monkeypatch.setattr(settings, "knowledge_min_sources", 2)
+    monkeypatch.setattr(settings, "knowledge_min_score", 0.1)
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", return_value=page) as fetch:
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        first = run_research("Python programming")
+        searches, fetches = search.return_value.invoke.call_count, fetch.call_count
+        second = run_research("Python programming")
+
+    assert fetches == len(MOCK_SEARCH_RESULTS)
+    assert search.return_value.invoke.call_count == searches
+    assert fetch.call_count == fetches
+    assert {s["url"] for s in second["research_data"]["sources"]} == {
+        s["url"] for s in first["research_data"]["sources"]
+    }
+    assert all(s["retrieved"] for s in second["research_data"]["sources"])
+
+
+def test_page_text_is_kept_out_of_the_state(monkeypatch):
+    """Test scraped page text lives in the blob store, not in the state"""
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    monkeypatch.setattr(settings, "knowledge_enabled", False)
+    article = "<p>" + "Python tutorial paragraph with details. " * 2000 + "</p>"
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    page = {"status": 200, "headers": {}, "content": article}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", return_value=page):
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        result = run_research("Python programming")
+    sources = result["research_data"]["sources"]
+
+    assert len(str(result)) < len(article)
+    assert all("raw_content" not in source for source in sources)
+    text = get_blob_store().get(sources[0]["content_ref"])
+    assert text.startswith("Python tutorial paragraph")
+    # No prompt carries the page text beyond the scraper's own chunks
+    prompts = [str(call.args[0]) for call in llm.invoke.call_args_list]
+    assert all("content_ref" not in prompt for prompt in prompts)
+
+
+def test_checkpointed_run_resumes_after_crash():
+    """Test a crashed run resumes after its last completed node"""
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", return_value=page) as fetch:
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        with patch(
+            "agents.supervisor.content_team_step", side_effect=SystemError("killed")
+        ):
+            assert run_research("Python", run_id="run-1") is None
+        get_workflow.cache_clear()  # As after a restart
+
+        calls = llm.invoke.call_count
+        result = run_research("Python", run_id="run-1")
+        resumed_calls = llm.invoke.call_count - calls
+        again = run_research("Python", run_id="run-1")
+
+    assert result["content"] == MOCK_OPENAI_RESPONSES["content"]
+    assert fetch.call_count == len(MOCK_SEARCH_RESULTS)  # Not scraped twice
+    assert resumed_calls == 2  # Only synthesis and writing
+    assert again["content"] == result["content"]
+    assert llm.invoke.call_count == calls + resumed_calls
+
+    checkpoint = get_checkpointer().load("run-1")
+    assert "raw_content" not in str(checkpoint["channel_values"])
+
+
+def test_refresh_redoes_only_what_changed(monkeypatch):
+    """Test a refresh keeps unchanged sources and revises for changed ones"""
+    monkeypatch.setattr(settings, "search_queries", 1)
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    urls = [result["link"] for result in MOCK_SEARCH_RESULTS]
+    pages = {url: MOCK_HTML_CONTENT for url in urls}
+
+    def fetch(url, **kwargs):
+        return {"status": 200, "headers": {}, "content": pages[url]}
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search, patch("agents.research_team.fetch_page", side_effect=fetch) as fetcher:
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        first = run_research("Python", run_id="nightly")
+        calls = llm.invoke.call_count
+        unchanged = refresh_research("Python", run_id="nightly")
+        assert llm.invoke.call_count == calls  # No summary, synthesis or writing
+
+        pages[urls[1]] = MOCK_HTML_CONTENT.replace("great", "popular")
+        llm.invoke.return_value = MagicMock(content="Revised content")
+        changed = refresh_research("Python", run_id="nightly")
+        prompts = [str(call.args[0]) for call in llm.invoke.call_args_list[calls:]]
+
+    assert fetcher.call_count == 3 * len(urls)  # Revalidated on every refresh
+    assert unchanged["content"] == first["content"]
+    assert unchanged["research_data"]["changes"]["unchanged"] == urls
+    assert changed["research_data"]["changes"]["changed"] == [urls[1]]
+    # One new summary, the synthesis and the revision of the previous article
+    assert len(prompts) == 3
+    assert f"Updated source {urls[1]}" in prompts[-1]
+    assert MOCK_OPENAI_RESPONSES["content"] in prompts[-1]
+    assert changed["content"] == "Revised content"
+
+
+def test_refresh_keeps_sources_whose_site_is_down(monkeypatch):
+    """Test a refresh keeps sources whose retries on 503 all failed"""
+    monkeypatch.setattr(settings, "search_queries", 1)
+    monkeypatch.setattr(settings, "page_cache_enabled", False)
+    monkeypatch.setattr(settings, "max_scrape_retries", 1)
+    monkeypatch.setattr(settings, "fetch_retry_backoff", 0.01)
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    urls = [result["link"] for result in MOCK_SEARCH_RESULTS]
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+    # Every request of the real fetch_page gets a 503
+    session = MagicMock()
+    session.get.return_value.__enter__.return_value = MagicMock(status_code=503)
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults"
+    ) as search:
+        search.return_value.invoke.return_value = MOCK_SEARCH_RESULTS
+        with patch("agents.research_team.fetch_page", return_value=page):
+            first = run_research("Python", run_id="nightly")
+        calls = llm.invoke.call_count
+        with patch("utils.fetch.get_session", return_value=session):
+            refreshed = refresh_research("Python", run_id="nightly")
+
+    assert session.get.call_count == 2 * len(urls)  # Retried, then given up
+    assert llm.invoke.call_count == calls
+    assert refreshed["research_data"]["sources"] == first["research_data"]["sources"]
+    assert refreshed["research_data"]["changes"]["unchanged"] == urls
+    assert refreshed["content"] == first["content"]
+
+
+def test_async_refresh_keeps_unchanged_research(mock_async_stack, monkeypatch):
+    monkeypatch.setattr(settings, "search_queries", 1)
+
+    async def research():
+        first = await arun_research("Python", run_id="nightly")
+        calls = mock_async_stack.ainvoke.call_count
+        refreshed = await arefresh_research("Python", run_id="nightly")
+        return first, refreshed, mock_async_stack.ainvoke.call_count - calls
+
+    first, refreshed, calls = asyncio.run(research())
+
+    assert calls == 0
+    assert refreshed["content"] == first["content"]
+    assert refreshed["metadata"]["sources_used"] == first["metadata"]["sources_used"]
+
+
+@pytest.fixture
+def mock_streaming_stack(monkeypatch):
+    """Mock LLMs with token streams, search and page fetches"""
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    tokens = ["Test ", "streamed ", "content"]
+
+    async def astream(messages, **kwargs):
+        for token in tokens:
+            yield AIMessageChunk(content=token)
+
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=MOCK_OPENAI_RESPONSES["content"])
+    llm.ainvoke = AsyncMock(return_value=llm.invoke.return_value)
+    llm.stream.side_effect = lambda messages, **kwargs: iter(
+        AIMessageChunk(content=token) for token in tokens
+    )
+    llm.astream.side_effect = astream
+    page = {"status": 200, "headers": {}, "content": MOCK_HTML_CONTENT}
+    search = MagicMock()
+    search.invoke.return_value = MOCK_SEARCH_RESULTS
+    search.ainvoke = AsyncMock(return_value=MOCK_SEARCH_RESULTS)
+
+    with patch("agents.registry.ChatOpenAI", return_value=llm), patch(
+        "utils.search.DuckDuckGoSearchResults", return_value=search
+    ), patch("agents.research_team.fetch_page", return_value=page), patch(
+        "agents.research_team.afetch_page", new=AsyncMock(return_value=page)
+    ):
+        yield tokens
+
+
+def check_stream_events(events, tokens):
+    kinds = [event["event"] for event in events]
+
+    assert kinds.index("plan") < kinds.index("source") < kinds.index("synthesis")
+    assert kinds.index("synthesis") < kinds.index("article") < kinds.index("done")
+    assert kinds.count("source") == len(MOCK_SEARCH_RESULTS)
+    assert [e["token"] for e in events if e["event"] == "article"] == tokens
+    assert events[-1]["result"]["content"] == "".join(tokens)
+
+
+def test_async_pipelined_workflow(mock_async_stack):
+    """Test the async pipelined workflow folds every source into the synthesis"""
+    initial = initialize_research("Python programming basics")
+    workflow = create_workflow(async_mode=True, pipelined=True)
+    result = asyncio.run(workflow.ainvoke(initial))
+
+    assert result["content"] == MOCK_OPENAI_RESPONSES["content"]
+    assert result["metadata"]["sources_used"] == len(MOCK_SEARCH_RESULTS)
+    mock_async_stack.invoke.assert_not_called()
+
+
+def test_stream_research_events(mock_streaming_stack):
+    """Test that streaming yields plan, sources, then synthesis/article tokens"""
+    events = list(stream_research("Python programming basics"))
+    check_stream_events(events, mock_streaming_stack)
+
+
+def test_astream_research_events(mock_streaming_stack):
+    """Test the async streaming variant yields the same events"""
+
+    async def collect():
+        return [event async for event in astream_research("Python")]
+
+    check_stream_events(asyncio.run(collect()), mock_streaming_stack)
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,111 @@
+"""Tests for search result parsing, merging and ranking"""
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from utils.search import (
+    DuckDuckGoBackend,
+    SearchBackend,
+    SerperBackend,
+    get_backends,
+    merge_results,
+    parse_queries,
+)
+
+
+def test_parse_queries_keeps_topic_first():
+    text = '1. Python history\n- "Python typing"\n\n* python history\n2) Python'
+
+    queries = parse_queries(text, "Python", limit=5)
+
+    assert queries == ["Python", "Python history", "Python typing"]
+    assert parse_queries(text, "Python", limit=2) == ["Python", "Python history"]
+
+
+def test_parse_duckduckgo_string_results():
+    text = (
+        "[snippet: Learn Python, title: Python Basics, link: https://a.com/1], "
+        "[snippet: Master it, title: Advanced Python, link: https://b.com/2]"
+    )
+
+    results = DuckDuckGoBackend._parse(text)
+
+    assert [r["link"] for r in results] == ["https://a.com/1", "https://b.com/2"]
+    assert results[0]["title"] == "Python Basics"
+
+
+def test_merge_results_canonicalizes_and_ranks():
+    first = [
+        {"link": "https://a.com/x", "title": "A"},
+        {"link": "https://B.com/y#top", "title": "B"},
+    ]
+    second = [
+        {"link": "https://b.com/y?utm_source=feed", "title": "B"},
+        {"link": "not a url", "title": "C"},
+    ]
+
+    results = merge_results([first, second], limit=5)
+
+    # b.com/y appears in both lists, so it outranks a.com/x
+    assert [r["link"] for r in results] == ["https://B.com/y#top", "https://a.com/x"]
+
+
+def test_merge_results_folds_near_duplicates():
+    snippet = "Python is a popular language for data science and web work"
+    results = merge_results(
+        [
+            [{"link": "https://a.com/post", "title": "Why Python", "snippet": snippet}],
+            [{"link": "https://b.com/p", "title": "Why Python", "snippet": snippet}],
+            [{"link": "https://c.com/other", "title": "Rust", "snippet": "Borrowing"}],
+        ],
+        limit=1,
+    )
+
+    assert [r["link"] for r in results] == ["https://a.com/post"]
+
+
+def test_backends_must_implement_search():
+    class Incomplete(SearchBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_get_backends_needs_at_least_one_backend():
+    assert [backend.name for backend in get_backends(" duckduckgo, ")] == ["duckduckgo"]
+    with pytest.raises(ValueError):
+        get_backends(",")
+    with pytest.raises(ValueError):
+        get_backends("bing")
+
+
+def test_serper_reuses_one_async_client_per_loop():
+    requests = []
+    organic = [{"link": "https://a.com", "title": "A", "snippet": "a"}]
+
+    def answer(request):
+        requests.append(request)
+        return httpx.Response(200, json={"organic": organic})
+
+    clients = []
+
+    def new_client():
+        clients.append(httpx.AsyncClient(transport=httpx.MockTransport(answer)))
+        return clients[-1]
+
+    backend = SerperBackend(num_results=3)
+
+    async def search_twice():
+        return [await backend.asearch("python") for _ in range(2)]
+
+    with patch("utils.search.new_async_client", side_effect=new_client):
+        results = asyncio.run(search_twice())
+        asyncio.run(search_twice())  # A new loop gets its own client
+
+    assert results[0] == results[1] == SerperBackend._parse({"organic": organic})
+    assert len(requests) == 4
+    assert len(clients) == 2
+    assert requests[0].headers["X-API-KEY"]
@@ -0,0 +1,98 @@
+"""Tests for token-aware chunking and map-reduce summarization"""
+from unittest.mock import MagicMock, patch
+
+from agents.content_team import SynthesizerAgent
+from agents.research_team import ScraperAgent
+from settings import settings
+from utils.text import chunk_text, count_tokens, pack_to_budget
+
+PARAGRAPH = "Agentic research systems coordinate several specialised agents. " * 5
+
+
+def make_llm():
+    llm = MagicMock(model_name="gpt-test", temperature=0.0)
+    llm.invoke.side_effect = lambda messages: MagicMock(
+        content=f"summary {llm.invoke.call_count}"
+    )
+    return llm
+
+
+def test_chunk_text_respects_token_budget():
+    text = "\n\n".join(PARAGRAPH for _ in range(20))
+    chunks = chunk_text(text, max_tokens=200)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 200 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_chunk_text_splits_oversized_paragraphs():
+    chunks = chunk_text(PARAGRAPH * 10, max_tokens=50)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+
+
+def test_pack_to_budget_shares_tokens_fairly():
+    short, long_text = "short summary", PARAGRAPH * 20
+    packed = pack_to_budget([short, long_text, long_text], max_tokens=300)
+
+    assert packed[0] == short
+    assert sum(count_tokens(text) for text in packed) <= 300
+    assert count_tokens(packed[1]) == count_tokens(packed[2])
+    assert pack_to_budget([short], max_tokens=300) == [short]
+
+
+def test_scraper_map_reduces_long_content(monkeypatch):
+    monkeypatch.setattr(settings, "scrape_chunk_tokens", 200)
+    llm = make_llm()
+    content = "\n\n".join(f"Part {i}. {PARAGRAPH}" for i in range(12))
+    chunks = chunk_text(content, 200)
+
+    with patch("agents.base.get_llm", return_value=llm):
+        summary = ScraperAgent().summarize(content, {"topic": "agents"})
+
+    # One call per chunk, then one reduce call
+    assert llm.invoke.call_count == len(chunks) + 1
+    assert summary == f"summary {len(chunks) + 1}"
+
+
+def test_scraper_final_reduce_keeps_every_group(monkeypatch):
+    """Test summaries that never shrink are trimmed, not dropped, at the end"""
+    monkeypatch.setattr(settings, "scrape_chunk_tokens", 200)
+    llm = MagicMock(model_name="gpt-test", temperature=0.0)
+    # Every summary is too long to share a prompt with another one
+    llm.invoke.side_effect = lambda messages: MagicMock(
+        content=f"summary {llm.invoke.call_count}. {PARAGRAPH * 2}"
+    )
+    content = "\n\n".join(f"Part {i}. {PARAGRAPH * 2}" for i in range(4))
+    chunks = chunk_text(content, 200)
+
+    with patch("agents.base.get_llm", return_value=llm):
+        ScraperAgent().summarize(content, {"topic": "agents"})
+
+    # Map, three reduce rounds that all still overflow, then the final reduce
+    calls = llm.invoke.call_count
+    assert calls == 4 * len(chunks) + 1
+    final = llm.invoke.call_args_list[-1][0][0][-1].content
+    for n in range(calls - len(chunks), calls):
+        assert f"summary {n}." in final
+    assert count_tokens(final) < 200 + 50
+
+
+def test_scraper_short_content_uses_single_call():
+    llm = make_llm()
+    with patch("agents.base.get_llm", return_value=llm):
+        ScraperAgent().summarize(PARAGRAPH, {"topic": "agents"})
+
+    assert llm.invoke.call_count == 1
+
+
+def test_synthesis_prompt_fits_budget(monkeypatch):
+    monkeypatch.setattr(settings, "synthesis_max_tokens", 500)
+    sources = [{"summary": PARAGRAPH * 30} for _ in range(5)]
+
+    with patch("agents.base.get_llm", return_value=make_llm()):
+        messages = SynthesizerAgent()._format_prompt("agents", sources)
+
+    assert count_tokens(messages[1].content) < 500 + 100
@@ -0,0 +1,148 @@
+"""Tests for lazy startup and the long-running worker"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from settings import settings
+from utils.jobs import get_job_queue
+from worker import Worker, run_job, submit
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fake_research(topic, run_id=None):
+    if topic == "broken":
+        return None
+    return {
+        "content": f"Article on {topic}",
+        "research_data": {"sources": [{"url": "https://a.com", "summary": "A"}]},
+        "metadata": {"sources_used": 1},
+    }
+
+
+def test_main_imports_without_keys_or_heavy_dependencies(tmp_path):
+    """Test importing main neither validates settings nor loads LangChain"""
+    env = {k: v for k, v in os.environ.items() if not k.endswith("_API_KEY")}
+    env["PYTHONPATH"] = SRC_DIR
+    code = (
+        "import sys, main, settings\n"
+        "heavy = ['langgraph', 'langchain_core', 'openai', 'agents.supervisor']\n"
+        "print(settings.settings.loaded, [m for m in heavy if m in sys.modules])\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,  # No .env here
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    assert output.strip() == "False []"
+
+
+def test_run_job_answers_with_the_job_id():
+    with patch("main.run_research", side_effect=fake_research):
+        answer = run_job(json.dumps({"id": 7, "topic": "Python"}))
+        failed = run_job(json.dumps({"id": 8, "topic": "broken"}))
+
+    assert answer["id"] == 7
+    assert answer["content"] == "Article on Python"
+    assert answer["sources"] == [{"url": "https://a.com", "summary": "A"}]
+    assert answer["error"] is None
+    assert failed["error"] == "Research failed"
+    assert run_job("not json")["error"].startswith("Invalid job")
+
+
+def test_worker_serves_json_lines():
+    worker = Worker(concurrency=2)
+    lines = [json.dumps({"id": i, "topic": f"topic {i}"}) + "\n" for i in range(3)]
+    written = []
+    with patch("main.run_research", side_effect=fake_research):
+        worker.serve_lines(lines + ["\n"], written.append)
+    worker.stop()
+
+    answers = [json.loads(line) for line in written]
+    assert sorted(answer["id"] for answer in answers) == [0, 1, 2]
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_worker_serves_a_unix_socket(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    worker = Worker(concurrency=2)
+    with patch("main.run_research", side_effect=fake_research):
+        thread = threading.Thread(target=worker.serve_socket, args=(path,))
+        thread.start()
+        while worker.server is None:
+            time.sleep(0.01)
+        answer = submit("Python", path, timeout=5)
+        with pytest.raises(RuntimeError):
+            Worker().serve_socket(path)  # The socket is taken
+        worker.stop()
+        thread.join(timeout=5)
+
+    assert answer["content"] == "Article on Python"
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("saturated", [False, True])
+def test_worker_runs_queued_jobs(monkeypatch, saturated):
+    """Test queued jobs run concurrently, one at a time while the LLM is busy"""
+    monkeypatch.setattr(settings, "job_poll_interval", 0.01)
+    jobs = get_job_queue()
+    job_ids = [jobs.submit(f"topic {i}") for i in range(4)]
+    running, peak = set(), []
+
+    def research(topic, run_id=None):
+        running.add(topic)
+        peak.append(len(running))
+        time.sleep(0.05)
+        running.discard(topic)
+        return fake_research(topic)
+
+    worker = Worker(concurrency=4)
+    with patch("main.run_research", side_effect=research), patch(
+        "worker._llm_saturated", return_value=saturated
+    ):
+        thread = threading.Thread(target=worker.serve_queue)
+        thread.start()
+        answers = [jobs.wait(job_id, timeout=5)["answer"] for job_id in job_ids]
+        worker.stop()
+        thread.join(timeout=5)
+
+    assert [answer["content"] for answer in answers] == [
+        f"Article on topic {i}" for i in range(4)
+    ]
+    assert [answer["id"] for answer in answers] == job_ids
+    assert max(peak) == (1 if saturated else 4)
+    assert jobs.counts() == {"done": 4}
+
+
+def test_queue_worker_purges_old_jobs_while_serving(monkeypatch):
+    monkeypatch.setattr(settings, "job_poll_interval", 0.01)
+    monkeypatch.setattr(settings, "job_purge_interval", 0.05)
+    jobs = get_job_queue()
+    worker = Worker(concurrency=1)
+    thread = threading.Thread(target=worker.serve_queue)
+    thread.start()
+    try:
+        with patch("main.run_research", side_effect=fake_research):
+            job_id = jobs.submit("Python")
+            assert jobs.wait(job_id, timeout=5)["status"] == "done"
+        # The answer outlives its TTL while the worker keeps serving
+        monkeypatch.setattr(settings, "job_result_ttl", 0.01)
+        deadline = time.monotonic() + 5
+        while jobs.get(job_id) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+        thread.join(timeout=5)
+
+    assert jobs.get(job_id) is None
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import tempfile
+import zlib
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, Optional
+
+from settings import settings
+
+HANDLE_PREFIX = "blob:"
+# Eviction frees room down to this share of max_bytes, not just under it
+EVICT_TO = 0.9
+
+
+class BlobStore:
+    """Content-addressed on-disk store for large texts such as page content
+
+    The workflow state keeps only the handle put() returns, so page text is
+    not copied through state updates, checkpoints or prompts. Blobs are
+    zlib-compressed files named by the sha256 of their text; storing the
+    same text twice stores it once. Once the directory grows past max_bytes,
+    the blobs least recently read or stored are evicted down to EVICT_TO of
+    it, so the next few puts do not each trigger another scan.
+    """
+
+    def __init__(
+        self, directory: Optional[str] = None, max_bytes: Optional[int] = None
+    ):
+        self.directory = directory or settings.blob_dir
+        self.max_bytes = max_bytes or settings.blob_max_bytes
+        self._lock = Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(
+            item.stat().st_size
+            for item in os.scandir(self.directory)
+            if item.name.endswith(".z")
+        )
+
+    def _path(self, handle: str) -> str:
+        digest = handle[len(HANDLE_PREFIX) :]
+        if not handle.startswith(HANDLE_PREFIX) or not digest.isalnum():
+            raise ValueError(f"Not a blob handle: {handle!r}")
+        return os.path.join(self.directory, f"{digest}.z")
+
+    def put(self, text: str) -> str:
+        """Store text and return its handle"""
+        data = text.encode("utf-8")
+        handle = HANDLE_PREFIX + hashlib.sha256(data).hexdigest()
+        path = self._path(handle)
+        if os.path.exists(path):
+            os.utime(path)  # Mark as recently used
+            return handle
+
+        # Write atomically so concurrent readers never see partial files
+        compressed = zlib.compress(data, 1)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += len(compressed)
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        """Return the text behind a handle, or None if it was evicted"""
+        path = self._path(handle)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used
+            return zlib.decompress(data).decode("utf-8")
+        except (OSError, zlib.error):
+            return None
+
+    def delete(self, handle: str) -> None:
+        try:
+            path = self._path(handle)
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            for item in os.scandir(self.directory):
+                if item.name.endswith(".z"):
+                    os.remove(item.path)
+            self._size = 0
+
+    def _evict(self) -> None:
+        """Delete least recently used blobs until under EVICT_TO of max_bytes"""
+        with self._lock:
+            entries = []
+            for item in os.scandir(self.directory):
+                if item.name.endswith(".z"):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+
+            self._size = sum(size for _, size, _ in entries)
+            target = self.max_bytes * EVICT_TO
+            for _, size, path in sorted(entries):
+                if self._size <= target:
+                    break
+                try:
+                    os.remove(path)
+                    self._size -= size
+                except OSError:
+                    pass
+
+
+@lru_cache(maxsize=None)
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store"""
+    return BlobStore()
+
+
+def source_content(source: Dict) -> Optional[str]:
+    """Full page text of a scraped source, if it is still available"""
+    if source.get("raw_content"):
+        return source["raw_content"]
+    if source.get("content_ref"):
+        return get_blob_store().get(source["content_ref"])
+    return None
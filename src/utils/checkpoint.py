@@ -0,0 +1,118 @@
+import os
+import pickle
+import sqlite3
+import time
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.utils import ConfigurableFieldSpec
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointAt
+
+from settings import settings
+
+# LangGraph channel holding the final state once a run has finished
+END_CHANNEL = "__end__"
+
+
+def compact(value: Any) -> Any:
+    """Copy of a state value without raw page text
+
+    Scraped raw_content is by far the largest part of the state and nothing
+    after the research step reads it, so checkpoints leave it out.
+    """
+    if isinstance(value, dict):
+        return {k: compact(v) for k, v in value.items() if k != "raw_content"}
+    if isinstance(value, list):
+        return [compact(v) for v in value]
+    return value
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer storing the latest checkpoint of each run in SQLite
+
+    Runs are keyed by the thread_id configurable. Checkpoints are written at
+    the end of every step, so a run that dies resumes after its last
+    completed node. The database is a trusted local file: checkpoints are
+    pickled.
+    """
+
+    path: str = ""
+    at: CheckpointAt = CheckpointAt.END_OF_STEP
+
+    class Config:
+        underscore_attrs_are_private = True
+
+    _conn: Any = None
+    _lock: Any = None
+
+    def __init__(self, path: Optional[str] = None, **kwargs):
+        super().__init__(path=path or settings.checkpoint_path, **kwargs)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_id TEXT PRIMARY KEY, checkpoint BLOB NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @property
+    def config_specs(self) -> List[ConfigurableFieldSpec]:
+        return [
+            ConfigurableFieldSpec(
+                id="thread_id",
+                annotation=str,
+                name="Run ID",
+                description="Key of the run whose checkpoint is loaded and saved",
+                default="",
+                is_shared=True,
+            ),
+        ]
+
+    def get(self, config: RunnableConfig) -> Optional[Checkpoint]:
+        return self.load(config["configurable"]["thread_id"])
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint) -> None:
+        snapshot = {
+            **checkpoint,
+            "channel_values": compact(checkpoint["channel_values"]),
+        }
+        blob = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                (config["configurable"]["thread_id"], blob, time.time()),
+            )
+            self._conn.commit()
+
+    def load(self, run_id: str) -> Optional[Checkpoint]:
+        """Latest checkpoint of a run, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT checkpoint FROM checkpoints WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def final_state(self, run_id: str) -> Optional[Dict]:
+        """The final state of a run, or None if it has not finished"""
+        checkpoint = self.load(run_id)
+        if checkpoint is None:
+            return None
+        return checkpoint["channel_values"].get(END_CHANNEL)
+
+    def delete(self, run_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            self._conn.commit()
+
+
+@lru_cache(maxsize=None)
+def get_checkpointer() -> SqliteCheckpointSaver:
+    """Return the process-wide workflow checkpointer"""
+    return SqliteCheckpointSaver()
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import openai
+import requests
+
+# Stages of a run in order, with their relative share of the time budget
+STAGES: List[str] = ["plan", "search", "scrape", "synthesize", "write"]
+STAGE_SHARES: Dict[str, float] = {
+    "plan": 0.1,
+    "search": 0.15,
+    "scrape": 0.4,
+    "synthesize": 0.15,
+    "write": 0.2,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised instead of starting work that has no time left"""
+
+
+# What a call cut short by its deadline raises, whichever client made it
+TIMEOUT_ERRORS: Tuple[type, ...] = (
+    TimeoutError,
+    asyncio.TimeoutError,
+    httpx.TimeoutException,
+    requests.Timeout,
+    openai.APITimeoutError,
+)
+
+# Stages that turn the research into the article, after every research round
+CONTENT_STAGES: List[str] = ["synthesize", "write"]
+
+# Absolute time.monotonic() deadlines: the whole run's and the tightest one
+_run: ContextVar[Optional[float]] = ContextVar("run_deadline", default=None)
+_current: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+# Seconds the whole run was given
+_budget: ContextVar[Optional[float]] = ContextVar("run_budget", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """Give the run inside the block seconds to finish (None for no limit)
+
+    Like event_sink, the deadline follows the context into graph nodes and
+    worker pools, where stage() splits it up.
+    """
+    deadline = time.monotonic() + seconds if seconds else None
+    run_token, token = _run.set(deadline), _current.set(deadline)
+    budget_token = _budget.set(seconds or None)
+    try:
+        yield deadline
+    finally:
+        _budget.reset(budget_token)
+        _current.reset(token)
+        _run.reset(run_token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Optional[float]]:
+    """Limit the block to this stage's share of the time the run has left
+
+    Shares are taken over the stages still to come, so time an earlier
+    stage did not use carries over to the later ones.
+    """
+    run_deadline = _run.get()
+    if run_deadline is None:
+        yield None
+        return
+
+    now = time.monotonic()
+    later = STAGES[STAGES.index(name) :]
+    share = STAGE_SHARES[name] / sum(STAGE_SHARES[s] for s in later)
+    deadline = now + max(run_deadline - now, 0) * share
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def run_budget() -> Optional[float]:
+    """Seconds the whole run was given, or None without a deadline"""
+    return _budget.get()
+
+
+def run_time_left() -> Optional[float]:
+    """Seconds until the whole run's deadline, whatever the stage"""
+    deadline = _run.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def current_deadline() -> Optional[float]:
+    """The deadline of the current stage or run, if any"""
+    return _current.get()
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current deadline, or None without one"""
+    deadline = _current.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def wait_timeout() -> Optional[float]:
+    """time_left() clamped at zero, for wait()-style timeout arguments"""
+    left = time_left()
+    return None if left is None else max(left, 0)
+
+
+def expired() -> bool:
+    """Whether the current deadline has passed"""
+    left = time_left()
+    return left is not None and left <= 0
+
+
+def check_deadline(what: str) -> Optional[float]:
+    """Seconds left for what, raising DeadlineExceeded if there are none"""
+    left = time_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"No time left for {what}")
+    return left
+
+
+def mark_degraded(state: Dict, stage_name: str) -> None:
+    """Record in the state's metadata that a stage was cut short"""
+    metadata = dict(state.get("metadata") or {})
+    metadata["degraded"] = metadata.get("degraded", []) + [stage_name]
+    state["metadata"] = metadata
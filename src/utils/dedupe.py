@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, TypeVar
+
+from settings import settings
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Collapse repeated and concurrent calls with the same key into one
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for its result, and later callers get the memoized result.
+    Only the max_results most recently used results are kept, so a long
+    batch does not hold on to every page it fetched. Failures are not
+    memoized, so waiters retry on their own.
+    """
+
+    def __init__(self, max_results: Optional[int] = None):
+        self.max_results = max_results or settings.batch_shared_results
+        self._lock = Lock()
+        self._results: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._inflight: Dict[Hashable, Event] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    return self._results[key]
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = Event()
+                    break
+            event.wait()
+
+        try:
+            result = fn()
+            with self._lock:
+                self._results[key] = result
+                if len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+
+_scope: ContextVar[Optional[Dict[str, SingleFlight]]] = ContextVar(
+    "dedupe_scope", default=None
+)
+
+
+@contextmanager
+def dedupe_scope(shared: Optional[Dict[str, SingleFlight]] = None) -> Iterator[Dict]:
+    """Share deduplicated work between every call made inside the block
+
+    Pass the same dict to several threads (e.g. one per topic of a batch) to
+    let them share results.
+    """
+    shared = {} if shared is None else shared
+    token = _scope.set(shared)
+    try:
+        yield shared
+    finally:
+        _scope.reset(token)
+
+
+_namespace_lock = Lock()
+
+
+def deduplicated(namespace: str, key: Hashable, fn: Callable[[], T]) -> T:
+    """Run fn once per key within the active dedupe scope, if any"""
+    shared = _scope.get()
+    if shared is None:
+        return fn()
+    with _namespace_lock:
+        flight = shared.setdefault(namespace, SingleFlight())
+    return flight.do(key, fn)
@@ -0,0 +1,33 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+_sink: ContextVar[Optional[EventCallback]] = ContextVar("event_sink", default=None)
+
+
+@contextmanager
+def event_sink(callback: EventCallback) -> Iterator[None]:
+    """Send progress events emitted inside the block to callback
+
+    The sink follows the context, so it reaches graph nodes and worker
+    pools that copy the context (LangGraph's executor, scrape workers).
+    """
+    token = _sink.set(callback)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def is_streaming() -> bool:
+    """Whether anyone is listening for events in the current context"""
+    return _sink.get() is not None
+
+
+def emit(event: str, **data: Any) -> None:
+    """Emit a progress event, e.g. emit("source", url=url)"""
+    callback = _sink.get()
+    if callback is not None:
+        callback({"event": event, **data})
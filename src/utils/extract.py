@@ -0,0 +1,191 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+from settings import settings
+
+# fmt: off
+# Elements whose whole subtree is boilerplate or not text
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "footer", "header", "aside", "form", "button", "select",
+}
+
+# Elements that start a new block of text
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt",
+    "dd", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "table",
+    "tr", "td", "th", "figcaption", "br", "hr",
+}
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# Elements that never have a closing tag
+VOID_TAGS = {
+    "br", "hr", "img", "input", "meta", "link", "area", "base", "col",
+    "embed", "source", "track", "wbr", "param",
+}
+# fmt: on
+
+# class/id/role tokens that mark page chrome: a chrome word, optionally with
+# a layout prefix or suffix ("site-footer", "share-buttons"), but not words
+# that merely mention one ("no-sidebar", "has-comments", "ads-free")
+BOILERPLATE_HINT = re.compile(
+    r"((site|page|main|top|bottom|primary|global)[-_])?"
+    r"(nav|navbar|menu|footer|sidebar|breadcrumbs?|cookie|banner|share|"
+    r"social|comments?|related|advert|ads|promo|subscribe|newsletter)"
+    r"([-_](area|bar|block|box|buttons?|container|links?|list|section|widget|"
+    r"wrapper))?",
+    re.IGNORECASE,
+)
+
+# Elements that hold the page content, whatever their class says
+CONTENT_TAGS = {"html", "body", "main", "article"}
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def _is_chrome(attrs: List[Tuple[str, Optional[str]]]) -> bool:
+    """Whether an element's class, id or role marks it as page chrome"""
+    return any(
+        BOILERPLATE_HINT.fullmatch(token)
+        for name, value in attrs
+        if name in ("class", "id", "role") and value
+        for token in value.split()
+    )
+
+
+class TextExtractor(HTMLParser):
+    """Incremental HTML-to-text extractor
+
+    Feed it HTML as it arrives; it drops boilerplate subtrees, keeps text
+    blocks that are not mostly links, and sets done once max_chars of text
+    have been collected (or the main content element has closed), so callers
+    can stop downloading and parsing.
+    """
+
+    def __init__(self, max_chars: Optional[int] = None, min_block_chars: int = 20):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars or settings.extract_max_chars
+        self.min_block_chars = min_block_chars
+        self.done = False
+        self.fed = False
+        self.blocks: List[str] = []
+        self._chars = 0
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._main_tag: Optional[str] = None
+        self._main_depth = 0
+        self._main_seen = False
+        self._heading = False
+        self._link_depth = 0
+        self._parts: List[str] = []
+        self._link_chars = 0
+        self._decoder = None
+
+    def feed_bytes(self, chunk: bytes, encoding: Optional[str] = None) -> bool:
+        """Feed raw bytes from a response stream; returns True when done"""
+        if self._decoder is None:
+            try:
+                decoder_cls = codecs.getincrementaldecoder(encoding or "utf-8")
+            except LookupError:
+                decoder_cls = codecs.getincrementaldecoder("utf-8")
+            self._decoder = decoder_cls(errors="replace")
+        self.feed(self._decoder.decode(chunk))
+        return self.done
+
+    def feed(self, data: str) -> None:
+        self.fed = True
+        if not self.done:
+            super().feed(data)
+
+    def get_text(self) -> str:
+        self.close()  # Process anything still buffered
+        self._flush()
+        return "\n".join(self.blocks)[: self.max_chars]
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+
+        # Headers inside the main content carry its title
+        skip = tag in SKIP_TAGS and not (tag == "header" and self._main_depth)
+        if skip or (tag not in CONTENT_TAGS and _is_chrome(attrs)):
+            if tag not in VOID_TAGS:
+                self._skip_tag, self._skip_depth = tag, 1
+            return
+
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in HEADING_TAGS:
+            self._heading = True
+        elif tag == "a":
+            self._link_depth += 1
+
+        if tag in ("main", "article"):
+            if self._main_tag is None and not self._main_seen:
+                # Whatever came before the main content is page chrome
+                self.blocks.clear()
+                self._chars = 0
+                self._main_tag, self._main_seen = tag, True
+            if tag == self._main_tag:
+                self._main_depth += 1
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in HEADING_TAGS:
+            self._heading = False
+        elif tag == "a" and self._link_depth:
+            self._link_depth -= 1
+
+        if tag == self._main_tag:
+            self._main_depth -= 1
+            if self._main_depth == 0:
+                # Main content is over, the rest is footer material
+                self._flush()
+                self.done = True
+
+    def handle_data(self, data):
+        if self.done or self._skip_tag is not None:
+            return
+        self._parts.append(data)
+        if self._link_depth:
+            self._link_chars += len(data.strip())
+
+    def _flush(self) -> None:
+        text = WHITESPACE.sub(" ", "".join(self._parts)).strip()
+        link_chars, self._parts, self._link_chars = self._link_chars, [], 0
+        if not text:
+            return
+
+        # Drop short fragments and link lists, keep headings
+        if not self._heading:
+            if len(text) < self.min_block_chars or link_chars > 0.5 * len(text):
+                return
+
+        self.blocks.append(text)
+        self._chars += len(text) + 1
+        if self._chars >= self.max_chars:
+            self.done = True
+
+
+def extract_text(html: str, max_chars: Optional[int] = None) -> str:
+    """Extract the main text of an HTML document"""
+    extractor = TextExtractor(max_chars)
+    extractor.feed(html)
+    return extractor.get_text()
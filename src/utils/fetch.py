@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import random
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings import settings
+from utils.deadline import check_deadline, expired, time_left
+from utils.metrics import count, span
+
+logger = logging.getLogger(__name__)
+
+REQUEST_HEADERS = {"User-Agent": "Research Bot 1.0"}
+
+# Content types we know how to turn into text
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# Extensions that are never worth a request
+# fmt: off
+BINARY_EXTENSIONS = (
+    ".pdf", ".zip", ".gz", ".tar", ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".svg", ".mp3", ".mp4", ".avi", ".mov", ".doc", ".docx", ".xls", ".xlsx",
+    ".ppt", ".pptx", ".exe", ".dmg",
+)
+# fmt: on
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Receives each body chunk and its encoding, returns True to stop downloading
+ChunkConsumer = Callable[[bytes, Optional[str]], bool]
+
+
+class FetchError(Exception):
+    """Raised when a page cannot be fetched"""
+
+
+class SkippedContent(FetchError):
+    """Raised when a page is not text and was skipped before download"""
+
+
+class RetryableStatus(FetchError):
+    """Raised on HTTP statuses worth retrying (429 and 5xx)"""
+
+
+class TemporaryFetchError(FetchError):
+    """Raised when retries run out on a failure likely to go away"""
+
+
+def _check_url(url: str) -> None:
+    path = urlparse(url).path.lower()
+    if path.endswith(BINARY_EXTENSIONS):
+        raise SkippedContent(f"Skipping binary resource: {url}")
+
+
+def _check_content_type(url: str, content_type: Optional[str]) -> None:
+    # Servers that send no content type usually serve HTML
+    if content_type and not content_type.lower().startswith(TEXT_CONTENT_TYPES):
+        raise SkippedContent(f"Skipping {content_type} content: {url}")
+
+
+def _check_status(url: str, status_code: int) -> None:
+    if status_code in RETRY_STATUS_CODES:
+        raise RetryableStatus(f"HTTP {status_code} for {url}")
+    if status_code >= 400:
+        raise FetchError(f"HTTP {status_code} for {url}")
+
+
+def _check_resumable(
+    url: str, on_chunk: Optional[ChunkConsumer], size: int, error: Exception
+) -> None:
+    """Refuse to retry a download whose consumer already saw part of the body
+
+    A retry streams the body again from its first byte, which a consumer
+    such as a streaming extractor cannot take twice.
+    """
+    if on_chunk and size:
+        raise TemporaryFetchError(f"Lost {url} after {size} bytes: {error}") from error
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, settings.fetch_retry_backoff * 2**attempt)
+
+
+def _past_deadline(delay: float) -> bool:
+    """Whether waiting delay seconds would leave no time for another try"""
+    left = time_left()
+    return left is not None and left <= delay
+
+
+def _page(
+    response, body: Optional[bytes], truncated: bool, encoding: Optional[str]
+) -> Dict:
+    page = {
+        "url": str(response.url),
+        "status": response.status_code,
+        "headers": dict(response.headers),
+        "truncated": truncated,
+    }
+    if body is not None:
+        page["content"] = body.decode(encoding or "utf-8", errors="replace")
+    return page
+
+
+@lru_cache(maxsize=None)
+def get_session() -> requests.Session:
+    """Return the process-wide pooled HTTP session
+
+    Connections are kept alive and reused; each host gets at most
+    settings.fetch_pool_size connections, extra requests wait for a free one.
+    """
+    session = requests.Session()
+    session.headers.update(REQUEST_HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=settings.fetch_pool_size,
+        pool_maxsize=settings.fetch_pool_size,
+        pool_block=True,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def new_async_client() -> httpx.AsyncClient:
+    """Create a pooled async client with the same limits as get_session
+
+    Async clients are bound to an event loop, so callers own their lifetime.
+    """
+    return httpx.AsyncClient(
+        headers=REQUEST_HEADERS,
+        follow_redirects=True,
+        timeout=httpx.Timeout(
+            settings.fetch_read_timeout, connect=settings.fetch_connect_timeout
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.fetch_pool_size * 10,
+            max_keepalive_connections=settings.fetch_pool_size,
+        ),
+    )
+
+
+def _timeouts() -> Tuple[float, float]:
+    """Connect and read timeouts, shortened to fit the current deadline"""
+    left = check_deadline("page fetch")
+    connect, read = settings.fetch_connect_timeout, settings.fetch_read_timeout
+    if left is None:
+        return connect, read
+    return min(connect, left), min(read, left)
+
+
+def _fetch_once(
+    url: str,
+    session: requests.Session,
+    headers: Optional[Dict[str, str]],
+    on_chunk: Optional[ChunkConsumer],
+    keep_body: bool,
+) -> Dict:
+    with session.get(
+        url, headers=headers, timeout=_timeouts(), stream=True
+    ) as response:
+        _check_status(url, response.status_code)
+        if response.status_code == 304:
+            return _page(response, b"", False, None)
+        _check_content_type(url, response.headers.get("Content-Type"))
+
+        # Stream the body and stop at the byte budget
+        chunks, size, truncated = [], 0, False
+        try:
+            for chunk in response.iter_content(chunk_size=16384):
+                if keep_body:
+                    chunks.append(chunk)
+                size += len(chunk)
+                if on_chunk and on_chunk(chunk, response.encoding):
+                    truncated = True  # Consumer has all it needs
+                    break
+                if size >= settings.fetch_max_bytes or expired():
+                    truncated = True  # Keep what arrived before the deadline
+                    break
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _check_resumable(url, on_chunk, size, e)
+            raise
+
+        count(bytes=size)
+        body = b"".join(chunks)[: settings.fetch_max_bytes] if keep_body else None
+        return _page(response, body, truncated, response.encoding)
+
+
+def fetch_page(
+    url: str,
+    session: Optional[requests.Session] = None,
+    headers: Optional[Dict[str, str]] = None,
+    on_chunk: Optional[ChunkConsumer] = None,
+    keep_body: bool = True,
+) -> Dict:
+    """Fetch a text page with timeouts, a size cap and retries
+
+    Returns a dict with the final url, status, headers, decoded content and
+    whether the body was truncated. Extra headers can make the request
+    conditional, in which case a 304 comes back with empty content.
+    on_chunk sees the body as it streams in and can end the download early;
+    with keep_body=False it is the only one to see it, and the page has no
+    content.
+    Raises SkippedContent for binary resources, TemporaryFetchError once
+    retries on 429, 5xx and network errors are exhausted or the connection
+    drops after on_chunk saw part of the body, and FetchError for other
+    failures.
+    """
+    _check_url(url)
+    session = session or get_session()
+
+    with span("fetch", "page", url=url):
+        for attempt in range(settings.max_scrape_retries + 1):
+            try:
+                return _fetch_once(url, session, headers, on_chunk, keep_body)
+            except (RetryableStatus, requests.ConnectionError, requests.Timeout) as e:
+                delay = _backoff(attempt)
+                if attempt == settings.max_scrape_retries or _past_deadline(delay):
+                    raise TemporaryFetchError(f"Giving up on {url}: {e}") from e
+                logger.debug(f"Retrying {url} in {delay:.2f}s: {e}")
+                count(retries=1)
+                time.sleep(delay)
+
+
+async def _afetch_once(
+    url: str,
+    client: httpx.AsyncClient,
+    headers: Optional[Dict[str, str]],
+    on_chunk: Optional[ChunkConsumer],
+    keep_body: bool,
+) -> Dict:
+    connect, read = _timeouts()
+    timeout = httpx.Timeout(read, connect=connect)
+    async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+        _check_status(url, response.status_code)
+        if response.status_code == 304:
+            return _page(response, b"", False, None)
+        _check_content_type(url, response.headers.get("Content-Type"))
+
+        chunks, size, truncated = [], 0, False
+        try:
+            async for chunk in response.aiter_bytes():
+                if keep_body:
+                    chunks.append(chunk)
+                size += len(chunk)
+                if on_chunk and on_chunk(chunk, response.charset_encoding):
+                    truncated = True
+                    break
+                if size >= settings.fetch_max_bytes or expired():
+                    truncated = True
+                    break
+        except httpx.TransportError as e:
+            _check_resumable(url, on_chunk, size, e)
+            raise
+
+        count(bytes=size)
+        body = b"".join(chunks)[: settings.fetch_max_bytes] if keep_body else None
+        return _page(response, body, truncated, response.charset_encoding)
+
+
+async def afetch_page(
+    url: str,
+    client: Optional[httpx.AsyncClient] = None,
+    headers: Optional[Dict[str, str]] = None,
+    on_chunk: Optional[ChunkConsumer] = None,
+    keep_body: bool = True,
+) -> Dict:
+    """Async variant of fetch_page"""
+    _check_url(url)
+    if client is None:
+        async with new_async_client() as client:
+            return await afetch_page(url, client, headers, on_chunk, keep_body)
+
+    with span("fetch", "page", url=url):
+        for attempt in range(settings.max_scrape_retries + 1):
+            try:
+                return await _afetch_once(url, client, headers, on_chunk, keep_body)
+            except (RetryableStatus, httpx.TransportError) as e:
+                delay = _backoff(attempt)
+                if attempt == settings.max_scrape_retries or _past_deadline(delay):
+                    raise TemporaryFetchError(f"Giving up on {url}: {e}") from e
+                count(retries=1)
+                await asyncio.sleep(delay)
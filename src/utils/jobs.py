@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, Iterable, Iterator, Optional
+
+from settings import settings
+from utils.ratelimit import PRIORITY_NORMAL
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while too many are already pending"""
+
+
+def job_key(topic: str, run_id: Optional[str] = None, refresh: bool = False) -> str:
+    """What makes two jobs the same research: topic up to case and spacing"""
+    return json.dumps([" ".join(topic.casefold().split()), run_id, refresh])
+
+
+class JobQueue:
+    """Research jobs in a SQLite file shared by every worker process
+
+    Jobs are claimed by priority (lower first), then in submission order.
+    A claimed job holds a lease that its worker renews while it runs; if
+    the worker dies, the lease runs out and another worker claims the job
+    again, up to job_max_attempts times. Submitting a topic that is already
+    queued or running returns the existing job instead of a second one.
+    Finished jobs keep their answer until purged.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.job_queue_path
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = Lock()
+        # Transactions are explicit, so claims can lock the database up front
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, key TEXT NOT NULL, topic TEXT NOT NULL, "
+            "run_id TEXT, refresh INTEGER NOT NULL, priority INTEGER NOT NULL, "
+            "status TEXT NOT NULL, worker TEXT, attempts INTEGER NOT NULL, "
+            "lease_until REAL, answer TEXT, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_pending "
+            "ON jobs (status, priority, created_at)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def submit(
+        self,
+        topic: str,
+        priority: int = PRIORITY_NORMAL,
+        run_id: Optional[str] = None,
+        refresh: bool = False,
+    ) -> str:
+        """Queue a research job and return its ID
+
+        Raises QueueFull when job_queue_max_pending jobs are already queued.
+        """
+        key = job_key(topic, run_id, refresh)
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?)",
+                (key, QUEUED, RUNNING),
+            ).fetchone()
+            if row is not None:
+                return row["id"]
+
+            limit = settings.job_queue_max_pending
+            if limit:
+                (pending,) = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)
+                ).fetchone()
+                if pending >= limit:
+                    raise QueueFull(f"{pending} jobs are already waiting")
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, key, topic, run_id, refresh, priority, "
+                "status, attempts, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                (
+                    job_id,
+                    key,
+                    topic,
+                    run_id,
+                    int(refresh),
+                    priority,
+                    QUEUED,
+                    time.time(),
+                ),
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Take the next job for worker, or None if there is nothing to run
+
+        Jobs whose worker stopped renewing its lease are taken first, or
+        failed once they have been tried job_max_attempts times.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = (
+                    conn.execute(
+                        "SELECT * FROM jobs WHERE status = ? AND lease_until < ? "
+                        "ORDER BY priority, created_at LIMIT 1",
+                        (RUNNING, now),
+                    ).fetchone()
+                    or conn.execute(
+                        "SELECT * FROM jobs WHERE status = ? "
+                        "ORDER BY priority, created_at LIMIT 1",
+                        (QUEUED,),
+                    ).fetchone()
+                )
+                if row is None:
+                    return None
+                if row["attempts"] < settings.job_max_attempts:
+                    break
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                    "WHERE id = ?",
+                    (
+                        FAILED,
+                        f"Gave up after {row['attempts']} attempts",
+                        now,
+                        row["id"],
+                    ),
+                )
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                "lease_until = ?, started_at = ? WHERE id = ?",
+                (RUNNING, worker, now + settings.job_lease, now, row["id"]),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+            ).fetchone()
+        return self._job(row)
+
+    def renew(self, job_ids: Iterable[str], worker: str) -> None:
+        """Extend the leases worker holds on the jobs it is running"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        marks = ", ".join("?" * len(job_ids))
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE status = ? AND worker = ? "
+                f"AND id IN ({marks})",
+                (time.time() + settings.job_lease, RUNNING, worker, *job_ids),
+            )
+
+    def finish(self, job_id: str, worker: str, answer: Dict) -> bool:
+        """Store the answer of a job; it failed if the answer has an error
+
+        Only the worker currently running the job can finish it. Returns
+        False, dropping the answer, if the job was claimed again after the
+        worker's lease ran out or was already finished.
+        """
+        status = FAILED if answer.get("error") else DONE
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, answer = ?, error = ?, "
+                "lease_until = NULL, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (
+                    status,
+                    json.dumps(answer, default=str),
+                    answer.get("error"),
+                    time.time(),
+                    job_id,
+                    worker,
+                    RUNNING,
+                ),
+            ).rowcount
+        return updated > 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """A job with its status and, once finished, its answer"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job(row) if row is not None else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Poll a job until it finishes or timeout passes, and return it"""
+        stop = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            if stop is not None and time.monotonic() >= stop:
+                return job
+            time.sleep(settings.job_poll_interval)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self, max_age: Optional[float] = None) -> int:
+        """Drop jobs that finished more than max_age seconds ago
+
+        max_age defaults to job_result_ttl (0 keeps every job).
+        """
+        max_age = settings.job_result_ttl if max_age is None else max_age
+        if not max_age:
+            return 0
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, time.time() - max_age),
+            ).rowcount
+        return deleted
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict:
+        job = {key: row[key] for key in row.keys() if key not in ("key", "answer")}
+        job["refresh"] = bool(job["refresh"])
+        job["answer"] = json.loads(row["answer"]) if row["answer"] else None
+        return job
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue:
+    """Return the process-wide handle on the job queue"""
+    return JobQueue()
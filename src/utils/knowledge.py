@@ -0,0 +1,273 @@
+import os
+import re
+import sqlite3
+import time
+import zlib
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from settings import settings
+from utils.blobs import source_content
+from utils.text import chunk_text
+
+EMBEDDING_DIM = 1024
+
+# Rows of the vector matrix scored per matrix product, bounding peak memory
+SEARCH_BLOCK_ROWS = 65536
+
+WORD = re.compile(r"\w+")
+
+# fmt: off
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to",
+    "was", "were", "will", "with",
+}
+# fmt: on
+
+
+def embed(texts: List[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Embed texts locally by hashing their words and word pairs
+
+    Each term lands in a signed bucket of a dim-sized vector, weighted by
+    1 + log(count), and rows are L2-normalized so dot products are cosines.
+    No model or network access is needed.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [w for w in WORD.findall(text.lower()) if w not in STOP_WORDS]
+        terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not terms:
+            continue
+        hashes = np.fromiter(
+            (zlib.crc32(term.encode("utf-8")) for term in terms),
+            dtype=np.uint32,
+            count=len(terms),
+        )
+        buckets = (hashes % dim).astype(np.intp)
+        signs = np.where(hashes & (1 << 31), -1.0, 1.0)
+
+        # Sublinear term frequency, so repeated words do not dominate
+        counts = np.zeros(dim, dtype=np.float32)
+        np.add.at(counts, buckets, signs)
+        vectors[row] = np.sign(counts) * np.log1p(np.abs(counts))
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class KnowledgeIndex:
+    """Persistent embedding index of previously scraped sources
+
+    Source summaries and the chunks of their page text live in SQLite; the
+    chunk embeddings are appended to a float32 matrix on disk that is
+    memory-mapped for search. Re-adding a URL supersedes its old chunks.
+    Writers hold the SQLite write lock while they touch the matrix, so
+    several processes can share one index directory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, dim: int = EMBEDDING_DIM):
+        self.directory = directory or settings.knowledge_dir
+        self.dim = dim
+        self._lock = Lock()
+        self._matrix: Optional[np.ndarray] = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._conn = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite3"),
+            check_same_thread=False,
+            timeout=30,  # Wait for writers in other processes
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "url TEXT PRIMARY KEY, topic TEXT, summary TEXT NOT NULL, "
+            "generation INTEGER NOT NULL, indexed_at REAL NOT NULL)"
+        )
+        # Chunk ids are 1-based row numbers in the vector matrix
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY, url TEXT NOT NULL, "
+            "generation INTEGER NOT NULL, text TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load_matrix())
+
+    def add(self, topic: str, sources: List[Dict]) -> int:
+        """Index scraped sources, returning the number of chunks added"""
+        entries = []
+        for source in sources:
+            text = source_content(source) or source.get("summary", "")
+            chunks = chunk_text(text, settings.scrape_chunk_tokens)
+            if chunks and "summary" in source:
+                entries.append((source, chunks, embed(chunks, self.dim)))
+
+        with self._lock:
+            # Take the write lock before looking at the matrix: another
+            # process's rows past MAX(id) are not leftovers until it commits
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                added = self._append(topic, entries)
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+            self._matrix = None  # Remap to pick up the new rows
+        return added
+
+    def _append(self, topic: str, entries: List) -> int:
+        """Write chunks and their vectors, inside the write transaction"""
+        # Drop matrix rows left over from a write that never committed
+        (last_id,) = self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM chunks"
+        ).fetchone()
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(last_id * self.dim * 4)
+
+        added = 0
+        for source, chunks, vectors in entries:
+            row = self._conn.execute(
+                "SELECT generation FROM sources WHERE url = ?", (source["url"],)
+            ).fetchone()
+            generation = row[0] + 1 if row else 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                (source["url"], topic, source["summary"], generation, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO chunks (url, generation, text) VALUES (?, ?, ?)",
+                [(source["url"], generation, chunk) for chunk in chunks],
+            )
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            added += len(chunks)
+        return added
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        """Return the k chunks most similar to query"""
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
+        """Return the k most similar live chunks for each query
+
+        All queries are scored against the matrix together, one block of
+        rows at a time.
+        """
+        with self._lock:
+            matrix = self._load_matrix()
+            if not len(matrix) or not queries:
+                return [[] for _ in queries]
+
+            # Over-fetch, since some hits may be superseded chunks
+            fetch = min(k * 4, len(matrix))
+            vectors = embed(queries, self.dim)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+            for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+                block = np.asarray(matrix[start : start + SEARCH_BLOCK_ROWS])
+                scores = np.concatenate([best_scores, vectors @ block.T], axis=1)
+                rows = np.concatenate(
+                    [
+                        best_rows,
+                        np.broadcast_to(
+                            np.arange(start, start + len(block)),
+                            (len(queries), len(block)),
+                        ),
+                    ],
+                    axis=1,
+                )
+                top = np.argpartition(-scores, min(fetch, scores.shape[1]) - 1)
+                top = top[:, :fetch]
+                best_scores = np.take_along_axis(scores, top, axis=1)
+                best_rows = np.take_along_axis(rows, top, axis=1)
+
+            return [
+                self._chunks(rows, scores, k)
+                for rows, scores in zip(best_rows, best_scores)
+            ]
+
+    def retrieve(
+        self, query: str, k: int = 5, min_score: Optional[float] = None
+    ) -> List[Dict]:
+        """Return up to k indexed sources relevant to query, best first
+
+        Sources come back in the shape ScraperAgent produces, with the score
+        of their best chunk and retrieved set.
+        """
+        min_score = settings.knowledge_min_score if min_score is None else min_score
+        best: Dict[str, float] = {}
+        for hit in self.search(query, k * 4):
+            if hit["score"] >= min_score and hit["url"] not in best:
+                best[hit["url"]] = hit["score"]
+
+        sources = []
+        with self._lock:
+            for url in list(best)[:k]:
+                (summary,) = self._conn.execute(
+                    "SELECT summary FROM sources WHERE url = ?", (url,)
+                ).fetchone()
+                sources.append(
+                    {
+                        "url": url,
+                        "summary": summary,
+                        "score": best[url],
+                        "retrieved": True,
+                    }
+                )
+        return sources
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sources")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+            self._matrix = None
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+
+    def _load_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            (rows,) = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+            size = os.path.getsize(self._vectors_path) if rows else 0
+            # A write interrupted between SQLite and the matrix leaves extra rows
+            rows = min(rows, size // (self.dim * 4))
+            if rows:
+                self._matrix = np.memmap(
+                    self._vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(rows, self.dim),
+                )
+            else:
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        return self._matrix
+
+    def _chunks(self, rows: np.ndarray, scores: np.ndarray, k: int) -> List[Dict]:
+        hits = []
+        for index in np.argsort(-scores):
+            row = self._conn.execute(
+                "SELECT chunks.url, chunks.text FROM chunks JOIN sources "
+                "ON sources.url = chunks.url "
+                "AND sources.generation = chunks.generation WHERE chunks.id = ?",
+                (int(rows[index]) + 1,),
+            ).fetchone()
+            if row:
+                hits.append(
+                    {"url": row[0], "text": row[1], "score": float(scores[index])}
+                )
+            if len(hits) == k:
+                break
+        return hits
+
+
+@lru_cache(maxsize=None)
+def get_knowledge_index() -> KnowledgeIndex:
+    """Return the process-wide knowledge index"""
+    return KnowledgeIndex()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from settings import settings
+
+
+def cache_key(model: str, temperature: float, messages: List[BaseMessage]) -> str:
+    """Hash of everything that determines an LLM response"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "messages": [(message.type, message.content) for message in messages],
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed store of LLM responses keyed by cache_key
+
+    Keeps at most max_entries rows, evicting the least recently used ones.
+    Hit and miss counts are tracked per agent name.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or settings.llm_cache_path
+        self.max_entries = max_entries or settings.llm_cache_max_entries
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0}
+        )
+        self._lock = Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, agent: str = "default") -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats[agent]["misses"] += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.stats[agent]["hits"] += 1
+            return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.stats.clear()
+
+    def totals(self) -> Dict[str, int]:
+        """Hit and miss counts summed over all agents"""
+        return {
+            "hits": sum(s["hits"] for s in self.stats.values()),
+            "misses": sum(s["misses"] for s in self.stats.values()),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_llm_cache() -> LLMCache:
+    """Return the process-wide LLM response cache"""
+    return LLMCache()
+
+
+def is_cache_enabled(agent: str) -> bool:
+    """Whether responses for an agent name should go through the cache"""
+    if not settings.llm_cache_enabled:
+        return False
+    enabled = {name.strip() for name in settings.llm_cache_agents.split(",")}
+    return agent in enabled
@@ -0,0 +1,293 @@
+import asyncio
+import functools
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from settings import settings
+
+# Counters kept for every (kind, name) pair, with their Prometheus help text
+FIELDS: Dict[str, str] = {
+    "calls": "Completed calls",
+    "seconds": "Wall time spent in calls",
+    "errors": "Calls that failed",
+    "tokens_in": "Prompt tokens sent to the LLM",
+    "tokens_out": "Completion tokens received from the LLM",
+    "cost_usd": "Estimated LLM spend in US dollars",
+    "bytes": "Page bytes downloaded",
+    "retries": "Requests retried",
+    "cache_hits": "Calls served from a cache",
+}
+
+# USD per million prompt and completion tokens, for cost estimates
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4-turbo-preview": (10.0, 30.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (5.0, 15.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+
+def estimate_cost(model: str, tokens_in: int, tokens_out: int) -> float:
+    """Dollar cost of a call, 0.0 for models without a known price"""
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+
+
+class Span:
+    """One timed operation: a graph node, an agent call, an LLM request..."""
+
+    def __init__(self, kind: str, name: str, parent: Optional["Span"], **attributes):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.attributes = attributes
+        self.counts: Dict[str, float] = defaultdict(float)
+        self.span_id = os.urandom(8).hex()
+        self.error: Optional[str] = None
+
+    def chain(self) -> Iterator["Span"]:
+        """This span and its ancestors, innermost first"""
+        span: Optional[Span] = self
+        while span is not None:
+            yield span
+            span = span.parent
+
+
+class RunMetrics:
+    """Counters of one research run, or of every run in the process
+
+    Counters are summed per (kind, name): kind is "node", "agent", "llm",
+    "search" or "fetch" and name the node, agent or backend. A count added
+    inside nested spans is credited to each of them, so a scraped page's
+    bytes show up under its fetch, the scraper agent and the research node.
+    """
+
+    def __init__(self, record_spans: bool = False):
+        self.record_spans = record_spans
+        self.trace_id = os.urandom(16).hex()
+        self.runs = 0
+        self.stats: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(
+            lambda: dict.fromkeys(FIELDS, 0)
+        )
+        self.spans: List[Dict] = []
+        self._lock = Lock()
+
+    def count(self, span: Span, values: Dict[str, float]) -> None:
+        with self._lock:
+            for open_span in span.chain():
+                for field, value in values.items():
+                    open_span.counts[field] += value
+
+    def finish(self, span: Span, start_ns: int, seconds: float) -> None:
+        with self._lock:
+            stats = self.stats[(span.kind, span.name)]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["errors"] += span.error is not None
+            for field, value in span.counts.items():
+                stats[field] += value
+
+            if self.record_spans:
+                self.spans.append(
+                    {
+                        "trace_id": self.trace_id,
+                        "span_id": span.span_id,
+                        "parent_span_id": span.parent.span_id if span.parent else None,
+                        "name": f"{span.kind}.{span.name}",
+                        "start_time_unix_nano": start_ns,
+                        "end_time_unix_nano": start_ns + int(seconds * 1e9),
+                        "attributes": {**span.attributes, **span.counts},
+                        "status": _status(span.error),
+                    }
+                )
+
+    def merge(self, other: "RunMetrics") -> None:
+        """Add the counters of a finished run to this one"""
+        with other._lock:
+            items = [(key, dict(stats)) for key, stats in other.stats.items()]
+            runs = other.runs or 1
+        with self._lock:
+            self.runs += runs
+            for key, stats in items:
+                for field, value in stats.items():
+                    self.stats[key][field] += value
+
+    def to_dict(self) -> Dict:
+        """Counters as {kind: {name: {field: value}}}, plus spans if recorded"""
+        with self._lock:
+            result: Dict[str, Any] = {}
+            for (kind, name), stats in sorted(self.stats.items()):
+                result.setdefault(kind, {})[name] = dict(stats)
+            if self.record_spans:
+                result["spans"] = list(self.spans)
+        return result
+
+    def to_prometheus(self, prefix: str = "research") -> str:
+        """Counters in the Prometheus text exposition format"""
+        with self._lock:
+            items = sorted(self.stats.items())
+            lines = [
+                f"# HELP {prefix}_runs_total Research runs finished",
+                f"# TYPE {prefix}_runs_total counter",
+                f"{prefix}_runs_total {self.runs}",
+            ]
+        for field, help_text in FIELDS.items():
+            metric = f"{prefix}_{field}_total"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for (kind, name), stats in items:
+                labels = f'kind="{kind}",name="{_escape(name)}"'
+                lines.append(f"{metric}{{{labels}}} {stats[field]:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _status(error: Optional[str]) -> Dict[str, str]:
+    return {"code": "ERROR", "message": error} if error else {"code": "OK"}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics: ContextVar[Optional[RunMetrics]] = ContextVar("metrics", default=None)
+_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+@lru_cache(maxsize=None)
+def get_metrics() -> RunMetrics:
+    """Return the process-wide totals every finished run is added to"""
+    return RunMetrics()
+
+
+@contextmanager
+def metrics_scope(
+    record_spans: Optional[bool] = None,
+) -> Iterator[Optional[RunMetrics]]:
+    """Collect the metrics of the run inside the block
+
+    Yields None when settings.metrics_enabled is off. Like event_sink, the
+    collector follows the context into graph nodes and worker pools. On
+    exit the run's counters are added to get_metrics().
+    """
+    if not settings.metrics_enabled:
+        yield None
+        return
+
+    if record_spans is None:
+        record_spans = settings.metrics_spans
+    metrics = RunMetrics(record_spans)
+    token, span_token = _metrics.set(metrics), _span.set(None)
+    try:
+        yield metrics
+    finally:
+        _span.reset(span_token)
+        _metrics.reset(token)
+        get_metrics().merge(metrics)
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[None]:
+    """Time the block as a call of name and credit counts added inside it
+
+    Exceptions leaving the block count as errors. A span nested in one of
+    the same kind and name (an agent method calling another) is folded
+    into the outer one rather than counted twice.
+    """
+    metrics, parent = _metrics.get(), _span.get()
+    if metrics is None or any(
+        s.kind == kind and s.name == name for s in (parent.chain() if parent else ())
+    ):
+        yield
+        return
+
+    current = Span(kind, name, parent, **attributes)
+    token = _span.set(current)
+    start_ns, start = time.time_ns(), time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span.reset(token)
+        metrics.finish(current, start_ns, time.perf_counter() - start)
+
+
+def is_recording() -> bool:
+    """Whether metrics are being collected in the current context"""
+    return _metrics.get() is not None
+
+
+def count(**values: float) -> None:
+    """Add to counters of the innermost span and every span around it"""
+    metrics, current = _metrics.get(), _span.get()
+    if metrics is not None and current is not None:
+        metrics.count(current, values)
+
+
+def tokens_used() -> Optional[int]:
+    """LLM tokens the current run has used so far, or None without metrics"""
+    metrics = _metrics.get()
+    if metrics is None:
+        return None
+    with metrics._lock:
+        return int(
+            sum(
+                stats["tokens_in"] + stats["tokens_out"]
+                for (kind, _), stats in metrics.stats.items()
+                if kind == "llm"
+            )
+        )
+
+
+def fail(error: str) -> None:
+    """Mark the innermost span as failed without raising"""
+    current = _span.get()
+    if current is not None and _metrics.get() is not None:
+        current.error = error
+
+
+def traced(kind: str, name: Optional[str] = None, error_key: Optional[str] = None):
+    """Decorator running each call of a function or coroutine in a span
+
+    Without a name, methods are named after their object's name attribute
+    (the agent's name). With error_key, a returned dict with that key set
+    counts as a failed call, the way graph nodes report errors.
+    """
+
+    def decorate(func: Callable) -> Callable:
+        def check(result: Any) -> None:
+            if error_key and isinstance(result, dict) and result.get(error_key):
+                fail(str(result[error_key]))
+
+        def span_name(args) -> str:
+            return name or getattr(args[0], "name", func.__name__)
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def awrapper(*args, **kwargs):
+                with span(kind, span_name(args)):
+                    result = await func(*args, **kwargs)
+                    check(result)
+                    return result
+
+            return awrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, span_name(args)):
+                result = func(*args, **kwargs)
+                check(result)
+                return result
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,97 @@
+import hashlib
+import random
+import re
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from settings import settings
+
+# Parameters of the universal hash family h(x) = (a * x + b) mod p
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+NUM_PERMUTATIONS = 64
+SHINGLE_WORDS = 3
+
+# Pages shorter than this are cheap to summarize and their signatures are noisy
+MIN_WORDS = 50
+
+WORD = re.compile(r"\w+")
+
+_rng = random.Random(1)  # Fixed seed keeps signatures comparable across runs
+PERMUTATIONS: List[Tuple[int, int]] = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def _hash(shingle: str) -> int:
+    digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> Set[int]:
+    """Hash every run of size consecutive words in text"""
+    words = WORD.findall(text.lower())
+    return {
+        _hash(" ".join(words[i : i + size]))
+        for i in range(max(len(words) - size + 1, 1))
+    }
+
+
+def minhash(text: str) -> Tuple[int, ...]:
+    """MinHash signature of text; matching slots estimate shingle overlap"""
+    hashes = shingles(text)
+    return tuple(
+        min((a * h + b) % MERSENNE_PRIME for h in hashes) & MAX_HASH
+        for a, b in PERMUTATIONS
+    )
+
+
+def novelty(new_texts: Sequence[str], old_texts: Sequence[str]) -> float:
+    """Share of the shingles of new_texts that none of old_texts has"""
+    new = set().union(*(shingles(text) for text in new_texts))
+    old = set().union(*(shingles(text) for text in old_texts))
+    return len(new - old) / len(new) if new else 0.0
+
+
+def text_signature(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of text, or None if it is too short to compare"""
+    if len(WORD.findall(text)) < MIN_WORDS:
+        return None
+    return minhash(text)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """Remember documents seen so far and spot near-identical copies
+
+    Used per research run to catch mirrors and syndicated copies of a page
+    before they are summarized. Safe to share between scraping threads.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = threshold or settings.source_dedupe_threshold
+        self._lock = Lock()
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+
+    def claim(self, key: str, text: str) -> Optional[str]:
+        """Register text under key, or return the key of an earlier copy"""
+        return self.claim_signature(key, text_signature(text))
+
+    def claim_signature(
+        self, key: str, signature: Optional[Tuple[int, ...]]
+    ) -> Optional[str]:
+        """Like claim, for a signature computed by text_signature"""
+        if signature is None:
+            return None
+        with self._lock:
+            for other, seen in self._signatures.items():
+                if similarity(signature, seen) >= self.threshold:
+                    return other
+            self._signatures[key] = signature
+        return None
@@ -0,0 +1,127 @@
+import asyncio
+import codecs
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+from settings import settings
+from utils.extract import extract_text
+
+T = TypeVar("T")
+
+# (shared memory name, bytes written, encoding) of a page body
+PageRef = Tuple[str, int, Optional[str]]
+
+
+def offload_enabled() -> bool:
+    """Whether CPU-heavy steps run in worker processes"""
+    return settings.cpu_workers > 0
+
+
+@lru_cache(maxsize=None)
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process-wide pool for CPU-heavy steps
+
+    Workers come from a fork server where available, so they are not
+    forked from a process full of threads holding locks, and they start
+    with this module already imported.
+    """
+    if "forkserver" in get_all_start_methods():
+        context = get_context("forkserver")
+        # Workers only need this module, not the (possibly heavy) __main__
+        context.set_forkserver_preload([__name__])
+    else:
+        context = get_context("spawn")
+    return ProcessPoolExecutor(max_workers=settings.cpu_workers, mp_context=context)
+
+
+def warm_up_process_pool() -> None:
+    """Start the worker processes now rather than on the first page"""
+    if offload_enabled():
+        pool = get_process_pool()
+        for future in [pool.submit(int) for _ in range(settings.cpu_workers)]:
+            future.result()
+
+
+def shutdown_process_pool() -> None:
+    """Stop the worker processes, if any were started"""
+    if get_process_pool.cache_info().currsize:
+        get_process_pool().shutdown(cancel_futures=True)
+        get_process_pool.cache_clear()
+
+
+def run_cpu(fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(*args) in the process pool, or inline when offloading is off
+
+    Worker processes do not see settings changed at runtime, so fn gets
+    everything it needs through args.
+    """
+    if not offload_enabled():
+        return fn(*args)
+    return get_process_pool().submit(fn, *args).result()
+
+
+async def arun_cpu(fn: Callable[..., T], *args: Any) -> T:
+    """Async variant of run_cpu"""
+    if not offload_enabled():
+        return fn(*args)
+    return await asyncio.wrap_future(get_process_pool().submit(fn, *args))
+
+
+class SharedPage:
+    """Page body streamed straight into shared memory for a worker process
+
+    Pass write as fetch_page's on_chunk, with keep_body=False: chunks land
+    in a shared memory block as they arrive, and worker processes parse it
+    in place through ref, instead of the body being joined, decoded,
+    pickled and piped to them.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.encoding: Optional[str] = None
+        self._memory = SharedMemory(create=True, size=capacity)
+
+    def write(self, chunk: bytes, encoding: Optional[str] = None) -> bool:
+        """Append a chunk; returns True once the block is full"""
+        self.encoding = self.encoding or encoding
+        data = chunk[: self.capacity - self.size]
+        self._memory.buf[self.size : self.size + len(data)] = data
+        self.size += len(data)
+        return self.size >= self.capacity
+
+    @property
+    def ref(self) -> PageRef:
+        return self._memory.name, self.size, self.encoding
+
+    def close(self) -> None:
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self) -> "SharedPage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def extract_page(ref: PageRef, max_chars: int) -> str:
+    """Decode and extract the text of a page body in shared memory"""
+    name, size, encoding = ref
+    # Pool workers share the parent's resource tracker, so attaching does
+    # not leave a second owner behind; the creator unlinks the block
+    memory = SharedMemory(name=name)
+    try:
+        view = memory.buf[:size]
+        try:
+            html = codecs.decode(view, encoding or "utf-8", "replace")
+        except LookupError:
+            html = codecs.decode(view, "utf-8", "replace")
+        finally:
+            view.release()
+    finally:
+        memory.close()
+    return extract_text(html, max_chars)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from threading import Lock
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from settings import settings
+
+# Query parameters that never change the page content (plus any utm_*)
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid"}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so trivially different spellings share a cache entry
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, and sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (key.lower().startswith("utm_") or key.lower() in TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def url_key(url: str) -> str:
+    """Content address of a URL: sha256 of its normalized form"""
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """On-disk cache of fetched pages and their extracted text
+
+    Entries are JSON files named by url_key. Reads refresh the file mtime, which
+    drives least-recently-used eviction once the directory grows past
+    max_bytes. Entries older than ttl are stale and should be revalidated
+    with the stored ETag/Last-Modified before reuse.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        ttl: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.directory = directory or settings.page_cache_dir
+        self.ttl = settings.page_cache_ttl if ttl is None else ttl
+        self.max_bytes = max_bytes or settings.page_cache_max_bytes
+        self._lock = Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(
+            item.stat().st_size
+            for item in os.scandir(self.directory)
+            if item.name.endswith(".json")
+        )
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, f"{url_key(url)}.json")
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Return the cached entry for a URL, or None
+
+        The entry has a "fresh" flag telling whether it is within its TTL.
+        """
+        path = self._path(url)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+
+        entry["fresh"] = time.time() - entry["fetched_at"] < self.ttl
+        return entry
+
+    def put(self, url: str, page: Dict, text: str) -> Dict:
+        """Store a fetched page and its extracted text
+
+        The HTML is stored only if the page kept its body (see fetch_page).
+        """
+        headers = {k.lower(): v for k, v in page.get("headers", {}).items()}
+        entry = {
+            "url": normalize_url(url),
+            "fetched_at": time.time(),
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "text": text,
+        }
+        if "content" in page:
+            entry["html"] = page["content"]
+        self._write(self._path(url), entry)
+        with self._lock:
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+        return entry
+
+    def revalidated(self, url: str, entry: Dict) -> None:
+        """Record that the origin confirmed an entry is unchanged (HTTP 304)"""
+        entry = {k: v for k, v in entry.items() if k != "fresh"}
+        entry["fetched_at"] = time.time()
+        self._write(self._path(url), entry)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        """Headers for a conditional GET against a cached entry"""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+            self._size = 0
+
+    def _write(self, path: str, entry: Dict) -> None:
+        # Write atomically so concurrent readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        size = os.path.getsize(tmp_path)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += size - replaced
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until under max_bytes"""
+        with self._lock:
+            entries = []
+            for item in os.scandir(self.directory):
+                if item.name.endswith(".json"):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+
+            # Other processes may share the directory, so recount from disk
+            self._size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if self._size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    self._size -= size
+                except OSError:
+                    pass
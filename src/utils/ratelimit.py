@@ -0,0 +1,355 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from threading import Condition
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import httpx
+import openai
+import requests
+
+from settings import settings
+from utils.deadline import TIMEOUT_ERRORS, check_deadline, time_left
+from utils.metrics import count
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Queue priorities, lower goes first: finishing runs beats starting new ones
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Concurrency is halved when a backend throttles, and cut a little when
+# calls take SLOW_FACTOR times longer than usual for the same caller
+THROTTLE_DECREASE = 0.5
+SLOW_DECREASE = 0.9
+SLOW_FACTOR = 3.0
+# Weight of the newest call in the moving average latency
+LATENCY_SMOOTHING = 0.2
+
+# How often queued async callers look for a free slot
+ASYNC_POLL = 0.05
+
+# Kinds of backend with <kind>_rate_limit and <kind>_max_concurrency settings
+LIMITED_KINDS = ("llm", "search")
+
+
+def _status(error: BaseException) -> Optional[int]:
+    """HTTP status behind a client error, if it carries one"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Whether error means the backend is rate limiting us"""
+    # DuckDuckGo raises its own RatelimitException without a status
+    return _status(error) == 429 or "ratelimit" in type(error).__name__.lower()
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether error is worth retrying: throttling, 5xx or a dropped connection"""
+    if isinstance(error, TIMEOUT_ERRORS):
+        return False  # Slow calls are up to the deadline, not to retries
+    status = _status(error)
+    return (
+        is_throttled(error)
+        or (status is not None and status >= 500)
+        or isinstance(
+            error,
+            (requests.ConnectionError, httpx.TransportError, openai.APIConnectionError),
+        )
+    )
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the backend asked us to wait, from a Retry-After header"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket plus an adaptive concurrency limit for one backend
+
+    Calls start at most rate times a second, in bursts of up to burst, and
+    at most limit run at once. The limit follows AIMD: it grows by one for
+    every limit calls that succeed, halves when the backend throttles and
+    shrinks a little when calls get much slower than usual, so concurrency
+    settles just under what the provider accepts. A Retry-After from the
+    backend pauses every caller. Waiting callers are served by priority,
+    then in arrival order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        max_concurrency: int,
+        burst: Optional[float] = None,
+        min_concurrency: int = 1,
+    ):
+        self.name = name
+        self.rate = rate  # 0 for no rate limit
+        self.burst = burst or max(float(max_concurrency), 1.0)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.limit = float(max_concurrency)
+        self._cond = Condition()
+        self._queue: List[Tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self._active = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+        self._latency: Dict[str, float] = {}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether callers are queuing for a slot or the backend paused us"""
+        return bool(self._queue) or time.monotonic() < self._paused_until
+
+    def _poll(self, ticket: Tuple[int, int]) -> Tuple[bool, Optional[float]]:
+        """Take a slot for ticket if it is first in line and one is free
+
+        Called with the lock held. Returns whether the slot was taken, and
+        otherwise how long until one may free up (None if only a release
+        can free one).
+        """
+        now = time.monotonic()
+        if self.rate:
+            elapsed = now - self._updated
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+        if self._queue[0] != ticket:
+            return False, None
+        if now < self._paused_until:
+            return False, self._paused_until - now
+        if self._active >= int(self.limit):
+            return False, None
+        if self.rate and self._tokens < 1:
+            return False, (1 - self._tokens) / self.rate
+
+        heapq.heappop(self._queue)
+        self._active += 1
+        if self.rate:
+            self._tokens -= 1
+        self._cond.notify_all()  # The next caller in line may be able to go
+        return True, None
+
+    def _leave(self, ticket: Tuple[int, int]) -> None:
+        """Drop a caller that gave up waiting"""
+        with self._cond:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def _enqueue(self, priority: int) -> Tuple[int, int]:
+        ticket = (priority, next(self._tickets))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        """Wait for a slot, raising DeadlineExceeded if the deadline comes first"""
+        ticket = self._enqueue(priority)
+        try:
+            with self._cond:
+                while True:
+                    acquired, delay = self._poll(ticket)
+                    if acquired:
+                        return
+                    left = check_deadline(f"{self.name} call")
+                    waits = [w for w in (delay, left) if w is not None]
+                    self._cond.wait(min(waits) if waits else None)
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    async def aacquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        """Async variant of acquire"""
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    acquired, delay = self._poll(ticket)
+                if acquired:
+                    return
+                left = check_deadline(f"{self.name} call")
+                waits = [w for w in (delay, left, ASYNC_POLL) if w is not None]
+                await asyncio.sleep(min(waits))
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    def release(
+        self,
+        started: float,
+        label: str = "",
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Free a slot and adapt the limit to how the call went"""
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self._active -= 1
+            if error is not None and is_throttled(error):
+                retry_after = _retry_after(error)
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                self._decrease(now, THROTTLE_DECREASE)
+            elif error is None:
+                usual = self._latency.get(label)
+                if usual is not None and latency > SLOW_FACTOR * usual:
+                    self._decrease(now, SLOW_DECREASE)
+                else:
+                    self.limit = min(self.limit + 1 / self.limit, self.max_concurrency)
+                self._latency[label] = (
+                    latency
+                    if usual is None
+                    else usual + LATENCY_SMOOTHING * (latency - usual)
+                )
+            self._cond.notify_all()
+
+    def _decrease(self, now: float, factor: float) -> None:
+        # Calls that were already running when the limit was cut report the
+        # same overload, so cut at most once per typical call duration
+        window = max(self._latency.values(), default=0.0)
+        if now - self._last_cut < window:
+            return
+        self._last_cut = now
+        self.limit = max(self.limit * factor, self.min_concurrency)
+        logger.debug(f"{self.name} concurrency limit down to {self.limit:.1f}")
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_NORMAL, label: str = "") -> Iterator[None]:
+        """Hold a slot for the block, without retrying it on failure"""
+        self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self.release(started, label, e)
+            raise
+        self.release(started, label)
+
+    @asynccontextmanager
+    async def aslot(
+        self, priority: int = PRIORITY_NORMAL, label: str = ""
+    ) -> AsyncIterator[None]:
+        """Async variant of slot"""
+        await self.aacquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self.release(started, label, e)
+            raise
+        self.release(started, label)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Jittered backoff before retrying error, or None to give up"""
+        if attempt >= settings.rate_limit_retries or not is_transient(error):
+            return None
+        # Full jitter keeps throttled callers from retrying in lockstep
+        delay = random.uniform(0, settings.rate_limit_backoff * 2**attempt)
+        left = time_left()
+        if left is not None and left <= delay:
+            return None
+        logger.debug(f"Retrying {self.name} call in {delay:.2f}s: {error}")
+        count(retries=1)
+        return delay
+
+    def call(
+        self, fn: Callable[[], T], priority: int = PRIORITY_NORMAL, label: str = ""
+    ) -> T:
+        """Run fn in a slot, retrying throttled and transient failures"""
+        for attempt in itertools.count():
+            try:
+                with self.slot(priority, label):
+                    return fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        priority: int = PRIORITY_NORMAL,
+        label: str = "",
+    ) -> T:
+        """Async variant of call"""
+        for attempt in itertools.count():
+            try:
+                async with self.aslot(priority, label):
+                    return await fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+
+@lru_cache(maxsize=None)
+def get_limiter(name: str) -> RateLimiter:
+    """Return the process-wide limiter of a backend
+
+    Names are "<kind>:<backend>", e.g. "llm:gpt-4" or "search:duckduckgo";
+    the kind picks the <kind>_rate_limit and <kind>_max_concurrency settings.
+    """
+    kind = name.split(":", 1)[0]
+    return RateLimiter(
+        name,
+        rate=getattr(settings, f"{kind}_rate_limit"),
+        max_concurrency=getattr(settings, f"{kind}_max_concurrency"),
+    )
+
+
+def share_limits(processes: int) -> None:
+    """Give this process its share of limits split between processes
+
+    Limiters only see the calls of their own process, so processes running
+    side by side would together go processes times over every limit.
+    Concurrency never drops below one call per process.
+    """
+    if processes <= 1:
+        return
+    for kind in LIMITED_KINDS:
+        rate = getattr(settings, f"{kind}_rate_limit")
+        concurrency = getattr(settings, f"{kind}_max_concurrency")
+        setattr(settings, f"{kind}_rate_limit", rate / processes)
+        setattr(settings, f"{kind}_max_concurrency", max(1, concurrency // processes))
+    get_limiter.cache_clear()  # Limiters created so far had the full limits
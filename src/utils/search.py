@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import re
+import weakref
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Set, Union
+from urllib.parse import urlparse
+
+import httpx
+from langchain_community.tools import DuckDuckGoSearchResults
+
+from settings import settings
+from utils.fetch import get_session, new_async_client
+from utils.page_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+# Reciprocal rank fusion damping: higher values flatten the rank bonus
+RRF_K = 60
+
+# Word overlap above which two results are treated as the same page
+NEAR_DUPLICATE = 0.8
+MIN_SIGNATURE_WORDS = 4
+
+WORD = re.compile(r"\w+")
+QUERY_PREFIX = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+# DuckDuckGoSearchResults formats results as "[snippet: ..., title: ..., link: ...]"
+DDG_RESULT = re.compile(
+    r"\[snippet: (?P<snippet>.*?), title: (?P<title>.*?), link: (?P<link>[^\s\]]+)\]",
+    re.DOTALL,
+)
+
+SERPER_URL = "https://google.serper.dev/search"
+
+
+class SearchError(Exception):
+    """Raised when every search of a topic failed"""
+
+
+class SearchBackend(ABC):
+    """A web search provider
+
+    Subclasses implement search (and optionally asearch) returning a ranked
+    list of {"link", "title", "snippet"} dicts.
+    """
+
+    name = "backend"
+
+    @abstractmethod
+    def search(self, query: str) -> List[Dict]:
+        """Ranked results for a query"""
+
+    async def asearch(self, query: str) -> List[Dict]:
+        return await asyncio.to_thread(self.search, query)
+
+
+class DuckDuckGoBackend(SearchBackend):
+    name = "duckduckgo"
+
+    def __init__(self, num_results: Optional[int] = None):
+        self.tool = DuckDuckGoSearchResults(
+            num_results=num_results or settings.max_search_results
+        )
+
+    def search(self, query: str) -> List[Dict]:
+        return self._parse(self.tool.invoke(query))
+
+    async def asearch(self, query: str) -> List[Dict]:
+        return self._parse(await self.tool.ainvoke(query))
+
+    @staticmethod
+    def _parse(results: Union[str, List[Dict]]) -> List[Dict]:
+        if isinstance(results, str):
+            return [match.groupdict() for match in DDG_RESULT.finditer(results)]
+        return list(results)
+
+
+class SerperBackend(SearchBackend):
+    """Google results through the Serper API"""
+
+    name = "serper"
+
+    def __init__(self, num_results: Optional[int] = None):
+        self.num_results = num_results or settings.max_search_results
+        # Async clients are bound to their event loop, so keep one per loop
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def search(self, query: str) -> List[Dict]:
+        response = get_session().post(
+            SERPER_URL,
+            json={"q": query, "num": self.num_results},
+            headers={"X-API-KEY": settings.serper_api_key},
+            timeout=(settings.fetch_connect_timeout, settings.fetch_read_timeout),
+        )
+        response.raise_for_status()
+        return self._parse(response.json())
+
+    async def asearch(self, query: str) -> List[Dict]:
+        response = await self._client().post(
+            SERPER_URL,
+            json={"q": query, "num": self.num_results},
+            headers={"X-API-KEY": settings.serper_api_key},
+        )
+        response.raise_for_status()
+        return self._parse(response.json())
+
+    def _client(self) -> httpx.AsyncClient:
+        """Pooled client of the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._clients[loop] = new_async_client()
+        return client
+
+    @staticmethod
+    def _parse(data: Dict) -> List[Dict]:
+        return [
+            {
+                "link": item.get("link", ""),
+                "title": item.get("title", ""),
+                "snippet": item.get("snippet", ""),
+            }
+            for item in data.get("organic", [])
+        ]
+
+
+SEARCH_BACKENDS: Dict[str, Callable[[], SearchBackend]] = {
+    DuckDuckGoBackend.name: DuckDuckGoBackend,
+    SerperBackend.name: SerperBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], SearchBackend]) -> None:
+    """Make a search backend available to the search_backends setting"""
+    SEARCH_BACKENDS[name] = factory
+
+
+def get_backends(names: Optional[str] = None) -> List[SearchBackend]:
+    """Build the search backends named in a comma-separated list
+
+    Raises ValueError for unknown names, or if the list names no backend.
+    """
+    backends = []
+    for name in (names or settings.search_backends).split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in SEARCH_BACKENDS:
+            raise ValueError(f"Unknown search backend: {name}")
+        backends.append(SEARCH_BACKENDS[name]())
+    if not backends:
+        raise ValueError("No search backend configured, set SEARCH_BACKENDS")
+    return backends
+
+
+def parse_queries(text: str, topic: str, limit: int) -> List[str]:
+    """Turn an LLM's one-query-per-line answer into a query list
+
+    The topic itself always comes first; numbering, bullets, quotes and
+    repeated queries are dropped.
+    """
+    queries, seen = [topic], {topic.lower()}
+    for line in text.splitlines():
+        query = QUERY_PREFIX.sub("", line).strip().strip("\"'")
+        if query and query.lower() not in seen:
+            seen.add(query.lower())
+            queries.append(query)
+    return queries[:limit]
+
+
+def is_valid_url(url: str) -> bool:
+    try:
+        result = urlparse(url)
+        return all([result.scheme, result.netloc])
+    except ValueError:
+        return False
+
+
+def _signature(result: Dict) -> Set[str]:
+    text = f"{result.get('title', '')} {result.get('snippet', '')}".lower()
+    words = set(WORD.findall(text))
+    return words if len(words) >= MIN_SIGNATURE_WORDS else set()
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def merge_results(result_lists: List[List[Dict]], limit: int) -> List[Dict]:
+    """Fuse ranked result lists into one ranking without duplicate pages
+
+    URLs are canonicalized, and results whose title and snippet mostly match
+    an earlier result are folded into it. Each page scores the reciprocal
+    rank fusion of its positions, so pages found by several queries or
+    backends rise to the top.
+    """
+    merged: Dict[str, Dict] = {}
+    scores: Dict[str, float] = {}
+    signatures: Dict[str, Set[str]] = {}
+
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            if not is_valid_url(result.get("link", "")):
+                continue
+            key = normalize_url(result["link"])
+            if key not in merged:
+                signature = _signature(result)
+                duplicate = next(
+                    (
+                        other
+                        for other, words in signatures.items()
+                        if _similarity(signature, words) >= NEAR_DUPLICATE
+                    ),
+                    None,
+                )
+                if duplicate is None:
+                    merged[key], scores[key], signatures[key] = result, 0.0, signature
+                else:
+                    key = duplicate
+            scores[key] += 1 / (RRF_K + rank + 1)
+
+    # sorted is stable, so ties keep the order pages were first seen in
+    ranked = sorted(merged, key=lambda key: scores[key], reverse=True)
+    return [merged[key] for key in ranked[:limit]]
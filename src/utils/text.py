@@ -0,0 +1,112 @@
+import logging
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a token in English text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n|\n")
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its tables on first use, which fails offline
+        logger.warning(f"Falling back to approximate token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens the way the model's tokenizer would"""
+    encoding = _get_encoding(model or settings.gpt_model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut text down to at most max_tokens tokens"""
+    encoding = _get_encoding(model or settings.gpt_model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def chunk_text(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """Split text into chunks of at most max_tokens tokens
+
+    Chunks break on paragraph boundaries; a single paragraph longer than the
+    budget is cut into token-sized pieces.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph, model)
+
+        if tokens > max_tokens:
+            # Oversized paragraph: emit what we have, then slice it
+            if current:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            while paragraph:
+                piece = truncate_tokens(paragraph, max_tokens, model)
+                chunks.append(piece)
+                paragraph = paragraph[len(piece) :].strip()
+            continue
+
+        if current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def pack_to_budget(
+    texts: List[str], max_tokens: int, model: Optional[str] = None
+) -> List[str]:
+    """Trim texts so their total fits max_tokens, sharing the budget fairly
+
+    Short texts are kept whole; the tokens they leave unused are split
+    among the longer ones, which are truncated to their share.
+    """
+    sizes = [count_tokens(text, model) for text in texts]
+    if sum(sizes) <= max_tokens:
+        return list(texts)
+
+    # Water-filling: find the per-text cap that spends the whole budget
+    remaining, open_count = max_tokens, len(texts)
+    cap = 0
+    for size in sorted(sizes):
+        share = remaining // open_count
+        if size > share:
+            cap = share
+            break
+        remaining -= size
+        open_count -= 1
+
+    return [
+        text if size <= cap else truncate_tokens(text, cap, model)
+        for text, size in zip(texts, sizes)
+    ]
@@ -0,0 +1,382 @@
+"""Long-running research worker, so short jobs skip interpreter startup
+
+Importing LangChain, LangGraph and the OpenAI client and compiling the graph
+takes seconds. The worker pays for that once, then takes jobs as JSON lines,
+{"topic": ..., "id": ..., "run_id": ..., "refresh": ...}, from stdin or a
+Unix socket. With refresh, the finished run run_id is brought up to date
+rather than returned as is. Each job is answered with a JSON line carrying
+the same id, the article, its sources and metadata, or an error. Answers
+come in the order jobs finish.
+
+With --queue, workers instead take jobs from the SQLite job queue
+(JOB_QUEUE_PATH), which any number of worker processes, on this machine or
+others sharing the file, serve together. Jobs are queued with enqueue and
+their answers looked up by job ID with result.
+
+Usage: PYTHONPATH=src python src/worker.py serve [--socket [PATH]]
+       PYTHONPATH=src python src/worker.py serve --queue [--processes N]
+       PYTHONPATH=src python src/worker.py submit TOPIC [--socket PATH]
+           [--run-id ID [--refresh]]
+       PYTHONPATH=src python src/worker.py enqueue TOPIC [--priority P]
+           [--run-id ID [--refresh]] [--wait]
+       PYTHONPATH=src python src/worker.py result JOB_ID [--wait]
+
+Without --socket or --queue, serve reads jobs from stdin and answers on
+stdout.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set
+
+from settings import settings
+
+if TYPE_CHECKING:
+    from utils.jobs import JobQueue
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(line: str) -> Dict:
+    """Run the job on one JSON line and return its JSON-ready answer"""
+    try:
+        job = json.loads(line)
+        job["topic"]  # Every job needs a topic
+    except (ValueError, KeyError, TypeError) as e:
+        return {"id": None, "error": f"Invalid job: {e}"}
+    return research_job(job)
+
+
+def research_job(job: Dict) -> Dict:
+    """Run a job dict with a topic and return its JSON-ready answer"""
+    start = time.monotonic()
+    topic = job["topic"]
+
+    from main import refresh_research, run_research
+
+    if job.get("refresh") and job.get("run_id"):
+        result = refresh_research(topic, job["run_id"])
+    else:
+        result = run_research(topic, run_id=job.get("run_id"))
+    sources = (result or {}).get("research_data", {}).get("sources", [])
+    return {
+        "id": job.get("id"),
+        "topic": topic,
+        "content": (result or {}).get("content", ""),
+        "sources": [
+            {"url": source["url"], "summary": source.get("summary", "")}
+            for source in sources
+        ],
+        "metadata": (result or {}).get("metadata", {}),
+        "error": "Research failed" if result is None else result.get("error"),
+        "elapsed": time.monotonic() - start,
+    }
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class Worker:
+    """Runs jobs on a shared thread pool for as long as the process lives
+
+    Jobs from stdin and from every socket connection share the pool, the
+    compiled graph, the agents and the caches.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = concurrency or settings.batch_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.server: Optional[_UnixServer] = None
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopped = threading.Event()
+
+    def warm_up(self) -> None:
+        """Import the agents, compile the graph and start CPU workers"""
+        from main import get_workflow
+        from utils.offload import warm_up_process_pool
+
+        start = time.monotonic()
+        get_workflow()
+        warm_up_process_pool()
+        logger.info(f"Worker ready in {time.monotonic() - start:.1f}s")
+
+    def serve_lines(self, lines: Iterable[str], write: Callable[[str], None]) -> None:
+        """Run each job line, writing an answer line as each one finishes"""
+        lock = threading.Lock()
+
+        def run(line: str) -> None:
+            answer = json.dumps(run_job(line), default=str)
+            with lock:
+                write(answer + "\n")
+
+        futures = [self.executor.submit(run, line) for line in lines if line.strip()]
+        wait(futures)
+
+    def serve_stdin(self) -> None:
+        def write(text: str) -> None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        self.serve_lines(sys.stdin, write)
+
+    def serve_socket(self, path: Optional[str] = None) -> None:
+        """Take jobs from connections to a Unix socket until stop()"""
+        path = path or settings.worker_socket
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                def write(text: str) -> None:
+                    self.wfile.write(text.encode("utf-8"))
+                    self.wfile.flush()
+
+                lines = (line.decode("utf-8") for line in self.rfile)
+                worker.serve_lines(lines, write)
+
+        _claim_socket(path)
+        try:
+            with _UnixServer(path, Handler) as server:
+                os.chmod(path, 0o600)  # Only this user may submit jobs
+                self.server = server
+                logger.info(f"Worker listening on {path}")
+                server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def serve_queue(self, jobs: Optional["JobQueue"] = None) -> None:
+        """Run jobs from the shared job queue until stop()
+
+        Up to concurrency jobs run at once. While the LLM rate limiter has
+        calls queuing, no more jobs are claimed than are already running, so
+        topics wait in the queue rather than in the middle of a run. Leases
+        on running jobs are renewed every poll, and old finished jobs are
+        purged every job_purge_interval seconds.
+        """
+        from utils.jobs import get_job_queue
+
+        jobs = jobs or get_job_queue()
+        next_purge = time.monotonic()
+        running: Set[str] = set()
+        lock = threading.Lock()
+
+        def run(job: Dict) -> None:
+            try:
+                answer = research_job(job)
+            except Exception as e:
+                answer = {"id": job["id"], "error": f"Job crashed: {e}"}
+            if not jobs.finish(job["id"], self.name, {**answer, "id": job["id"]}):
+                logger.warning(f"Dropping the answer to {job['id']}: lease lost")
+            with lock:
+                running.discard(job["id"])
+
+        logger.info(f"Worker {self.name} taking jobs from {jobs.path}")
+        while not self._stopped.is_set():
+            if time.monotonic() >= next_purge:
+                jobs.purge()
+                next_purge = time.monotonic() + settings.job_purge_interval
+            with lock:
+                held = list(running)
+            jobs.renew(held, self.name)
+            busy = len(held)
+            job = None
+            if busy < self.concurrency and not (busy and _llm_saturated()):
+                job = jobs.claim(self.name)
+            if job is None:
+                self._stopped.wait(settings.job_poll_interval)
+                continue
+            with lock:
+                running.add(job["id"])
+            self.executor.submit(run, job)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _llm_saturated() -> bool:
+    """Whether calls to the default LLM are queuing for the rate limiter"""
+    from utils.ratelimit import get_limiter
+
+    return get_limiter(f"llm:{settings.gpt_model}").saturated
+
+
+def _claim_socket(path: str) -> None:
+    """Remove a socket left behind by a dead worker, refusing a live one"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.remove(path)
+            return
+    raise RuntimeError(f"A worker is already listening on {path}")
+
+
+def submit(
+    topic: str,
+    path: Optional[str] = None,
+    run_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+    refresh: bool = False,
+) -> Dict:
+    """Send a topic to a running worker and wait for its answer"""
+    job = {"topic": topic, "run_id": run_id, "refresh": refresh}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or settings.worker_socket)
+        sock.sendall((json.dumps(job) + "\n").encode("utf-8"))
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("r", encoding="utf-8") as answers:
+            return json.loads(answers.readline())
+
+
+def run_queue_worker(concurrency: Optional[int] = None, processes: int = 1) -> None:
+    """Run a worker on the job queue until interrupted
+
+    processes is the number of worker processes started together, which
+    split the LLM and search rate limits between them.
+    """
+    from main import configure_logging
+    from utils.ratelimit import share_limits
+
+    configure_logging()
+    share_limits(processes)
+    worker = Worker(concurrency)
+    worker.warm_up()
+    try:
+        worker.serve_queue()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop()
+
+
+def start_queue_workers(
+    processes: int, concurrency: Optional[int] = None, total: Optional[int] = None
+) -> List[multiprocessing.Process]:
+    """Start worker processes on the job queue, each running many jobs
+
+    total is the number of processes splitting the rate limits, by default
+    the ones started here.
+    """
+    # Spawned rather than forked: the parent may already hold threads and locks
+    context = multiprocessing.get_context("spawn")
+    args = (concurrency, total or processes)
+    workers = [
+        context.Process(target=run_queue_worker, args=args, daemon=True)
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    return workers
+
+
+def _print(answer: Optional[Dict]) -> None:
+    print(json.dumps(answer, indent=2, default=str))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run jobs until stopped")
+    serve.add_argument(
+        "--socket",
+        nargs="?",
+        const="",
+        help="listen on a Unix socket (default: WORKER_SOCKET) instead of stdin",
+    )
+    serve.add_argument(
+        "--queue", action="store_true", help="take jobs from the job queue"
+    )
+    serve.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="worker processes on the job queue (default: 1)",
+    )
+    serve.add_argument("--concurrency", type=int)
+    send = commands.add_parser("submit", help="send a topic to a running worker")
+    send.add_argument("topic")
+    send.add_argument("--socket", help="socket of the worker (default: WORKER_SOCKET)")
+    enqueue = commands.add_parser("enqueue", help="add a topic to the job queue")
+    enqueue.add_argument("topic")
+    enqueue.add_argument(
+        "--priority", type=int, default=1, help="lower runs first (default: 1)"
+    )
+    enqueue.add_argument("--wait", action="store_true", help="wait for the answer")
+    for command in (send, enqueue):
+        command.add_argument("--run-id", help="checkpoint the run under this ID")
+        command.add_argument(
+            "--refresh",
+            action="store_true",
+            help="bring the finished run --run-id up to date, redoing only what "
+            "changed",
+        )
+    result = commands.add_parser("result", help="look up a queued job by its ID")
+    result.add_argument("job_id")
+    result.add_argument("--wait", action="store_true", help="wait until it finishes")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        _print(submit(args.topic, args.socket, args.run_id, refresh=args.refresh))
+        return
+    if args.command in ("enqueue", "result"):
+        from utils.jobs import QueueFull, get_job_queue
+
+        jobs = get_job_queue()
+        if args.command == "result":
+            job_id = args.job_id
+        else:
+            try:
+                job_id = jobs.submit(
+                    args.topic, args.priority, args.run_id, args.refresh
+                )
+            except QueueFull as e:
+                sys.exit(f"Job queue is full: {e}")
+        _print(jobs.wait(job_id) if args.wait else jobs.get(job_id))
+        return
+
+    if args.queue:
+        workers = start_queue_workers(
+            args.processes - 1, args.concurrency, args.processes
+        )
+        try:
+            run_queue_worker(args.concurrency, args.processes)
+        finally:
+            for process in workers:
+                process.terminate()
+        return
+
+    from main import configure_logging
+
+    # Logs go to stderr, stdout carries the answers
+    configure_logging()
+    worker = Worker(args.concurrency)
+    worker.warm_up()
+    try:
+        if args.socket is None:
+            worker.serve_stdin()
+        else:
+            worker.serve_socket(args.socket)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()